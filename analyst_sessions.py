@@ -0,0 +1,184 @@
+# analyst_sessions.py
+import asyncio
+import hashlib
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+
+import streamlit as st
+
+import progress
+from job_runner import JobManager, JobReporter, MAX_PROGRESS_LINES
+from telegram_client import create_client
+
+# One Telethon session file per analyst and Telegram account
+ANALYST_SESSIONS_DIR = "analyst_sessions"
+
+# Clients and loop threads of analysts idle this long (and with no running jobs) are closed;
+# the session file stays, so the next page load reconnects without logging in again
+ANALYST_IDLE_SECONDS = 2 * 60 * 60
+
+# Headers set by an authenticating reverse proxy (oauth2-proxy, Cloudflare Access, ...)
+ANALYST_HEADERS = ("X-Forwarded-Email", "X-Forwarded-User", "X-Auth-Request-Email", "Cf-Access-Authenticated-User-Email")
+
+
+def current_analyst() -> Optional[str]:
+    """The logged-in analyst, from Streamlit authentication or a proxy header; None if unknown"""
+    try:
+        user = st.user
+        if user.get("is_logged_in") and user.get("email"):
+            return str(user["email"]).lower()
+    except Exception:
+        pass
+    try:
+        headers = st.context.headers
+    except Exception:
+        return None
+    for header in ANALYST_HEADERS:
+        value = headers.get(header)
+        if value:
+            return value.strip().lower()
+    return None
+
+
+def browser_id() -> str:
+    """Random id of this browser session, kept in st.session_state"""
+    if "browser_id" not in st.session_state:
+        st.session_state.browser_id = uuid.uuid4().hex
+    return st.session_state.browser_id
+
+
+def session_key(analyst: Optional[str], phone_number: str) -> str:
+    """
+    Key for an analyst's session.
+
+    Without a login the key is tied to this browser session, so typing another
+    analyst's phone number never hands out their authorized client.
+    """
+    phone = re.sub(r"[^0-9]", "", phone_number or "")
+    return f"{analyst or 'anonymous-' + browser_id()}|{phone}"
+
+
+class AnalystSession:
+    """
+    One analyst's Telegram client, running on its own event loop thread.
+
+    The client and loop live outside st.session_state, so they survive reruns and
+    browser refreshes, and one analyst's fetch never waits on another's loop.
+    """
+
+    def __init__(self, key: str, session_path: str):
+        self.key = key
+        self.session_path = session_path
+        # Each analyst resumes only their own discovery crawl
+        self.frontier_path = f"{session_path}_discovery_frontier.json"
+        self.client = None
+        self.last_used = time.time()
+        if sys.platform == "win32":
+            self.loop = asyncio.WindowsSelectorEventLoopPolicy().new_event_loop()
+        else:
+            self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name=f"tgforge-{os.path.basename(session_path)}",
+                                       daemon=True)
+        self.thread.start()
+        self.jobs = JobManager(self.loop)
+
+    def run(self, coro):
+        """
+        Run a coroutine on this analyst's loop and wait for its result.
+
+        Progress the coroutine reports is collected and written out afterwards in
+        the calling thread, so nothing touches the page from the shared loop thread.
+        """
+        reporter = JobReporter()
+
+        async def with_reporter():
+            with progress.use_reporter(reporter):
+                return await coro
+
+        self.last_used = time.time()
+        try:
+            return asyncio.run_coroutine_threadsafe(with_reporter(), self.loop).result()
+        finally:
+            for line in reporter.latest_lines(MAX_PROGRESS_LINES):
+                progress.write(line)
+
+    def busy(self) -> bool:
+        return any(not job.done for job in self.jobs.jobs.values())
+
+    def get_client(self, api_id, api_hash):
+        """The analyst's client, created on its own loop the first time"""
+        if self.client is None:
+            async def create():
+                return create_client(int(api_id), api_hash, self.session_path)
+            self.client = self.run(create())
+        return self.client
+
+    def close(self):
+        for job_id in list(self.jobs.jobs):
+            self.jobs.cancel(job_id)
+        if self.client is not None and self.client.is_connected():
+            try:
+                self.run(self.client.disconnect())
+            except Exception:
+                pass
+        self.client = None
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+class AnalystSessionManager:
+    """Registry of AnalystSessions shared by every browser session of the server"""
+
+    def __init__(self, directory: str = ANALYST_SESSIONS_DIR):
+        self.directory = directory
+        self._sessions: Dict[str, AnalystSession] = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def session_path(self, key: str) -> str:
+        analyst, phone = key.split("|", 1)
+        name = re.sub(r"[^a-zA-Z0-9_\-]", "_", analyst)[:40]
+        digest = hashlib.sha256(key.encode()).hexdigest()[:12]
+        return os.path.join(self.directory, f"{name}_{phone[-4:]}_{digest}")
+
+    def get(self, key: str) -> AnalystSession:
+        self.evict_idle()
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = AnalystSession(key, self.session_path(key))
+                self._sessions[key] = session
+            session.last_used = time.time()
+            return session
+
+    def evict_idle(self, max_idle: float = ANALYST_IDLE_SECONDS):
+        """Close sessions nobody has used for max_idle seconds, unless they still run jobs"""
+        cutoff = time.time() - max_idle
+        with self._lock:
+            idle = [key for key, session in self._sessions.items() if session.last_used < cutoff and not session.busy()]
+            closing = [self._sessions.pop(key) for key in idle]
+        for session in closing:
+            session.close()
+
+    def remove(self, key: str, delete_file: bool = True):
+        """Disconnect an analyst's client and optionally delete its session file"""
+        with self._lock:
+            session = self._sessions.pop(key, None)
+        if session is not None:
+            session.close()
+        session_file = f"{self.session_path(key)}.session"
+        if delete_file and os.path.exists(session_file):
+            os.remove(session_file)
+
+    def active_sessions(self) -> int:
+        return len(self._sessions)
+
+
+@st.cache_resource
+def get_session_manager() -> AnalystSessionManager:
+    """Server-wide AnalystSessionManager (cached across reruns and browser sessions)"""
+    return AnalystSessionManager()
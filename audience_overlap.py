@@ -0,0 +1,186 @@
+# audience_overlap.py
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from participant_membership import MembershipMatrix
+
+# Bottom-k MinHash sketch size; the Jaccard standard error is roughly 1 / sqrt(k)
+MINHASH_SIZE = 256
+
+# HyperLogLog uses 2^precision one-byte registers (relative error ~1.04 / sqrt(2^precision))
+HLL_PRECISION = 14
+
+# In "auto" mode, inputs with at most this many memberships are compared exactly
+EXACT_MAX_MEMBERSHIPS = 2_000_000
+
+_MASK64 = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def hash_ids(ids) -> np.ndarray:
+    """64-bit SplitMix64 hash of integer IDs (uint64 arithmetic wraps around)"""
+    x = np.asarray(ids, dtype=np.int64).view(np.uint64)
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return (x ^ (x >> np.uint64(31))) & _MASK64
+
+
+# ==================== SKETCHES ====================
+class MinHashSketch:
+    """Bottom-k MinHash: the k smallest distinct hash values of a set"""
+
+    def __init__(self, hashes: np.ndarray, size: int = MINHASH_SIZE):
+        self.size = size
+        self.hashes = hashes
+
+    @classmethod
+    def from_ids(cls, ids, size: int = MINHASH_SIZE) -> "MinHashSketch":
+        return cls.from_hashes(hash_ids(ids), size)
+
+    @classmethod
+    def from_hashes(cls, hashes: np.ndarray, size: int = MINHASH_SIZE) -> "MinHashSketch":
+        return cls(np.unique(hashes)[:size], size)
+
+    def jaccard(self, other: "MinHashSketch") -> float:
+        union = np.union1d(self.hashes, other.hashes)[:self.size]
+        if not len(union):
+            return 0.0
+        shared = np.intersect1d(self.hashes, other.hashes, assume_unique=True)
+        return float(np.count_nonzero(shared <= union[-1])) / len(union)
+
+    def cardinality(self) -> float:
+        if len(self.hashes) < self.size:
+            return float(len(self.hashes))
+        return (self.size - 1) / (float(self.hashes[-1]) / 2.0 ** 64)
+
+
+class HyperLogLog:
+    """HyperLogLog distinct-count sketch; sketches of different groups merge by register max"""
+
+    def __init__(self, precision: int = HLL_PRECISION, registers: Optional[np.ndarray] = None):
+        self.precision = precision
+        self.registers = registers if registers is not None else np.zeros(1 << precision, dtype=np.uint8)
+
+    @classmethod
+    def from_ids(cls, ids, precision: int = HLL_PRECISION) -> "HyperLogLog":
+        sketch = cls(precision)
+        sketch.add_hashes(hash_ids(ids))
+        return sketch
+
+    def add_hashes(self, hashes: np.ndarray):
+        if not len(hashes):
+            return
+        p = self.precision
+        index = (hashes >> np.uint64(64 - p)).astype(np.intp)
+        rest = hashes & np.uint64((1 << (64 - p)) - 1)
+        # Bit length of the remaining bits via the float exponent; rank = leading zeros + 1
+        _, bit_length = np.frexp(rest.astype(np.float64))
+        rank = (64 - p - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        return HyperLogLog(self.precision, np.maximum(self.registers, other.registers))
+
+    def cardinality(self) -> float:
+        m = float(len(self.registers))
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int32)))
+        zeros = np.count_nonzero(self.registers == 0)
+        if estimate <= 2.5 * m and zeros:
+            # Small-range correction (linear counting)
+            estimate = m * np.log(m / zeros)
+        return float(estimate)
+
+
+# ==================== OVERLAP ====================
+class AudienceOverlap:
+    """N × N overlap of group audiences, either exact or estimated from sketches"""
+
+    def __init__(self, groups, sizes: np.ndarray, jaccard: np.ndarray, total_unique: float, method: str):
+        self.groups = list(groups)
+        self.sizes = sizes
+        self.method = method
+        self.total_unique = total_unique
+        self.jaccard_values = jaccard
+        # |A ∩ B| from J = I / (|A| + |B| - I)
+        pair_sums = sizes[:, None] + sizes[None, :]
+        self.shared_values = jaccard * pair_sums / (1.0 + jaccard)
+
+    def jaccard(self) -> pd.DataFrame:
+        return pd.DataFrame(np.round(self.jaccard_values, 4), index=self.groups, columns=self.groups)
+
+    def containment(self) -> pd.DataFrame:
+        """Share of the row group's audience that is also in the column group"""
+        values = self.shared_values / np.maximum(self.sizes[:, None], 1)
+        return pd.DataFrame(np.round(np.clip(values, 0, 1), 4), index=self.groups, columns=self.groups)
+
+    def shared(self) -> pd.DataFrame:
+        return pd.DataFrame(np.rint(self.shared_values).astype(np.int64), index=self.groups, columns=self.groups)
+
+    def summary(self) -> str:
+        label = "exact" if self.method == "exact" else "estimated from sketches"
+        return (f"{len(self.groups)} groups, {int(self.sizes.sum())} memberships, "
+                f"~{int(round(self.total_unique))} unique accounts ({label})")
+
+
+def exact_overlap(membership: MembershipMatrix) -> AudienceOverlap:
+    """Exact overlap from the sparse membership matrix"""
+    shared = (membership.matrix.T @ membership.matrix).toarray().astype(np.float64)
+    sizes = np.diag(shared).copy()
+    union = sizes[:, None] + sizes[None, :] - shared
+    jaccard = np.divide(shared, union, out=np.zeros_like(shared), where=union > 0)
+    return AudienceOverlap(membership.groups, sizes, jaccard, float(membership.shape[0]), "exact")
+
+
+def sketch_overlap(df_participants: pd.DataFrame, minhash_size: int = MINHASH_SIZE,
+                   precision: int = HLL_PRECISION) -> AudienceOverlap:
+    """
+    Estimated overlap from one MinHash and one HyperLogLog sketch per group.
+
+    Sketches are built straight from the participant rows (one per membership,
+    with a "Group" column): every user ID is hashed once, group sizes come from
+    each group's HyperLogLog and the unique total from their merged registers.
+    """
+    hashes = hash_ids(df_participants["User ID"].to_numpy())
+    codes, groups = pd.factorize(df_participants["Group"])
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(groups) + 1))
+
+    minhashes, sizes = [], []
+    total = HyperLogLog(precision)
+    for i in range(len(groups)):
+        group_hashes = hashes[order[bounds[i]:bounds[i + 1]]]
+        minhashes.append(MinHashSketch.from_hashes(group_hashes, minhash_size))
+        group_hll = HyperLogLog(precision)
+        group_hll.add_hashes(group_hashes)
+        sizes.append(group_hll.cardinality())
+        total = total.merge(group_hll)
+
+    jaccard = np.eye(len(groups))
+    for i in range(len(groups)):
+        for j in range(i + 1, len(groups)):
+            jaccard[i, j] = jaccard[j, i] = minhashes[i].jaccard(minhashes[j])
+    return AudienceOverlap([str(g) for g in groups], np.array(sizes), jaccard, total.cardinality(), "sketch")
+
+
+def estimate_overlap(df_participants: pd.DataFrame, method: str = "auto",
+                     membership: Optional[MembershipMatrix] = None) -> AudienceOverlap:
+    """
+    Audience overlap between all groups in participant data (API members and message senders).
+
+    Sketches are built from the participant rows and never use the membership
+    matrix. Data without a "Group" column (older wide exports) is always
+    compared exactly.
+
+    Args:
+        df_participants: Participant rows as returned by fetch_participants
+        method: "exact", "sketch", or "auto" (exact for small inputs)
+        membership: Optional MembershipMatrix already built from df_participants (used by exact mode)
+    """
+    if method == "auto":
+        method = "exact" if len(df_participants) <= EXACT_MAX_MEMBERSHIPS else "sketch"
+    if method == "sketch" and "Group" in df_participants.columns:
+        return sketch_overlap(df_participants)
+    return exact_overlap(membership or MembershipMatrix.from_participants(df_participants))
@@ -0,0 +1,208 @@
+# cli.py
+"""
+Headless TGForge: run fetch jobs from a JSON job spec and write the results to disk.
+
+    python cli.py jobs.json [--output-dir DIR] [--quiet]
+
+Progress goes to the terminal. Press Ctrl+C once to stop the running job after its
+current page (partial results are still written); press it again to abort.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import time
+from datetime import date
+from typing import Dict, Any, List
+
+import pandas as pd
+
+import progress
+from crawl_planner import build_crawl_plan
+from exporter import EXPORT_FORMATS, write_tables
+from fetch_channel import fetch_channel_data
+from fetch_forwards import fetch_forwards
+from fetch_messages import fetch_messages, fetch_message_sample
+from fetch_participants import fetch_participants
+from fetch_subscriptions import fetch_user_subscriptions
+from fetch_users import fetch_user_data
+from membership_snapshots import MembershipSnapshotStore
+from takeout_session import run_in_takeout
+from telegram_client import create_client, SESSION_PATH
+
+JOB_TYPES = ("channel", "messages", "forwards", "participants", "users", "subscriptions")
+
+MESSAGE_TABLES = ["top_hashtags", "top_urls", "top_domains", "forward_counts",
+                  "daily_volume", "weekly_volume", "monthly_volume"]
+
+
+def parse_date(value):
+    return date.fromisoformat(value) if value else None
+
+
+def job_targets(job: Dict[str, Any], key: str) -> List[str]:
+    """Channel, group or user list of a job, as a list or a comma-separated string"""
+    values = job.get(key) or []
+    if isinstance(values, str):
+        values = values.split(",")
+    return [str(v).strip() for v in values if str(v).strip()]
+
+
+# ==================== JOBS ====================
+async def run_job(client, job: Dict[str, Any]) -> Dict[str, pd.DataFrame]:
+    """Run one job spec entry and return its output tables"""
+    kind = job["type"]
+    start_date, end_date = parse_date(job.get("start_date")), parse_date(job.get("end_date"))
+
+    async def planned(targets, plan_kind, concurrency=1):
+        if not job.get("plan"):
+            return None
+        return await build_crawl_plan(client, targets, plan_kind, start_date, end_date, concurrency=concurrency)
+
+    if kind == "channel":
+        rows = await fetch_channel_data(client, job_targets(job, "channels"), use_cache=job.get("use_cache", True))
+        return {"channel_info": pd.DataFrame(rows)}
+
+    if kind == "messages":
+        channels = job_targets(job, "channels")
+        if job.get("sample_size"):
+            df, estimates, *tables = await fetch_message_sample(
+                client, channels, sample_size=int(job["sample_size"]), method=job.get("sample_method", "uniform"),
+                seed=int(job.get("seed", 42)), start_date=start_date, end_date=end_date,
+            )
+            return {"messages": df, "sample_estimates": estimates, **dict(zip(MESSAGE_TABLES, tables))}
+        df, *tables = await fetch_messages(
+            client, channels, start_date, end_date, include_comments=job.get("include_comments", True),
+            plan=await planned(channels, "messages"), use_cache=job.get("use_cache", True),
+        )
+        return {"messages": df, **dict(zip(MESSAGE_TABLES, tables))}
+
+    if kind == "forwards":
+        channels = job_targets(job, "channels")
+        df, counts = await fetch_forwards(client, channels, start_date, end_date, plan=await planned(channels, "forwards"),
+                                          use_cache=job.get("use_cache", True))
+        return {"forwards": df, "forward_counts": counts}
+
+    if kind == "participants":
+        groups = job_targets(job, "groups")
+        method = job.get("method", "default")
+        df, reported, fetched, group_counts = await fetch_participants(
+            client, groups, method=method, start_date=start_date, end_date=end_date,
+            plan=await planned(groups, "participants" if method == "default" else "participants_messages",
+                               int(job.get("concurrency", 1))),
+            sharded=job.get("sharded", False), concurrency=int(job.get("concurrency", 1)),
+            snapshot_store=MembershipSnapshotStore() if job.get("snapshot") else None,
+            use_cache=job.get("use_cache", True),
+        )
+        counts = pd.DataFrame(
+            [{"Group": g, "Reported": r, "Fetched": f} for g, (r, f) in group_counts.items()]
+        )
+        progress.write(f"Fetched {fetched} of {reported} reported participants")
+        return {"participants": df, "group_counts": counts}
+
+    if kind == "users":
+        rows = await fetch_user_data(client, job_targets(job, "users"))
+        return {"users": pd.DataFrame(rows)}
+
+    if kind == "subscriptions":
+        channels, groups = await fetch_user_subscriptions(
+            client, include_archived=job.get("include_archived", True), enrich=job.get("enrich", False)
+        )
+        return {"subscription_channels": pd.DataFrame(channels), "subscription_groups": pd.DataFrame(groups)}
+
+    raise ValueError(f"Unknown job type '{kind}' (expected one of {', '.join(JOB_TYPES)})")
+
+
+def write_outputs(tables: Dict[str, pd.DataFrame], directory: str, fmt: str = "CSV",
+                  bundle: bool = False) -> Dict[str, int]:
+    """Stream every table to disk in fmt (zipped into one file when bundle is set); returns row counts"""
+    tables = {name: df for name, df in tables.items() if isinstance(df, pd.DataFrame)}
+    write_tables(tables, directory, fmt, os.path.basename(os.path.normpath(directory)) if bundle else None)
+    return {name: len(df) for name, df in tables.items()}
+
+
+async def run_spec(spec: Dict[str, Any], output_dir: str, reporter: progress.ConsoleReporter) -> List[Dict[str, Any]]:
+    """Log in once, then run the spec's jobs in order; returns one summary row per job"""
+    api_id = spec.get("api_id") or os.environ.get("TG_API_ID")
+    api_hash = spec.get("api_hash") or os.environ.get("TG_API_HASH")
+    if not api_id or not api_hash:
+        raise SystemExit("api_id and api_hash must be set in the job spec or as TG_API_ID / TG_API_HASH")
+
+    client = create_client(int(api_id), api_hash, spec.get("session", SESSION_PATH))
+    await client.connect()
+    if not await client.is_user_authorized():
+        if not sys.stdin.isatty():
+            raise SystemExit("The session is not logged in; run once in a terminal to log in interactively")
+        await client.start(phone=spec.get("phone"))
+
+    for job in spec.get("jobs", []):
+        fmt = job.get("format", spec.get("format", "CSV"))
+        if fmt not in EXPORT_FORMATS:
+            raise SystemExit(f"Unknown output format '{fmt}' (expected one of {', '.join(EXPORT_FORMATS)})")
+
+    summary = []
+    try:
+        for index, job in enumerate(spec.get("jobs", []), start=1):
+            name = job.get("name") or f"{index:02d}_{job.get('type')}"
+            if reporter.cancelled():
+                summary.append({"Job": name, "Status": "Skipped"})
+                continue
+            progress.write(f"Starting job {name}")
+            started = time.monotonic()
+            try:
+                if job.get("takeout"):
+                    tables = await run_in_takeout(client, lambda takeout: run_job(takeout, job))
+                else:
+                    tables = await run_job(client, job)
+                rows = write_outputs(tables, os.path.join(output_dir, name), job.get("format", spec.get("format", "CSV")),
+                                     job.get("zip", spec.get("zip", False)))
+                status = "Cancelled" if reporter.cancelled() else "Done"
+                summary.append({"Job": name, "Status": status, "Rows": rows,
+                                "Seconds": round(time.monotonic() - started, 1)})
+                progress.write(f"Job {name}: {status.lower()}, wrote {', '.join(f'{k} ({v})' for k, v in rows.items())}")
+            except Exception as e:
+                progress.error(f"Job {name} failed: {e}")
+                summary.append({"Job": name, "Status": "Failed", "Error": str(e)})
+    finally:
+        await client.disconnect()
+    return summary
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run TGForge fetch jobs without the browser UI.")
+    parser.add_argument("spec", help="JSON job spec file")
+    parser.add_argument("--output-dir", help="Output folder (default: output_dir in the spec, else 'tgforge_output')")
+    parser.add_argument("--quiet", action="store_true", help="Only print the final summary")
+    args = parser.parse_args(argv)
+
+    with open(args.spec, encoding="utf-8") as f:
+        spec = json.load(f)
+    output_dir = args.output_dir or spec.get("output_dir", "tgforge_output")
+
+    reporter = progress.NullReporter() if args.quiet else progress.ConsoleReporter()
+
+    def on_interrupt(signum, frame):
+        if reporter.cancelled():
+            raise KeyboardInterrupt
+        reporter.cancel()
+        print("Stopping after the current page (Ctrl+C again to abort)...", file=sys.stderr, flush=True)
+
+    signal.signal(signal.SIGINT, on_interrupt)
+    if sys.platform == "win32":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+    with progress.use_reporter(reporter):
+        summary = asyncio.run(run_spec(spec, output_dir, reporter))
+
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, "job_summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    for row in summary:
+        print(f"{row['Job']}: {row['Status']}" + (f" ({row['Error']})" if row.get("Error") else ""))
+    return 1 if any(row["Status"] == "Failed" for row in summary) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
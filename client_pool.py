@@ -0,0 +1,247 @@
+# client_pool.py
+import asyncio
+import glob
+import os
+from collections import deque
+from typing import Dict, Any, List
+
+import pandas as pd
+import progress
+from telethon import TelegramClient
+from telethon.errors import FloodWaitError
+from tenacity import stop_after_attempt
+
+from fetch_channel import fetch_channel_data
+from fetch_forwards import fetch_forwards, build_forward_counts
+from fetch_messages import fetch_messages, MessageAnalytics
+from fetch_participants import fetch_participants
+from rate_limiter import RateLimiter
+
+# Extra research accounts: authorized Telethon session files placed in this folder
+POOL_SESSIONS_DIR = "sessions"
+
+# An account is taken out of the pool after this many failed jobs in a row
+MAX_CONSECUTIVE_FAILURES = 3
+
+
+def find_pool_sessions(directory: str = POOL_SESSIONS_DIR) -> List[str]:
+    """Session paths (without the .session suffix) of the extra accounts"""
+    return sorted(path[:-len(".session")] for path in glob.glob(os.path.join(directory, "*.session")))
+
+
+class PooledAccount:
+    """One logged-in account of the pool, with its own pacing and health state"""
+
+    def __init__(self, name: str, client, min_interval: float = 1.0):
+        self.name = name
+        self.client = client
+        self.limiter = RateLimiter(max_concurrency=1, min_interval=min_interval)
+        self.healthy = True
+        self.consecutive_failures = 0
+        self.completed = 0
+        self.flood_waits = 0
+        self.last_error = ""
+
+    def to_dict(self) -> Dict[str, Any]:
+        status = "Disabled" if not self.healthy else ("Cooling down" if self.limiter.cooling_down else "Ready")
+        return {
+            "Account": self.name,
+            "Status": status,
+            "Cooldown (s)": int(self.limiter.cooldown_remaining),
+            "Jobs Completed": self.completed,
+            "Flood Waits": self.flood_waits,
+            "Last Error": self.last_error,
+        }
+
+
+class ClientPool:
+    """
+    Several Telegram accounts sharing one job.
+
+    Work items (usually channels or groups) sit in one queue; each account takes
+    the next item when it is ready. An account that hits a flood wait is put in
+    cooldown and its item goes back to the front of the queue for another
+    account, so throughput scales with the number of healthy accounts. Access
+    hashes are per account, so every account resolves entities itself.
+    """
+
+    def __init__(self, accounts: List[PooledAccount]):
+        self.accounts = accounts
+
+    @classmethod
+    async def from_sessions(cls, api_id, api_hash, session_paths, primary=None) -> "ClientPool":
+        """Connect to every authorized session; the already logged-in client can be added as primary"""
+        accounts = []
+        if primary is not None:
+            accounts.append(PooledAccount("primary", primary))
+        for path in session_paths:
+            client = TelegramClient(path, int(api_id), api_hash)
+            try:
+                await client.connect()
+                if await client.is_user_authorized():
+                    accounts.append(PooledAccount(os.path.basename(path), client))
+                    continue
+                progress.warning(f"Session {path} is not logged in; skipping")
+            except Exception as e:
+                progress.warning(f"Could not connect session {path}: {e}")
+            await client.disconnect()
+        return cls(accounts)
+
+    def __len__(self):
+        return len(self.accounts)
+
+    def status_dataframe(self) -> pd.DataFrame:
+        return pd.DataFrame([account.to_dict() for account in self.accounts])
+
+    async def map(self, items, job, max_attempts: int = 3) -> list:
+        """
+        Run job(client, item) for every item across the pool.
+
+        Returns results in item order; an item that failed on every attempt (or
+        was never run because no healthy account was left) gets its exception.
+        """
+        items = list(items)
+        queue = deque(range(len(items)))
+        attempts = [0] * len(items)
+        results: List[Any] = [None] * len(items)
+        done = [False] * len(items)
+        remaining = len(items)
+
+        def finish(index, result):
+            nonlocal remaining
+            results[index] = result
+            done[index] = True
+            remaining -= 1
+
+        def retry_or_fail(index, error):
+            if attempts[index] < max_attempts:
+                queue.appendleft(index)
+            else:
+                finish(index, error)
+
+        async def worker(account: PooledAccount):
+            while remaining and account.healthy:
+                if progress.cancelled():
+                    return
+                if account.limiter.cooling_down:
+                    await asyncio.sleep(min(account.limiter.cooldown_remaining, 5.0))
+                    continue
+                if not queue:
+                    # Items may still come back from an account that hits a flood wait
+                    await asyncio.sleep(1.0)
+                    continue
+
+                index = queue.popleft()
+                attempts[index] += 1
+                try:
+                    if not account.client.is_connected():
+                        await account.client.connect()
+                    async with account.limiter:
+                        result = await job(account.client, items[index])
+                    account.consecutive_failures = 0
+                    account.completed += 1
+                    finish(index, result)
+                except FloodWaitError as e:
+                    # The limiter has put this account in cooldown; another account takes the item
+                    account.flood_waits += 1
+                    account.last_error = f"Flood wait of {e.seconds}s"
+                    queue.appendleft(index)
+                except Exception as e:
+                    account.consecutive_failures += 1
+                    account.last_error = str(e)
+                    if account.consecutive_failures >= MAX_CONSECUTIVE_FAILURES:
+                        account.healthy = False
+                    retry_or_fail(index, e)
+
+        await asyncio.gather(*(worker(account) for account in self.accounts))
+        for index in range(len(items)):
+            if not done[index]:
+                results[index] = RuntimeError("No healthy account was available for this item")
+        return results
+
+
+# ==================== POOLED FETCHERS ====================
+# The fetchers run with raise_errors=True so flood waits and failures reach
+# ClientPool.map, which cools the account down, retries elsewhere or disables it
+def _report_failures(names, results):
+    for name, result in zip(names, results):
+        if isinstance(result, Exception):
+            progress.error(f"Could not fetch '**{name}**': {result}")
+
+
+def _single_attempt(fetcher):
+    # The pool moves an item to another account on a flood wait instead of waiting it out
+    return fetcher.retry_with(stop=stop_after_attempt(1), reraise=True)
+
+async def pooled_fetch_messages(pool: ClientPool, channel_list, start_date=None, end_date=None, include_comments=True,
+                                use_cache=True):
+    """fetch_messages with channels spread across the pool; returns the same tuple"""
+    names = [c.strip() for c in channel_list if c.strip()]
+    fetch_once = _single_attempt(fetch_messages)
+    results = await pool.map(
+        names, lambda client, name: fetch_once(client, [name], start_date, end_date, include_comments=include_comments,
+                                               use_cache=use_cache, raise_errors=True)
+    )
+    _report_failures(names, results)
+    frames = [result[0] for result in results if not isinstance(result, Exception) and not result[0].empty]
+    if not frames:
+        return (pd.DataFrame(), *([pd.DataFrame()] * 7))
+    df = pd.concat(frames, ignore_index=True)
+    df = df.sort_values(by=["Channel", "Message DateTime (UTC)"]).reset_index(drop=True)
+    return (df, *MessageAnalytics(df).get_all_analytics(start_date, end_date))
+
+
+async def pooled_fetch_forwards(pool: ClientPool, channel_list, start_date=None, end_date=None, use_cache=True):
+    """fetch_forwards with channels spread across the pool; returns the same tuple"""
+    names = [c.strip() for c in channel_list if c.strip()]
+    fetch_once = _single_attempt(fetch_forwards)
+    results = await pool.map(
+        names, lambda client, name: fetch_once(client, [name], start_date, end_date, use_cache=use_cache, raise_errors=True)
+    )
+    _report_failures(names, results)
+    frames = [result[0] for result in results if not isinstance(result, Exception) and not result[0].empty]
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if df.empty:
+        return df, pd.DataFrame()
+    return df, build_forward_counts(df)
+
+
+async def pooled_fetch_participants(pool: ClientPool, group_list, method="default", start_date=None, end_date=None,
+                                    sharded=False, snapshot_store=None, use_cache=True):
+    """fetch_participants with groups spread across the pool; returns the same tuple"""
+    names = [g.strip() for g in group_list if g.strip()]
+    results = await pool.map(
+        names,
+        lambda client, name: fetch_participants(client, [name], method=method, start_date=start_date, end_date=end_date,
+                                                sharded=sharded, snapshot_store=snapshot_store, use_cache=use_cache,
+                                                raise_errors=True),
+    )
+    _report_failures(names, results)
+    frames, total_reported, total_fetched, group_counts = [], 0, 0, {}
+    for name, result in zip(names, results):
+        if isinstance(result, Exception):
+            group_counts[name] = ("Not Available", 0)
+            continue
+        df, reported, fetched, counts = result
+        if not df.empty:
+            frames.append(df)
+        total_reported += reported
+        total_fetched += fetched
+        group_counts.update(counts)
+    unified_df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    return unified_df, total_reported, total_fetched, group_counts
+
+
+async def pooled_fetch_channel_data(pool: ClientPool, channel_list, use_cache=True):
+    """fetch_channel_data with channels spread across the pool; rows keep input order"""
+    names = [c.strip() for c in channel_list if c.strip()]
+    results = await pool.map(
+        names, lambda client, name: fetch_channel_data(client, [name], use_cache=use_cache, raise_errors=True)
+    )
+    rows = []
+    for name, result in zip(names, results):
+        if isinstance(result, Exception):
+            rows.append({"Error": f"Could not fetch info for {name}: {result}"})
+        else:
+            rows.extend(result)
+    return rows
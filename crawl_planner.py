@@ -0,0 +1,264 @@
+# crawl_planner.py
+import math
+import time
+import heapq
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List
+
+import pandas as pd
+
+from entity_cache import get_cached_entity
+
+# ==================== COST MODEL ====================
+# Mirrors the pacing used by the fetchers: pages of 1000 messages with a one second
+# pause between pages, which Telethon splits into requests of 100 messages each.
+MESSAGE_PAGE_SIZE = 1000
+MESSAGES_PER_REQUEST = 100
+PARTICIPANTS_PER_REQUEST = 200
+PAGE_DELAY_SECONDS = 1.0
+SECONDS_PER_REQUEST = 0.5
+# Telegram only returns about this many members for large groups via the default method
+PARTICIPANT_VISIBLE_CAP = 10000
+
+PLAN_KINDS = ("messages", "forwards", "participants", "participants_messages")
+
+
+def format_duration(seconds: float) -> str:
+    """Format a number of seconds as a short human readable duration"""
+    seconds = int(max(seconds, 0))
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    if minutes:
+        return f"{minutes}m {seconds:02d}s"
+    return f"{seconds}s"
+
+
+def estimate_message_cost(message_count: int) -> Dict[str, float]:
+    """Estimate pages, requests and seconds needed to page through message_count messages"""
+    pages = math.ceil(message_count / MESSAGE_PAGE_SIZE) if message_count else 1
+    requests = max(math.ceil(message_count / MESSAGES_PER_REQUEST), 1)
+    seconds = requests * SECONDS_PER_REQUEST + pages * PAGE_DELAY_SECONDS
+    return {"pages": pages, "requests": requests, "seconds": seconds}
+
+
+def estimate_participant_cost(participant_count: int) -> Dict[str, float]:
+    """Estimate pages, requests and seconds needed to enumerate participant_count members"""
+    requests = max(math.ceil(participant_count / PARTICIPANTS_PER_REQUEST), 1)
+    seconds = requests * SECONDS_PER_REQUEST
+    return {"pages": requests, "requests": requests, "seconds": seconds}
+
+
+# ==================== SIZE ESTIMATION ====================
+async def count_messages_in_window(client, entity, start_date=None, end_date=None) -> int:
+    """
+    Estimate the number of messages in a channel, optionally restricted to a date window.
+
+    Uses limit=0 requests for the total and, when a window is given, the IDs of the
+    newest messages before each boundary (message IDs are sequential per channel).
+    """
+    total = (await client.get_messages(entity, limit=0)).total or 0
+    if not start_date and not end_date:
+        return total
+
+    upper_id = None
+    if end_date:
+        boundary = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+        newest = await client.get_messages(entity, limit=1, offset_date=boundary)
+        upper_id = newest[0].id if newest else 0
+    else:
+        newest = await client.get_messages(entity, limit=1)
+        upper_id = newest[0].id if newest else 0
+
+    lower_id = 0
+    if start_date:
+        boundary = datetime.combine(start_date, datetime.min.time())
+        older = await client.get_messages(entity, limit=1, offset_date=boundary)
+        lower_id = older[0].id if older else 0
+
+    return max(min(upper_id - lower_id, total), 0)
+
+
+async def count_participants(client, entity) -> int:
+    """Return the member count reported for a group or channel (limit=0 request)"""
+    return (await client.get_participants(entity, limit=0)).total or 0
+
+
+# ==================== CRAWL PLAN ====================
+class CrawlTarget:
+    """A single channel or group with its estimated crawl cost"""
+
+    def __init__(self, name: str, kind: str, items: int = 0, error: Optional[str] = None):
+        self.name = name
+        self.kind = kind
+        self.items = items
+        self.error = error
+        self.lane = None
+        if kind in ("participants",):
+            cost = estimate_participant_cost(min(items, PARTICIPANT_VISIBLE_CAP))
+        else:
+            cost = estimate_message_cost(items)
+        self.pages = cost["pages"] if not error else 0
+        self.requests = cost["requests"] if not error else 0
+        self.seconds = cost["seconds"] if not error else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "Target": self.name,
+            "Type": self.kind,
+            "Estimated Items": self.items,
+            "Estimated Pages": self.pages,
+            "Estimated Requests": self.requests,
+            "Estimated Time": format_duration(self.seconds),
+            "Worker": self.lane + 1 if self.lane is not None else None,
+            "Error": self.error or "",
+        }
+
+
+class CrawlPlan:
+    """
+    Largest-first schedule of crawl targets.
+
+    With concurrency above 1 (participant groups fetched side by side), targets
+    are assigned to workers longest-first; a serial crawl is simply the sum.
+    """
+
+    def __init__(self, targets: List[CrawlTarget], concurrency: int = 1):
+        self.concurrency = max(int(concurrency), 1)
+        self.targets = sorted(targets, key=lambda t: t.seconds, reverse=True)
+        if self.concurrency == 1:
+            self.lane_seconds = [sum(t.seconds for t in self.targets)]
+            return
+        # Longest-processing-time-first: biggest jobs start first, each on the least loaded worker
+        lanes = [(0.0, lane) for lane in range(self.concurrency)]
+        heapq.heapify(lanes)
+        self.lane_seconds = [0.0] * self.concurrency
+        for target in self.targets:
+            if target.error:
+                continue
+            load, lane = heapq.heappop(lanes)
+            target.lane = lane
+            self.lane_seconds[lane] = load + target.seconds
+            heapq.heappush(lanes, (self.lane_seconds[lane], lane))
+
+    @property
+    def total_items(self) -> int:
+        return sum(t.items for t in self.targets if not t.error)
+
+    @property
+    def total_requests(self) -> int:
+        return sum(t.requests for t in self.targets)
+
+    @property
+    def estimated_seconds(self) -> float:
+        """Estimated wall-clock time of the whole run (the busiest worker)"""
+        return max(self.lane_seconds) if self.lane_seconds else 0.0
+
+    def get(self, name: str) -> Optional[CrawlTarget]:
+        for target in self.targets:
+            if target.name == name:
+                return target
+        return None
+
+    def covers(self, names: List[str], kind: str) -> bool:
+        """Check whether this plan was built for the given targets and crawl type"""
+        return {t.name for t in self.targets} == set(names) and all(t.kind == kind for t in self.targets)
+
+    def ordered_targets(self, names: List[str]) -> List[str]:
+        """Return names ordered largest-first; names missing from the plan keep their order at the end"""
+        stripped = [n.strip() for n in names]
+        planned = [t.name for t in self.targets if t.name in stripped]
+        return planned + [n for n in names if n.strip() not in planned]
+
+    def summary(self) -> str:
+        workers = f" with {self.concurrency} workers" if self.concurrency > 1 else ""
+        return (
+            f"{len(self.targets)} targets, ~{self.total_items:,} items, "
+            f"~{self.total_requests:,} requests, estimated time {format_duration(self.estimated_seconds)}{workers}"
+        )
+
+    def to_dataframe(self) -> pd.DataFrame:
+        df = pd.DataFrame([t.to_dict() for t in self.targets])
+        return df.drop(columns="Worker") if self.concurrency == 1 and not df.empty else df
+
+    def progress(self) -> "CrawlProgress":
+        return CrawlProgress(self)
+
+
+async def build_crawl_plan(client, target_list, kind="messages", start_date=None, end_date=None, concurrency=1) -> CrawlPlan:
+    """
+    Build a crawl plan using cheap count requests for each target.
+
+    Args:
+        client: Telethon client instance
+        target_list: List of channel or group usernames
+        kind: One of PLAN_KINDS
+        start_date: Optional start date of the crawl window
+        end_date: Optional end date of the crawl window
+        concurrency: Number of targets that can be crawled at the same time
+
+    Returns:
+        CrawlPlan with targets sorted largest-first
+    """
+    if kind not in PLAN_KINDS:
+        raise ValueError(f"Unknown crawl type: {kind}")
+
+    targets = []
+    for name in target_list:
+        try:
+            entity = await get_cached_entity(client, name)
+            if kind == "participants":
+                items = await count_participants(client, entity)
+            else:
+                items = await count_messages_in_window(client, entity, start_date, end_date)
+            targets.append(CrawlTarget(name, kind, items))
+        except Exception as e:
+            targets.append(CrawlTarget(name, kind, error=str(e)))
+    return CrawlPlan(targets, concurrency)
+
+
+# ==================== LIVE ETA ====================
+class CrawlProgress:
+    """Tracks progress against a crawl plan and derives a live ETA"""
+
+    def __init__(self, plan: CrawlPlan):
+        self.plan = plan
+        self.started_at = time.monotonic()
+        self.done = {t.name: 0 for t in plan.targets}
+        self.finished = set()
+
+    def advance(self, name: str, items: int):
+        """Record items processed for a target"""
+        self.done[name] = self.done.get(name, 0) + items
+
+    def finish(self, name: str):
+        """Mark a target as complete (its remaining estimate drops to zero)"""
+        self.finished.add(name)
+
+    def remaining_items(self) -> int:
+        remaining = 0
+        for target in self.plan.targets:
+            if target.error or target.name in self.finished:
+                continue
+            remaining += max(target.items - self.done.get(target.name, 0), 0)
+        return remaining
+
+    def eta_seconds(self) -> float:
+        """Remaining time based on observed throughput, falling back to the plan's cost model"""
+        processed = sum(self.done.values())
+        elapsed = time.monotonic() - self.started_at
+        remaining = self.remaining_items()
+        if processed and elapsed > 5:
+            rate = processed / elapsed
+            return remaining / rate
+        total = self.plan.total_items or 1
+        return self.plan.estimated_seconds * remaining / total
+
+    def describe(self) -> str:
+        processed = sum(self.done.values())
+        return (
+            f"Progress: {processed:,} / ~{self.plan.total_items:,} items, "
+            f"{len(self.finished)} of {len(self.plan.targets)} targets done — "
+            f"ETA {format_duration(self.eta_seconds())}"
+        )
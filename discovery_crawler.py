@@ -0,0 +1,277 @@
+# discovery_crawler.py
+import asyncio
+import heapq
+import json
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any
+
+import pandas as pd
+import progress
+from telethon.errors import FloodWaitError
+from telethon.tl.types import Channel, PeerChannel
+
+from fetch_messages import MessageProcessor
+from fetch_forwards import ForwardProcessor
+from rate_limiter import RateLimiter
+from entity_cache import ForwardOriginResolver, get_cached_entity
+
+FRONTIER_PATH = "discovery_frontier.json"
+
+# t.me paths that are not usernames (invite links, previews, stickers, ...)
+RESERVED_TME_PATHS = {
+    "joinchat", "s", "c", "addstickers", "addemoji", "addlist", "addtheme", "share",
+    "proxy", "socks", "iv", "setlanguage", "login", "boost", "contact", "bg",
+    "invoice", "confirmphone", "m",
+}
+
+
+def normalize_username(username: Optional[str]) -> Optional[str]:
+    """Normalize a username for de-duplication; returns None for things that are not usernames"""
+    if not username:
+        return None
+    username = username.strip().lstrip("@")
+    if username.lower().startswith(("https://t.me/", "http://t.me/", "t.me/")):
+        username = username.split("t.me/", 1)[1].split("/", 1)[0]
+    username = username.lower()
+    if not username or username in RESERVED_TME_PATHS or username in ("unknown", "not available"):
+        return None
+    return username
+
+
+# ==================== FRONTIER ====================
+class DiscoveryFrontier:
+    """
+    De-duplicated, priority-ordered frontier of channels to crawl.
+
+    Channels are crawled breadth-first (lower depth first) and, within a depth,
+    in order of how often they have been referenced. The frontier can be saved
+    to and loaded from a JSON file so an interrupted crawl can resume.
+    """
+
+    def __init__(self, max_depth: int = 2):
+        self.max_depth = max_depth
+        self.nodes: Dict[str, Dict[str, Any]] = {}
+        self.edges: Counter = Counter()
+        self._heap = []
+        self._order = 0
+
+    def _push(self, username: str):
+        node = self.nodes[username]
+        self._order += 1
+        heapq.heappush(self._heap, (node["depth"], -node["references"], self._order, username))
+
+    def add_seed(self, username: str):
+        username = normalize_username(username)
+        if not username:
+            return
+        if username not in self.nodes:
+            self.nodes[username] = {"depth": 0, "references": 0, "status": "pending", "discovered_from": "", "error": ""}
+            self._push(username)
+
+    def add_reference(self, source: str, target: str, kind: str, count: int = 1):
+        """Record that source forwarded from or mentioned target"""
+        target = normalize_username(target)
+        if not target or target == source:
+            return
+        self.edges[(source, target, kind)] += count
+        depth = self.nodes[source]["depth"] + 1 if source in self.nodes else 1
+        node = self.nodes.get(target)
+        if node is None:
+            status = "pending" if depth <= self.max_depth else "beyond depth"
+            node = {"depth": depth, "references": 0, "status": status, "discovered_from": source, "error": ""}
+            self.nodes[target] = node
+        node["references"] += count
+        if depth < node["depth"]:
+            node["depth"] = depth
+            if node["status"] == "beyond depth" and depth <= self.max_depth:
+                node["status"] = "pending"
+        if node["status"] == "pending":
+            # Stale heap entries are skipped in pop(), so re-pushing updates the priority
+            self._push(target)
+
+    def pop(self) -> Optional[str]:
+        """Return the next pending channel, or None if the frontier is empty"""
+        while self._heap:
+            depth, neg_refs, _, username = heapq.heappop(self._heap)
+            node = self.nodes[username]
+            if node["status"] != "pending" or node["depth"] != depth or node["references"] != -neg_refs:
+                continue
+            node["status"] = "crawling"
+            return username
+        return None
+
+    def mark(self, username: str, status: str, error: str = ""):
+        self.nodes[username]["status"] = status
+        self.nodes[username]["error"] = error
+        if status == "pending":
+            self._push(username)
+
+    def count(self, status: str) -> int:
+        return sum(1 for node in self.nodes.values() if node["status"] == status)
+
+    def save(self, path: str = FRONTIER_PATH):
+        data = {
+            "max_depth": self.max_depth,
+            "nodes": self.nodes,
+            "edges": [[s, t, k, c] for (s, t, k), c in self.edges.items()],
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = FRONTIER_PATH, max_depth: Optional[int] = None) -> "DiscoveryFrontier":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        frontier = cls(max_depth if max_depth is not None else data.get("max_depth", 2))
+        frontier.nodes = data.get("nodes", {})
+        frontier.edges = Counter({(s, t, k): c for s, t, k, c in data.get("edges", [])})
+        for username, node in frontier.nodes.items():
+            # Channels that were mid-crawl when the run stopped are crawled again
+            if node["status"] == "crawling":
+                node["status"] = "pending"
+            if node["status"] == "beyond depth" and node["depth"] <= frontier.max_depth:
+                node["status"] = "pending"
+            if node["status"] == "pending":
+                frontier._push(username)
+        return frontier
+
+    def nodes_dataframe(self) -> pd.DataFrame:
+        rows = [
+            {
+                "Username": username,
+                "URL": f"https://t.me/{username}",
+                "Depth": node["depth"],
+                "References": node["references"],
+                "Discovered From": node["discovered_from"] or "Seed",
+                "Status": node["status"],
+                "Error": node["error"],
+            }
+            for username, node in self.nodes.items()
+        ]
+        df = pd.DataFrame(rows)
+        if not df.empty:
+            df = df.sort_values(by=["Depth", "References"], ascending=[True, False]).reset_index(drop=True)
+        return df
+
+    def edges_dataframe(self) -> pd.DataFrame:
+        rows = [
+            {"Source": s, "Target": t, "Type": k, "Count": c}
+            for (s, t, k), c in self.edges.items()
+        ]
+        df = pd.DataFrame(rows, columns=["Source", "Target", "Type", "Count"])
+        return df.sort_values(by="Count", ascending=False).reset_index(drop=True)
+
+
+# ==================== CHANNEL CRAWL ====================
+async def collect_references(client, username, messages_per_channel=500, start_date=None, end_date=None) -> Counter:
+    """Scan a channel's recent messages and count forward origins and t.me mentions"""
+    entity = await get_cached_entity(client, username)
+    if not isinstance(entity, Channel):
+        raise ValueError("Not a channel or group")
+
+    origin_resolver = ForwardOriginResolver()
+    message_processor = MessageProcessor(entity)
+    forward_processor = ForwardProcessor(entity, origin_resolver)
+    references = Counter()
+
+    messages = []
+    offset_date = datetime.combine(end_date + timedelta(days=1), datetime.min.time()) if end_date else None
+    async for message in client.iter_messages(entity, limit=messages_per_channel, offset_date=offset_date):
+        if start_date and message.date and message.date.replace(tzinfo=None).date() < start_date:
+            break
+        messages.append(message)
+
+    # Origins without an entity would otherwise be lost to the frontier
+    await origin_resolver.resolve(client, entity, messages)
+
+    for message in messages:
+        # Only channel origins can be crawled; forwards from users are skipped
+        if message.forward and isinstance(ForwardOriginResolver.origin_peer(message.forward), PeerChannel):
+            forward_info = forward_processor.extract_forward_info(message)
+            references[(forward_info["username"], "forward")] += 1
+        for mention in message_processor.extract_mentions(message.text):
+            references[(mention, "mention")] += 1
+    return references
+
+
+async def run_discovery_crawl(client, seeds, max_depth=2, max_channels=100, messages_per_channel=500,
+                              start_date=None, end_date=None, concurrency=3, resume=False,
+                              frontier_path=FRONTIER_PATH):
+    """
+    Breadth-first snowball crawl from seed channels via forwards and t.me mentions.
+
+    Args:
+        client: Telethon client instance
+        seeds: List of seed channel usernames
+        max_depth: Maximum distance from a seed to crawl
+        max_channels: Crawl budget (number of channels crawled in this run)
+        messages_per_channel: Most recent messages scanned per channel
+        start_date: Optional start date for scanned messages
+        end_date: Optional end date for scanned messages
+        concurrency: Number of channels crawled at the same time
+        resume: Continue from the frontier saved at frontier_path
+        frontier_path: Where the frontier is persisted after every channel
+
+    Returns:
+        Tuple of (nodes dataframe, edges dataframe)
+    """
+    if resume and os.path.exists(frontier_path):
+        frontier = DiscoveryFrontier.load(frontier_path, max_depth)
+    else:
+        frontier = DiscoveryFrontier(max_depth)
+    for seed in seeds:
+        frontier.add_seed(seed)
+
+    limiter = RateLimiter(max_concurrency=concurrency, min_interval=1.0)
+    progress_text = progress.empty()
+    crawled = 0
+    in_flight = 0
+    wake = asyncio.Event()
+
+    async def worker():
+        nonlocal crawled, in_flight
+        while True:
+            if crawled + in_flight >= max_channels or progress.cancelled():
+                return
+            username = frontier.pop()
+            if username is None:
+                if in_flight == 0:
+                    return
+                # Another worker may still add to the frontier
+                wake.clear()
+                await wake.wait()
+                continue
+
+            in_flight += 1
+            try:
+                async with limiter:
+                    references = await collect_references(
+                        client, username, messages_per_channel, start_date, end_date
+                    )
+                for (target, kind), count in references.items():
+                    frontier.add_reference(username, target, kind, count)
+                frontier.mark(username, "crawled")
+                crawled += 1
+            except FloodWaitError as e:
+                frontier.mark(username, "pending")
+                progress_text.write(f"Flood wait of {e.seconds}s while crawling **{username}**, pausing.")
+            except Exception as e:
+                frontier.mark(username, "failed", str(e))
+            finally:
+                in_flight -= 1
+                frontier.save(frontier_path)
+                wake.set()
+
+            progress_text.write(
+                f"Crawled {crawled} of up to {max_channels} channels — "
+                f"{frontier.count('pending')} pending, {len(frontier.nodes)} discovered"
+            )
+
+    await asyncio.gather(*(worker() for _ in range(max(int(concurrency), 1))))
+    frontier.save(frontier_path)
+    progress_text.write(f"Discovery finished: crawled {crawled} channels, discovered {len(frontier.nodes)}.")
+    return frontier.nodes_dataframe(), frontier.edges_dataframe()
@@ -0,0 +1,122 @@
+# engagement_refresh.py
+import re
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Any, List, Tuple
+
+import pandas as pd
+import progress
+from telethon import functions
+from telethon.tl.types import UpdateMessageReactions
+
+from message_store import MessageStore
+from rate_limiter import RateLimiter
+from entity_cache import get_cached_entity
+
+# Telegram accepts up to 100 message IDs per views/reactions request
+BATCH_SIZE = 100
+
+MESSAGE_URL_PATTERN = re.compile(r"https?://t\.me/([A-Za-z0-9_]+)/(\d+)")
+
+
+def keys_from_dataframe(df: pd.DataFrame) -> List[Tuple[str, int]]:
+    """Extract (channel username, message ID) pairs from the "Message URL" column of an export"""
+    if "Message URL" not in df.columns:
+        return []
+    pairs = set()
+    for url in df["Message URL"].dropna().astype(str):
+        match = MESSAGE_URL_PATTERN.match(url)
+        if match and match.group(1).lower() != "c":
+            pairs.add((match.group(1), int(match.group(2))))
+    return sorted(pairs)
+
+
+def keys_from_store(store: MessageStore, channel_list=None) -> List[Tuple[str, int]]:
+    """(channel username, message ID) pairs for messages kept in the local message store"""
+    return [(username, message_id) for username, _, message_id in store.message_keys(channel_list) if username]
+
+
+def count_reactions(reactions) -> int:
+    if not reactions or not reactions.results:
+        return 0
+    return sum(reaction.count for reaction in reactions.results)
+
+
+async def refresh_engagement(client, message_keys, include_reactions=True, store=None, limiter=None):
+    """
+    Fetch current engagement counters for already-collected posts.
+
+    Views, forwards and reply counts come from one GetMessagesViews call per
+    100 message IDs; reactions (optional) cost one more call per batch.
+
+    Args:
+        client: Telethon client instance
+        message_keys: Iterable of (channel username, message ID) pairs
+        include_reactions: Whether to also refresh reaction counts
+        store: Optional MessageStore the snapshots are appended to
+        limiter: Optional RateLimiter shared with other jobs
+
+    Returns:
+        DataFrame with one time-stamped snapshot row per message
+    """
+    limiter = limiter or RateLimiter(max_concurrency=1, min_interval=1.0)
+    snapshot_at = datetime.utcnow().isoformat(timespec="seconds")
+
+    by_channel: Dict[str, List[int]] = defaultdict(list)
+    for username, message_id in message_keys:
+        by_channel[username.strip().lstrip("@")].append(int(message_id))
+
+    progress_text = progress.empty()
+    snapshots: List[Dict[str, Any]] = []
+    for channel_name, message_ids in by_channel.items():
+        if progress.cancelled():
+            progress_text.write("Canceled by user.")
+            break
+        try:
+            channel = await get_cached_entity(client, channel_name)
+        except ValueError:
+            progress.error(f"Channel '**{channel_name}**' does not exist. Skipping.")
+            continue
+
+        message_ids = sorted(set(message_ids))
+        for start in range(0, len(message_ids), BATCH_SIZE):
+            batch = message_ids[start:start + BATCH_SIZE]
+            progress_text.write(
+                f"Refreshing engagement for **{channel_name}**: {start + len(batch)} of {len(message_ids)} posts"
+            )
+            try:
+                views_result = await limiter.call(
+                    client, functions.messages.GetMessagesViewsRequest(peer=channel, id=batch, increment=False)
+                )
+                reactions = {}
+                if include_reactions:
+                    updates = await limiter.call(
+                        client, functions.messages.GetMessagesReactionsRequest(peer=channel, id=batch)
+                    )
+                    for update in getattr(updates, "updates", []):
+                        if isinstance(update, UpdateMessageReactions):
+                            reactions[update.msg_id] = count_reactions(update.reactions)
+            except Exception as e:
+                progress_text.write(f"Error refreshing engagement for {channel_name}: {e}")
+                continue
+
+            for message_id, views in zip(batch, views_result.views):
+                replies = views.replies.replies if views.replies else 0
+                forwards = views.forwards or 0
+                reaction_count = reactions.get(message_id, 0) if include_reactions else None
+                snapshots.append({
+                    "Channel": channel_name,
+                    "Message ID": message_id,
+                    "Message URL": f"https://t.me/{channel_name}/{message_id}",
+                    "Snapshot At (UTC)": snapshot_at,
+                    "Views": views.views,
+                    "Forwards": forwards,
+                    "Replies": replies,
+                    "Reactions": reaction_count,
+                    "Total Engagement": (reaction_count or 0) + replies + forwards,
+                })
+
+    if store is not None and snapshots:
+        store.add_engagement_snapshots(snapshots)
+    progress_text.write(f"Refreshed engagement for {len(snapshots)} posts.")
+    return pd.DataFrame(snapshots)
@@ -0,0 +1,317 @@
+# entity_cache.py
+import sqlite3
+import threading
+import time
+import weakref
+from datetime import datetime, timedelta
+from typing import Optional, Dict, List, Tuple
+
+from telethon import functions, utils
+from telethon.extensions import BinaryReader
+from telethon.tl.types import PeerChannel, PeerUser, InputChannelFromMessage, InputUserFromMessage
+
+import progress
+
+ENTITY_CACHE_PATH = "tgforge_entities.sqlite"
+
+# Username resolves are heavily flood-limited, so resolved entities are reused for a day
+ENTITY_TTL_SECONDS = 24 * 60 * 60
+
+# Telegram accepts up to 100 channels or users per lookup request
+LOOKUP_BATCH_SIZE = 100
+
+# Origins Telegram did not return are looked up again after this long, in case the miss was transient
+ORIGIN_MISS_TTL_SECONDS = 24 * 60 * 60
+
+
+# ==================== ORIGIN CACHE ====================
+class OriginCache:
+    """
+    Persistent peer ID → (username, title) map for forward origins.
+
+    Keys are marked peer IDs (as in the "Forwarded Chat ID" column). Origins that
+    could not be resolved are stored with an empty username and title so they
+    are not looked up again on every run; such misses expire after `miss_ttl`.
+    """
+
+    def __init__(self, path: str = ENTITY_CACHE_PATH, miss_ttl: float = ORIGIN_MISS_TTL_SECONDS):
+        self.miss_ttl = miss_ttl
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS origins (
+                peer_id INTEGER PRIMARY KEY,
+                username TEXT,
+                title TEXT,
+                resolved_at TEXT NOT NULL
+            )
+            """
+        )
+        self.conn.commit()
+        # peer ID → (username, title, resolved_at)
+        self._memory: Dict[int, Tuple[Optional[str], Optional[str], str]] = {}
+
+    def get(self, peer_id: int) -> Optional[Tuple[Optional[str], Optional[str]]]:
+        entry = self._memory.get(peer_id)
+        if entry is None:
+            with self._lock:
+                entry = self.conn.execute(
+                    "SELECT username, title, resolved_at FROM origins WHERE peer_id = ?", (peer_id,)
+                ).fetchone()
+            if entry is None:
+                return None
+            entry = tuple(entry)
+            self._memory[peer_id] = entry
+        username, title, resolved_at = entry
+        if username is None and title is None:
+            cutoff = (datetime.utcnow() - timedelta(seconds=self.miss_ttl)).isoformat(timespec="seconds")
+            if resolved_at < cutoff:
+                return None
+        return username, title
+
+    def put_many(self, entries: Dict[int, Tuple[Optional[str], Optional[str]]]):
+        if not entries:
+            return
+        now = datetime.utcnow().isoformat(timespec="seconds")
+        self._memory.update({peer_id: (username, title, now) for peer_id, (username, title) in entries.items()})
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO origins (peer_id, username, title, resolved_at) VALUES (?, ?, ?, ?)",
+                [(peer_id, username, title, now) for peer_id, (username, title) in entries.items()],
+            )
+            self.conn.commit()
+
+
+_origin_cache = None
+
+
+def get_origin_cache() -> OriginCache:
+    """Shared OriginCache, opened on first use"""
+    global _origin_cache
+    if _origin_cache is None:
+        _origin_cache = OriginCache()
+    return _origin_cache
+
+
+def describe_entity(entity) -> Tuple[Optional[str], Optional[str]]:
+    """(username, title) of a channel, chat or user; users get their display name as title"""
+    username = getattr(entity, "username", None)
+    if not username and getattr(entity, "usernames", None):
+        active = [u.username for u in entity.usernames if u.active]
+        username = active[0] if active else None
+    title = getattr(entity, "title", None) or utils.get_display_name(entity) or None
+    return username, title
+
+
+# ==================== FORWARD ORIGIN RESOLVER ====================
+class ForwardOriginResolver:
+    """
+    Fills in forward origins Telethon did not receive an entity for.
+
+    resolve() collects every unresolved origin in a batch of messages and looks
+    them up with one GetChannels / GetUsers request per 100 origins, referencing
+    each origin through the message it was seen in. Results go to the persistent
+    OriginCache so an origin is resolved once across runs.
+    """
+
+    def __init__(self, cache: Optional[OriginCache] = None):
+        self.cache = cache or get_origin_cache()
+
+    @staticmethod
+    def origin_peer(forward):
+        return getattr(getattr(forward, "original_fwd", None), "from_id", None)
+
+    async def resolve(self, client, channel, messages):
+        """Resolve all unknown origins among the forwards in messages (from the given channel)"""
+        input_peer = utils.get_input_peer(channel)
+        channel_refs: Dict[int, InputChannelFromMessage] = {}
+        user_refs: Dict[int, InputUserFromMessage] = {}
+
+        for message in messages:
+            forward = message.forward
+            if not forward or forward.chat is not None:
+                continue
+            peer = self.origin_peer(forward)
+            if peer is None:
+                continue
+            peer_id = utils.get_peer_id(peer)
+            if peer_id in channel_refs or peer_id in user_refs or self.cache.get(peer_id) is not None:
+                continue
+            if isinstance(peer, PeerChannel):
+                channel_refs[peer_id] = InputChannelFromMessage(peer=input_peer, msg_id=message.id, channel_id=peer.channel_id)
+            elif isinstance(peer, PeerUser):
+                user_refs[peer_id] = InputUserFromMessage(peer=input_peer, msg_id=message.id, user_id=peer.user_id)
+
+        resolved: Dict[int, Tuple[Optional[str], Optional[str]]] = {}
+        resolved.update(await self._lookup(client, channel_refs, users=False))
+        resolved.update(await self._lookup(client, user_refs, users=True))
+        self.cache.put_many(resolved)
+        return len(resolved)
+
+    async def _lookup(self, client, refs: Dict[int, object], users: bool):
+        resolved = {}
+        peer_ids: List[int] = list(refs)
+        for start in range(0, len(peer_ids), LOOKUP_BATCH_SIZE):
+            batch = peer_ids[start:start + LOOKUP_BATCH_SIZE]
+            try:
+                if users:
+                    entities = await client(functions.users.GetUsersRequest(id=[refs[p] for p in batch]))
+                else:
+                    entities = (await client(functions.channels.GetChannelsRequest(id=[refs[p] for p in batch]))).chats
+            except Exception as e:
+                progress.warning(f"Could not resolve {len(batch)} forward origins: {e}")
+                continue
+            for entity in entities:
+                resolved[utils.get_peer_id(entity)] = describe_entity(entity)
+            # Origins Telegram would not return (deleted, private) are remembered as unknown
+            for peer_id in batch:
+                resolved.setdefault(peer_id, (None, None))
+        return resolved
+
+    def lookup(self, forward) -> Tuple[Optional[str], Optional[str]]:
+        """Cached (username, title) of a forward's origin, or (None, None)"""
+        peer = self.origin_peer(forward)
+        if peer is None:
+            return None, None
+        return self.cache.get(utils.get_peer_id(peer)) or (None, None)
+
+
+# ==================== ENTITY CACHE ====================
+def normalize_identifier(identifier) -> str:
+    """Cache key for a username, t.me link or numeric ID"""
+    key = str(identifier).strip()
+    for prefix in ("https://", "http://"):
+        if key.lower().startswith(prefix):
+            key = key[len(prefix):]
+    if key.lower().startswith("t.me/"):
+        key = key[len("t.me/"):].split("/", 1)[0]
+    return key.lstrip("@").lower()
+
+
+class EntityCache:
+    """
+    Username / ID → entity cache shared by all fetchers.
+
+    Entities are kept in memory for the current run and persisted in SQLite with
+    their ID, access hash, type and title (plus the serialized entity), so a
+    username is resolved about once per TTL instead of on every fetch. Access
+    hashes are only valid for the account that obtained them, so entries are
+    stored per account.
+    """
+
+    def __init__(self, path: str = ENTITY_CACHE_PATH, ttl: float = ENTITY_TTL_SECONDS):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entities (
+                account_id INTEGER NOT NULL,
+                key TEXT NOT NULL,
+                peer_id INTEGER NOT NULL,
+                access_hash INTEGER,
+                entity_type TEXT,
+                title TEXT,
+                data BLOB NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (account_id, key)
+            )
+            """
+        )
+        self.conn.commit()
+        self._memory: Dict[Tuple[int, str], Tuple[object, float]] = {}
+        self._accounts = weakref.WeakKeyDictionary()
+
+    async def account_id(self, client) -> int:
+        """ID of the account the client is logged in as"""
+        if client not in self._accounts:
+            me = await client.get_me(input_peer=True)
+            self._accounts[client] = me.user_id
+        return self._accounts[client]
+
+    def _get(self, account_id: int, key: str):
+        now = time.time()
+        cached = self._memory.get((account_id, key))
+        if cached and now - cached[1] < self.ttl:
+            return cached[0]
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT data, fetched_at FROM entities WHERE account_id = ? AND key = ?", (account_id, key)
+            ).fetchone()
+        if row is None or now - row[1] >= self.ttl:
+            return None
+        try:
+            entity = BinaryReader(row[0]).tgread_object()
+        except Exception:
+            # Stored with an incompatible Telethon layer; resolve again
+            return None
+        self._memory[(account_id, key)] = (entity, row[1])
+        return entity
+
+    def put(self, account_id: int, entity, keys=()):
+        """Store an entity under the given keys plus its ID and current username"""
+        self.put_many(account_id, [entity], keys)
+
+    def put_many(self, account_id: int, entities, keys=()):
+        """Store several entities (each under its ID and username, plus keys) in one transaction"""
+        now = time.time()
+        rows = []
+        origins = {}
+        for entity in entities:
+            username, title = describe_entity(entity)
+            peer_id = utils.get_peer_id(entity)
+            all_keys = {normalize_identifier(k) for k in keys}
+            all_keys.add(str(peer_id))
+            if username:
+                all_keys.add(username.lower())
+            data = bytes(entity)
+            for key in all_keys:
+                rows.append((account_id, key, peer_id, getattr(entity, "access_hash", None),
+                             type(entity).__name__, title, data, now))
+                self._memory[(account_id, key)] = (entity, now)
+            origins[peer_id] = (username, title)
+        if not rows:
+            return
+        with self._lock:
+            self.conn.executemany(
+                """
+                INSERT OR REPLACE INTO entities (account_id, key, peer_id, access_hash, entity_type, title, data, fetched_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+            self.conn.commit()
+        get_origin_cache().put_many(origins)
+
+    async def get_entity(self, client, identifier):
+        """Drop-in replacement for client.get_entity(identifier) that uses the cache"""
+        if not isinstance(identifier, (str, int)):
+            return await client.get_entity(identifier)
+        account_id = await self.account_id(client)
+        key = normalize_identifier(identifier)
+        entity = self._get(account_id, key)
+        if entity is None:
+            entity = await client.get_entity(identifier.strip() if isinstance(identifier, str) else identifier)
+            self.put(account_id, entity, keys=[key])
+        return entity
+
+    def get_cached(self, account_id: int, identifier):
+        """Cached entity for an identifier, or None (never makes a request)"""
+        return self._get(account_id, normalize_identifier(identifier))
+
+
+_entity_cache = None
+
+
+def get_entity_cache() -> EntityCache:
+    """Shared EntityCache, opened on first use"""
+    global _entity_cache
+    if _entity_cache is None:
+        _entity_cache = EntityCache()
+    return _entity_cache
+
+
+async def get_cached_entity(client, identifier):
+    """Resolve a username, link or ID through the shared entity cache"""
+    return await get_entity_cache().get_entity(client, identifier)
@@ -0,0 +1,185 @@
+# exporter.py
+import gzip
+import os
+import shutil
+import time
+import uuid
+import zipfile
+from typing import Dict, Iterator, Optional
+from urllib.parse import quote
+
+import pandas as pd
+
+# Streamlit serves the app's static/ folder at app/static/ (server.enableStaticServing in
+# .streamlit/config.toml), so exports written there download straight from disk
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+STATIC_URL = "app/static"
+
+# Exports are written here; files older than a day are removed
+EXPORT_DIR = os.path.join(STATIC_DIR, "tgforge_exports")
+EXPORT_MAX_AGE_SECONDS = 24 * 60 * 60
+
+# Rows serialized at a time, so an export never holds more than one chunk as text
+EXPORT_CHUNK_ROWS = 50_000
+
+# Format name → file extension
+EXPORT_FORMATS = {
+    "CSV": ".csv",
+    "JSONL (gzip)": ".jsonl.gz",
+    "Parquet": ".parquet",
+    "Markdown": ".md",
+    "Excel": ".xlsx",
+}
+
+
+class ExportUnavailable(Exception):
+    """The export format needs a package that is not installed"""
+
+
+def iter_chunks(df: pd.DataFrame, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+# ==================== WRITERS ====================
+def write_csv(df: pd.DataFrame, path: str, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        if df.empty:
+            df.to_csv(f, index=False)
+        for i, chunk in enumerate(iter_chunks(df, chunk_rows)):
+            chunk.to_csv(f, index=False, header=i == 0)
+
+
+def write_jsonl_gz(df: pd.DataFrame, path: str, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for chunk in iter_chunks(df, chunk_rows):
+            text = chunk.to_json(orient="records", lines=True, date_format="iso", force_ascii=False)
+            f.write(text if text.endswith("\n") else text + "\n")
+
+
+def _arrow_safe(chunk: pd.DataFrame) -> pd.DataFrame:
+    # Object columns mix types (e.g. counts and "Not Available"); Parquet needs one type per column
+    chunk = chunk.copy()
+    for column in chunk.columns[chunk.dtypes == object]:
+        chunk[column] = chunk[column].map(lambda v: None if v is None or v != v else str(v))
+    return chunk
+
+
+def write_parquet(df: pd.DataFrame, path: str, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportUnavailable("Parquet export needs the pyarrow package (pip install pyarrow)")
+    schema = pa.Schema.from_pandas(_arrow_safe(df.head(0)), preserve_index=False)
+    # Stringified object columns are strings in every chunk
+    schema = pa.schema([pa.field(f.name, pa.string()) if f.type == pa.null() else f for f in schema])
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in iter_chunks(df, chunk_rows):
+            writer.write_table(pa.Table.from_pandas(_arrow_safe(chunk), schema=schema, preserve_index=False))
+
+
+def write_markdown(df: pd.DataFrame, path: str, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    """Full-length GitHub table; each chunk after the first is appended without its header rows"""
+    with open(path, "w", encoding="utf-8") as f:
+        if df.empty:
+            f.write(df.to_markdown(index=False, tablefmt="github") + "\n")
+        for i, chunk in enumerate(iter_chunks(df, chunk_rows)):
+            lines = chunk.to_markdown(index=False, tablefmt="github").split("\n")
+            f.write("\n".join(lines if i == 0 else lines[2:]) + "\n")
+
+
+def write_excel(sheets: Dict[str, pd.DataFrame], path: str):
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        for sheet_name, df in sheets.items():
+            df.to_excel(writer, sheet_name=sheet_name[:31], index=False)
+
+
+WRITERS = {
+    "CSV": write_csv,
+    "JSONL (gzip)": write_jsonl_gz,
+    "Parquet": write_parquet,
+    "Markdown": write_markdown,
+}
+
+
+# ==================== EXPORTS ====================
+def _new_path(directory: str, name: str, extension: str) -> str:
+    # Served without authentication, so the folder name must not be guessable
+    folder = os.path.join(directory, uuid.uuid4().hex)
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, f"{name}{extension}")
+
+
+def export_table(df: pd.DataFrame, name: str, fmt: str = "CSV", directory: str = EXPORT_DIR) -> str:
+    """Write one table to disk in the given format and return the file path"""
+    extension = EXPORT_FORMATS[fmt]
+    path = _new_path(directory, name, extension)
+    if fmt == "Excel":
+        write_excel({name: df}, path)
+    else:
+        WRITERS[fmt](df, path)
+    return path
+
+
+def export_tables(tables: Dict[str, pd.DataFrame], name: str, fmt: str = "CSV", directory: str = EXPORT_DIR,
+                  bundle: bool = True) -> str:
+    """
+    Write several tables and return the path of the result.
+
+    Excel puts every table in one workbook. Other formats write one file per
+    table, bundled into name.zip when bundle is set (otherwise the folder path
+    is returned).
+    """
+    folder = os.path.dirname(_new_path(directory, name, ""))
+    return write_tables(tables, folder, fmt, name if bundle or fmt == "Excel" else None)
+
+
+def write_tables(tables: Dict[str, pd.DataFrame], folder: str, fmt: str = "CSV",
+                 bundle_name: Optional[str] = None) -> str:
+    """
+    Write tables into folder, one file each, and return the folder.
+
+    With bundle_name the files are zipped into bundle_name.zip (Excel: one
+    bundle_name.xlsx workbook) and the path of that file is returned instead.
+    """
+    os.makedirs(folder, exist_ok=True)
+    extension = EXPORT_FORMATS[fmt]
+    if fmt == "Excel":
+        path = os.path.join(folder, f"{bundle_name or 'tables'}{extension}")
+        write_excel(tables, path)
+        return path
+    for table_name, df in tables.items():
+        WRITERS[fmt](df, os.path.join(folder, f"{table_name}{extension}"))
+    if not bundle_name:
+        return folder
+    zip_path = os.path.join(folder, f"{bundle_name}.zip")
+    with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for table_name in tables:
+            file = os.path.join(folder, f"{table_name}{extension}")
+            archive.write(file, arcname=os.path.basename(file))
+            os.remove(file)
+    return zip_path
+
+
+def export_url(path: str) -> str:
+    """Relative URL under which Streamlit serves an export written below STATIC_DIR"""
+    return f"{STATIC_URL}/{quote(os.path.relpath(path, STATIC_DIR).replace(os.sep, '/'))}"
+
+
+def remove_export(path: Optional[str]):
+    """Delete an export and its folder"""
+    if not path:
+        return
+    folder = path if os.path.isdir(path) else os.path.dirname(path)
+    shutil.rmtree(folder, ignore_errors=True)
+
+
+def cleanup_exports(directory: str = EXPORT_DIR, max_age: float = EXPORT_MAX_AGE_SECONDS):
+    """Remove export folders older than max_age"""
+    if not os.path.isdir(directory):
+        return
+    cutoff = time.time() - max_age
+    for entry in os.scandir(directory):
+        if entry.is_dir() and entry.stat().st_mtime < cutoff:
+            shutil.rmtree(entry.path, ignore_errors=True)
@@ -1,10 +1,77 @@
 #fetch_channel.py
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from typing import Optional, Dict, Any
+
 from telethon import functions
+from telethon.tl.types import MessageActionChannelCreate, MessageActionChatCreate
+from entity_cache import ENTITY_CACHE_PATH, get_cached_entity, get_entity_cache, normalize_identifier
+from rate_limiter import RateLimiter
+
+# Channel info (title, description, member count) is reused for six hours
+CHANNEL_INFO_TTL_SECONDS = 6 * 60 * 60
+
+# Oldest messages checked for a user-generated post when no creation date is available
+FIRST_MESSAGE_PROBE_LIMIT = 50
+
+
+class ChannelInfoCache:
+    """SQLite cache of fetch_channel_data rows, per account (rows include the access hash)"""
+
+    def __init__(self, path: str = ENTITY_CACHE_PATH, ttl: float = CHANNEL_INFO_TTL_SECONDS):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS channel_info (
+                account_id INTEGER NOT NULL,
+                key TEXT NOT NULL,
+                data TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (account_id, key)
+            )
+            """
+        )
+        self.conn.commit()
+
+    def get(self, account_id: int, channel_name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT data, fetched_at FROM channel_info WHERE account_id = ? AND key = ?",
+                (account_id, normalize_identifier(channel_name)),
+            ).fetchone()
+        if row is None or time.time() - row[1] >= self.ttl:
+            return None
+        return json.loads(row[0])
+
+    def put(self, account_id: int, channel_name: str, info: Dict[str, Any]):
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO channel_info (account_id, key, data, fetched_at) VALUES (?, ?, ?, ?)",
+                (account_id, normalize_identifier(channel_name), json.dumps(info, default=str), time.time()),
+            )
+            self.conn.commit()
 
-async def get_first_valid_message_date(client, channel):
-    """Finds the date of the earliest available user-generated message in a channel."""
+
+_channel_info_cache = None
+
+
+def get_channel_info_cache() -> ChannelInfoCache:
+    """Shared ChannelInfoCache, opened on first use"""
+    global _channel_info_cache
+    if _channel_info_cache is None:
+        _channel_info_cache = ChannelInfoCache()
+    return _channel_info_cache
+
+
+async def get_first_valid_message_date(client, channel, limit=FIRST_MESSAGE_PROBE_LIMIT):
+    """Finds the date of the earliest available user-generated message among the oldest `limit` messages."""
     try:
-        async for message in client.iter_messages(channel, reverse=True):
+        async for message in client.iter_messages(channel, reverse=True, limit=limit):
             if message and not message.action:
                 if message.text or message.media:
                     return message.date.isoformat()
@@ -12,63 +79,113 @@ async def get_first_valid_message_date(client, channel):
     except Exception as e:
         return f"Error fetching first message: {e}"
 
-async def fetch_channel_data(client, channel_list):
-    """Fetches and formats information for multiple Telegram channels."""
-    results = []
-    for channel_name in channel_list:
-        try:
-            channel = await client.get_entity(channel_name)
-            result = await client(functions.channels.GetFullChannelRequest(channel=channel))
-            first_message_date = await get_first_valid_message_date(client, channel)
-            chat = result.chats[0]
-
-            title = chat.title
-            description = result.full_chat.about.strip() if result.full_chat.about else "No Description"
-            participants_count = result.full_chat.participants_count if hasattr(result.full_chat, "participants_count") else "Not Available"
-
-            # Extract usernames correctly
-            try:
-                if chat.username:
-                    primary_username = chat.username
-                    backup_usernames = "None"
-                elif chat.usernames:
-                    active_usernames = [u.username for u in chat.usernames if u.active]
-                    primary_username = active_usernames[0] if active_usernames else "No Username"
-                    backup_usernames = ", ".join(active_usernames[1:]) if len(active_usernames) > 1 else "None"
-                else:
-                    primary_username = "No Username"
-                    backup_usernames = "None"
-            except Exception as e:
-                primary_username = "No Username"
-                backup_usernames = "None"
-
-            url = f"https://t.me/{primary_username}" if primary_username != "No Username" else "No public URL available"
-            chat_type = "Channel" if chat.broadcast else "Group"
-            chat_id = chat.id
-            access_hash = chat.access_hash
-            restricted = "Yes" if chat.restricted else "No"
-            scam = "Yes" if chat.scam else "No"
-            verified = "Yes" if chat.verified else "No"
-
-            channel_info = {
-                "Title": title,
-                "Description": description,
-                "Number of Participants": participants_count,
-                "Channel Creation Date": first_message_date,
-                "Primary Username": f"@{primary_username}",
-                "Backup Usernames": backup_usernames,
-                "URL": url,
-                "Chat Type": chat_type,
-                "Chat ID": chat_id,
-                "Access Hash": access_hash,
-                "Restricted": restricted,
-                "Scam": scam,
-                "Verified": verified,
-            }
-
-            results.append(channel_info)
 
+async def get_creation_date(client, channel, chat):
+    """
+    Cheapest available creation date of a channel, with where it came from.
+
+    For channels the account has not joined, chat.date already is the creation
+    date. Otherwise message 1 is normally the "channel created" service message.
+    Only if neither is available are the oldest messages probed.
+    """
+    if getattr(chat, "left", False) and getattr(chat, "date", None):
+        return chat.date.isoformat(), "Channel info"
+    try:
+        first = await client.get_messages(channel, ids=1)
+        if first is not None and isinstance(first.action, (MessageActionChannelCreate, MessageActionChatCreate)):
+            return first.date.isoformat(), "Creation message"
+    except Exception:
+        pass
+    return await get_first_valid_message_date(client, channel), "First message"
+
+
+async def fetch_single_channel(client, channel_name, limiter, attempts=5):
+    """Fetches and formats information for one Telegram channel."""
+    entity_cache = get_entity_cache()
+    channel = entity_cache.get_cached(await entity_cache.account_id(client), channel_name)
+    if channel is None:
+        # Username resolves are the most tightly limited request, so they are paced like the rest
+        async with limiter:
+            channel = await get_cached_entity(client, channel_name)
+    result = await limiter.call(client, functions.channels.GetFullChannelRequest(channel=channel), attempts=attempts)
+    chat = result.chats[0]
+    async with limiter:
+        first_message_date, creation_date_source = await get_creation_date(client, channel, chat)
+
+    title = chat.title
+    description = result.full_chat.about.strip() if result.full_chat.about else "No Description"
+    participants_count = result.full_chat.participants_count if hasattr(result.full_chat, "participants_count") else "Not Available"
+
+    # Extract usernames correctly
+    try:
+        if chat.username:
+            primary_username = chat.username
+            backup_usernames = "None"
+        elif chat.usernames:
+            active_usernames = [u.username for u in chat.usernames if u.active]
+            primary_username = active_usernames[0] if active_usernames else "No Username"
+            backup_usernames = ", ".join(active_usernames[1:]) if len(active_usernames) > 1 else "None"
+        else:
+            primary_username = "No Username"
+            backup_usernames = "None"
+    except Exception as e:
+        primary_username = "No Username"
+        backup_usernames = "None"
+
+    url = f"https://t.me/{primary_username}" if primary_username != "No Username" else "No public URL available"
+    chat_type = "Channel" if chat.broadcast else "Group"
+    chat_id = chat.id
+    access_hash = chat.access_hash
+    restricted = "Yes" if chat.restricted else "No"
+    scam = "Yes" if chat.scam else "No"
+    verified = "Yes" if chat.verified else "No"
+
+    return {
+        "Title": title,
+        "Description": description,
+        "Number of Participants": participants_count,
+        "Channel Creation Date": first_message_date,
+        "Creation Date Source": creation_date_source,
+        "Primary Username": f"@{primary_username}",
+        "Backup Usernames": backup_usernames,
+        "URL": url,
+        "Chat Type": chat_type,
+        "Chat ID": chat_id,
+        "Access Hash": access_hash,
+        "Restricted": restricted,
+        "Scam": scam,
+        "Verified": verified,
+    }
+
+
+async def fetch_channel_data(client, channel_list, concurrency=5, use_cache=True, raise_errors=False):
+    """
+    Fetches and formats information for multiple Telegram channels.
+
+    Channels are looked up concurrently under a shared RateLimiter. Results are
+    cached for CHANNEL_INFO_TTL_SECONDS, so re-profiling the same list is
+    nearly free; use_cache=False forces fresh lookups. Rows keep input order and a
+    failed channel gets an error row. With raise_errors (used by the client pool),
+    flood waits and other failures are raised instead; only a channel that does
+    not exist still gets an error row.
+    """
+    channel_names = [name.strip() for name in channel_list if name.strip()]
+    limiter = RateLimiter(max_concurrency=concurrency, min_interval=0.5)
+    cache = get_channel_info_cache()
+    account_id = await get_entity_cache().account_id(client)
+
+    async def lookup(channel_name):
+        if use_cache:
+            cached = cache.get(account_id, channel_name)
+            if cached is not None:
+                return cached
+        try:
+            info = await fetch_single_channel(client, channel_name, limiter, attempts=1 if raise_errors else 5)
         except Exception as e:
-            results.append({"Error": f"Could not fetch info for {channel_name}: {e}"})
+            if raise_errors and not isinstance(e, ValueError):
+                raise
+            return {"Error": f"Could not fetch info for {channel_name}: {e}"}
+        cache.put(account_id, channel_name, info)
+        return info
 
-    return results
+    return list(await asyncio.gather(*(lookup(name) for name in channel_names)))
@@ -1,18 +1,22 @@
 # fetch_forwards.py
 import pandas as pd
-import time
-import streamlit as st
+import progress
 from telethon.errors import FloodWaitError, RpcCallFailError
-from typing import Dict, Any
+from typing import Dict, Any, List
+from tenacity import retry, stop_after_attempt, retry_if_exception_type
+from fetch_messages import collect_channel_messages
+from entity_cache import ForwardOriginResolver, describe_entity, get_cached_entity
+from result_cache import get_result_cache
 
 # ==================== FORWARD PROCESSOR CLASS ====================
 class ForwardProcessor:
     """Processes forwarded messages into structured data"""
     
-    def __init__(self, channel):
+    def __init__(self, channel, origin_resolver=None):
         self.channel = channel
         self.channel_name = channel.title if hasattr(channel, 'title') else str(channel)
         self.channel_username = getattr(channel, 'username', None)
+        self.origin_resolver = origin_resolver
     
     def extract_forward_info(self, message) -> Dict[str, Any]:
         """Extract information about the forward origin"""
@@ -24,11 +28,18 @@ class ForwardProcessor:
         original_chat_name = "Unknown"
         
         if message.forward.chat:
-            original_chat_name = message.forward.chat.title or "Unknown"
-            if hasattr(message.forward.chat, "username"):
-                original_username = message.forward.chat.username or "Unknown"
-                if message.forward.channel_post:
-                    original_url = f"https://t.me/{original_username}/{message.forward.channel_post}"
+            # Users have no title, so fall back to their display name
+            username, title = describe_entity(message.forward.chat)
+            original_chat_name = title or "Unknown"
+            original_username = username or "Unknown"
+        elif self.origin_resolver:
+            # Origin resolved in the batched post-pass (or cached from an earlier run)
+            username, title = self.origin_resolver.lookup(message.forward)
+            original_chat_name = title or "Unknown"
+            original_username = username or "Unknown"
+
+        if original_username != "Unknown" and message.forward.channel_post:
+            original_url = f"https://t.me/{original_username}/{message.forward.channel_post}"
         
         return {
             'username': original_username,
@@ -76,83 +87,99 @@ class ForwardProcessor:
             "Grouped ID": str(message.grouped_id) if message.grouped_id else "Not Available",
         }
 
+    def project(self, messages) -> List[Dict[str, Any]]:
+        """Build forward rows from already-fetched messages (non-forwards are skipped)"""
+        return [self.process_forward(message) for message in messages if message.forward]
+
 
 # ==================== MAIN FETCH FUNCTION ====================
-async def fetch_forwards(client, channel_list, start_date=None, end_date=None):
-    """Fetches forwarded messages from a list of channels, with optional date range filtering."""
-    all_messages_data = []
-    limit = 1000
+@retry(
+    retry=retry_if_exception_type(FloodWaitError),
+    wait=lambda retry_state: retry_state.outcome.exception().seconds + 1 if isinstance(retry_state.outcome.exception(), FloodWaitError) else 1,
+    stop=stop_after_attempt(5)
+)
+async def fetch_forwards(client, channel_list, start_date=None, end_date=None, plan=None, use_cache=True,
+                         raise_errors=False):
+    """Fetches forwarded messages from a list of channels, with optional date range filtering.
+
+    If a CrawlPlan is given, channels are crawled largest-first and a live ETA is shown.
+    With use_cache, channels fetched by an earlier identical (or wider) query come from the result cache.
+    With raise_errors (used by the client pool), a failing channel raises instead of being skipped.
+    """
+    channel_frames = []
+    result_cache = get_result_cache()
+
+    tracker = None
+    if plan is not None:
+        channel_list = plan.ordered_targets(channel_list)
+        tracker = plan.progress()
+        eta_text = progress.empty()
+        eta_text.write(tracker.describe())
 
     for channel_name in channel_list:
+        cached = result_cache.get("forwards", channel_name, start_date, end_date,
+                                  date_column="Forward Datetime (UTC)") if use_cache else None
+        if cached is not None:
+            progress.write(f"Using cached forwards for **{channel_name}** ({len(cached)} rows)")
+            channel_frames.append(cached)
+            progress.partial("forwards", channel_frames)
+            if tracker:
+                tracker.finish(channel_name)
+                eta_text.write(tracker.describe())
+            continue
+
         try:
-            channel = await client.get_entity(channel_name)
-            processor = ForwardProcessor(channel)  # Create processor for this channel
+            channel = await get_cached_entity(client, channel_name)
+            origin_resolver = ForwardOriginResolver()
+            processor = ForwardProcessor(channel, origin_resolver)  # Create processor for this channel
             
-            progress_text = st.empty()
+            progress_text = progress.empty()
             progress_text.write(f"Processing channel: **{channel_name}**")
-            offset_id = 0
-            total_messages = []
         except ValueError:
-            st.error(f"Channel '{channel_name}' does not exist. Skipping.")
+            progress.error(f"Channel '{channel_name}' does not exist. Skipping.")
             continue
 
+        def advance_eta(count, channel_name=channel_name):
+            tracker.advance(channel_name, count)
+            eta_text.write(tracker.describe())
+
         try:
-            # Fetch messages in batches
-            while True:
-                messages = await client.get_messages(channel, limit=limit, offset_id=offset_id)
-                if not messages:
-                    progress_text.write("No more messages in this batch.")
-                    break
-
-                # Update progress
-                first_date = messages[0].date.replace(tzinfo=None) if messages[0].date else "Unknown"
-                last_date = messages[-1].date.replace(tzinfo=None) if messages[-1].date else "Unknown"
-                progress_text.write(f"Processing messages from {first_date.date()} to {last_date.date()}")
-                
-                stop_fetching = False
-                
-                # Filter messages by date range
-                for message in messages:
-                    message_datetime = message.date.replace(tzinfo=None) if message.date else None
-                    
-                    # Stop if we've gone past the start date
-                    if start_date and message_datetime and message_datetime.date() < start_date:
-                        progress_text.write("Reached messages older than the start date.")
-                        stop_fetching = True
-                        break
-
-                    # Add messages within date range
-                    if ((not start_date or (message_datetime and message_datetime.date() >= start_date)) and 
-                        (not end_date or (message_datetime and message_datetime.date() <= end_date))):
-                        total_messages.append(message)
-
-                if stop_fetching:
-                    break
-
-                offset_id = messages[-1].id if messages else offset_id
-                time.sleep(1)
-
-                # Check for cancellation
-                if st.session_state.get("cancel_fetch", False):
-                    progress_text.write("Canceled by user.")
-                    break
-
-            # Process messages using the class - MUCH CLEANER!
-            messages_data = []
-            for message in total_messages:
-                if message.forward:
-                    forward_data = processor.process_forward(message)
-                    if forward_data:
-                        messages_data.append(forward_data)
+            # Forwards are a projection over the shared message pass, so channels already
+            # fetched for Messages (same or wider window) cost no further requests
+            total_messages = await collect_channel_messages(
+                client, channel, channel_name, start_date, end_date, progress_text,
+                on_page=advance_eta if tracker else None,
+            )
+            # Resolve forward origins Telethon did not receive entities for, in batches
+            try:
+                await origin_resolver.resolve(client, channel, total_messages)
+            except Exception as e:
+                progress_text.write(f"Could not resolve forward origins for {channel_name}: {e}")
+            messages_data = processor.project(total_messages)
 
             progress_text.write(f"Collected {len(messages_data)} forwards (out of {len(total_messages)} messages) for channel {channel_name}.")
-            all_messages_data.extend(messages_data)
-
+            channel_frame = pd.DataFrame(messages_data)
+            if not progress.cancelled():
+                result_cache.put("forwards", channel_name, channel_frame, start_date, end_date)
+            channel_frames.append(channel_frame)
+            progress.partial("forwards", channel_frames)
+
+        except FloodWaitError:
+            raise
         except Exception as e:
+            if raise_errors:
+                raise
             progress_text.write(f"Error fetching forwards for {channel_name}: {e}")
 
-    # Convert to DataFrame
-    df = pd.DataFrame(all_messages_data)
+        if tracker:
+            tracker.finish(channel_name)
+            eta_text.write(tracker.describe())
+
+    # Combine the per-channel frames
+    df = pd.concat(channel_frames, ignore_index=True) if channel_frames else pd.DataFrame()
+    if df.empty:
+        # No forwards in the window, or no channel could be found
+        return df, pd.DataFrame()
 
     # Deduplicate based on Grouped ID
     dedup_df = df[df["Grouped ID"] != "Not Available"].drop_duplicates(subset=["Grouped ID"], keep="first")
@@ -161,9 +188,13 @@ async def fetch_forwards(client, channel_list, start_date=None, end_date=None):
         dedup_df
     ]).sort_values(by=["Channel", "Message DateTime (UTC)"]).reset_index(drop=True)
 
-    # Generate forward counts
+    return df, build_forward_counts(df)
+
+
+def build_forward_counts(df):
+    """Origin × channel table of forward counts, most-forwarded origins first"""
     fwd_counts_df = df.groupby(["Channel", "Origin Username"]).size().reset_index(name="Count")
     fwd_counts_df = fwd_counts_df.pivot(index="Origin Username", columns="Channel", values="Count").fillna(0)
     fwd_counts_df["Total Forwards"] = fwd_counts_df.sum(axis=1)
     fwd_counts_df = fwd_counts_df.sort_values(by="Total Forwards", ascending=False).reset_index()
-    return df, fwd_counts_df
+    return fwd_counts_df
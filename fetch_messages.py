@@ -1,24 +1,33 @@
 # fetch_messages.py
 import pandas as pd
-import time
+import asyncio
 import re
-from collections import Counter
+import math
+import random
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
 from urllib.parse import urlparse
 from telethon.errors import FloodWaitError
 from telethon import functions
-import streamlit as st
+import progress
 from tenacity import retry, stop_after_attempt, retry_if_exception_type
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
+from entity_cache import ForwardOriginResolver, get_cached_entity, get_entity_cache
+from takeout_session import page_delay
+from result_cache import get_result_cache
 
 # ==================== MESSAGE PROCESSOR CLASS ====================
 class MessageProcessor:
     """Processes Telegram messages into structured data"""
     
-    def __init__(self, channel, participant_count=None):
+    def __init__(self, channel, participant_count=None, origin_resolver=None):
         self.channel = channel
         self.channel_name = channel.title if hasattr(channel, 'title') else str(channel)
         self.channel_username = getattr(channel, 'username', None)
         self.participant_count = participant_count
+        self.origin_resolver = origin_resolver
     
     def extract_sender_info(self, message) -> Dict[str, Any]:
         """Extract sender user ID and username"""
@@ -131,6 +140,12 @@ class MessageProcessor:
                 return message.forward.chat.username
         except AttributeError:
             pass
+
+        # Fall back to origins resolved in the batched post-pass
+        if self.origin_resolver:
+            username, _ = self.origin_resolver.lookup(message.forward)
+            if username:
+                return username
         
         return "Unknown"
     
@@ -149,6 +164,10 @@ class MessageProcessor:
                     original_username = message.forward.chat.username
                     if original_username and message.forward.channel_post:
                         return f"https://t.me/{original_username}/{message.forward.channel_post}"
+                elif self.origin_resolver and message.forward.channel_post:
+                    original_username, _ = self.origin_resolver.lookup(message.forward)
+                    if original_username:
+                        return f"https://t.me/{original_username}/{message.forward.channel_post}"
             except AttributeError:
                 pass
         
@@ -341,13 +360,372 @@ class MessageAnalytics:
             self.generate_monthly_volume(start_date, end_date)
         )
         
+# ==================== MESSAGE SAMPLER CLASS ====================
+class MessageSampler:
+    """Draws reproducible random samples of message IDs and estimates channel totals"""
+
+    BATCH_SIZE = 100
+    Z_95 = 1.96
+
+    def __init__(self, client, channel, channel_name: str, seed: int = 42):
+        self.client = client
+        self.channel = channel
+        # Seeded per channel so a channel's sample does not depend on the order of the channel list
+        self.rng = random.Random(f"{seed}:{channel_name.strip().lower()}")
+
+    async def newest_id_before(self, when: Optional[datetime] = None) -> int:
+        """ID of the newest message sent before `when` (or the newest message overall)"""
+        if when is None:
+            messages = await self.client.get_messages(self.channel, limit=1)
+        else:
+            messages = await self.client.get_messages(self.channel, limit=1, offset_date=when)
+        return messages[0].id if messages else 0
+
+    async def oldest_date(self) -> Optional[datetime]:
+        messages = await self.client.get_messages(self.channel, limit=1, reverse=True)
+        return messages[0].date.replace(tzinfo=None) if messages and messages[0].date else None
+
+    async def build_strata(self, start_date=None, end_date=None, method="uniform") -> List[Dict[str, Any]]:
+        """
+        Split the channel's message ID range into strata.
+
+        Message IDs are sequential per channel, so the ID range of a date window is
+        bounded by the newest message before each boundary. "stratified" creates one
+        stratum per calendar month, "uniform" a single stratum for the whole window.
+        """
+        lower_id = await self.newest_id_before(datetime.combine(start_date, datetime.min.time())) if start_date else 0
+        upper_when = datetime.combine(end_date + timedelta(days=1), datetime.min.time()) if end_date else None
+        upper_id = await self.newest_id_before(upper_when)
+
+        if method != "stratified":
+            return [{"label": "All", "low": lower_id, "high": upper_id}]
+
+        first = datetime.combine(start_date, datetime.min.time()) if start_date else await self.oldest_date()
+        last = datetime.combine(end_date, datetime.min.time()) if end_date else datetime.utcnow()
+        if first is None:
+            return [{"label": "All", "low": lower_id, "high": upper_id}]
+
+        month_starts = []
+        month = datetime(first.year, first.month, 1)
+        while month <= last:
+            month_starts.append(month)
+            month = datetime(month.year + (month.month == 12), month.month % 12 + 1, 1)
+
+        strata = []
+        low = lower_id
+        for index, month in enumerate(month_starts):
+            if index + 1 < len(month_starts):
+                high = await self.newest_id_before(month_starts[index + 1])
+            else:
+                high = upper_id
+            high = max(high, low)
+            strata.append({"label": month.strftime("%Y-%m"), "low": low, "high": high})
+            low = high
+        return strata
+
+    def allocate(self, strata: List[Dict[str, Any]], sample_size: int):
+        """Allocate the sample across strata proportionally to their ID range size"""
+        total_ids = sum(s["high"] - s["low"] for s in strata)
+        for stratum in strata:
+            population = stratum["high"] - stratum["low"]
+            share = round(sample_size * population / total_ids) if total_ids else 0
+            stratum["population"] = population
+            stratum["sample_size"] = min(max(share, 1 if population else 0), population)
+
+    def draw_ids(self, stratum: Dict[str, Any]) -> List[int]:
+        return sorted(self.rng.sample(range(stratum["low"] + 1, stratum["high"] + 1), stratum["sample_size"]))
+
+    async def fetch_ids(self, message_ids: List[int]) -> list:
+        """Fetch messages by explicit ID in batches; deleted or missing IDs come back as None"""
+        messages = []
+        for start in range(0, len(message_ids), self.BATCH_SIZE):
+            messages.extend(await self.client.get_messages(self.channel, ids=message_ids[start:start + self.BATCH_SIZE]))
+            await asyncio.sleep(page_delay(self.client, 1))
+        return messages
+
+    def estimate(self, stratum: Dict[str, Any], found: int) -> Dict[str, float]:
+        """Estimated number of messages in a stratum with its variance (finite population correction)"""
+        population, drawn = stratum["population"], stratum["sample_size"]
+        if not drawn:
+            return {"estimate": 0.0, "variance": 0.0}
+        hit_rate = found / drawn
+        fpc = (1 - drawn / population) if population else 0
+        variance = population ** 2 * hit_rate * (1 - hit_rate) / drawn * fpc
+        return {"estimate": population * hit_rate, "variance": variance}
+
+    def estimate_row(self, channel_name, label, first_id, last_id, population, drawn, found, estimate, variance) -> Dict[str, Any]:
+        margin = self.Z_95 * math.sqrt(variance)
+        return {
+            "Channel": channel_name,
+            "Stratum": label,
+            "First ID": first_id,
+            "Last ID": last_id,
+            "ID Range Size": population,
+            "Sampled IDs": drawn,
+            "Messages Found": found,
+            "Estimated Messages": round(estimate),
+            "CI Low (95%)": max(round(estimate - margin), found),
+            "CI High (95%)": round(estimate + margin),
+        }
+
+
+async def fetch_message_sample(client, channel_list, sample_size=1000, method="uniform", seed=42,
+                               start_date=None, end_date=None):
+    """
+    Fetch a reproducible random sample of messages instead of the full history
+
+    Args:
+        client: Telethon client instance
+        channel_list: List of channel usernames to sample from
+        sample_size: Number of message IDs drawn per channel
+        method: "uniform" over the whole ID range, or "stratified" by calendar month
+        seed: Random seed; the same seed, channel and window give the same sample
+        start_date: Optional start date for the sampled window
+        end_date: Optional end date for the sampled window
+
+    Returns:
+        Tuple of (dataframe, sample estimates, hashtags, urls, domains, forwards, daily_vol, weekly_vol, monthly_vol)
+    """
+    all_messages_data = []
+    estimate_rows = []
+
+    for channel_name in channel_list:
+        try:
+            channel = await get_cached_entity(client, channel_name)
+        except ValueError:
+            progress.error(f"Channel '**{channel_name}**' does not exist. Skipping.")
+            continue
+
+        try:
+            result = await client(functions.channels.GetFullChannelRequest(channel=channel))
+            participant_count = result.full_chat.participants_count if hasattr(result.full_chat, "participants_count") else None
+        except Exception as e:
+            progress.warning(f"Could not fetch follower count for {channel_name}: {e}")
+            participant_count = None
+
+        processor = MessageProcessor(channel, participant_count)
+        sampler = MessageSampler(client, channel, channel_name, seed)
+        progress_text = progress.empty()
+
+        try:
+            progress_text.write(f"Measuring message ID range for **{channel_name}**")
+            strata = await sampler.build_strata(start_date, end_date, method)
+            sampler.allocate(strata, sample_size)
+
+            total_estimate = total_variance = 0.0
+            total_drawn = total_found = 0
+            for stratum in strata:
+                if progress.cancelled():
+                    progress_text.write("Canceled by user.")
+                    break
+                message_ids = sampler.draw_ids(stratum)
+                progress_text.write(f"Sampling {len(message_ids)} messages from **{channel_name}** ({stratum['label']})")
+                found = 0
+                for message in await sampler.fetch_ids(message_ids):
+                    # Deleted IDs return None and service messages are not posts
+                    if message is None or getattr(message, "action", None):
+                        continue
+                    message_date = message.date.replace(tzinfo=None).date() if message.date else None
+                    if (start_date and message_date and message_date < start_date) or \
+                            (end_date and message_date and message_date > end_date):
+                        continue
+                    found += 1
+                    all_messages_data.append(processor.process_message(message))
+
+                stratum_estimate = sampler.estimate(stratum, found)
+                total_estimate += stratum_estimate["estimate"]
+                total_variance += stratum_estimate["variance"]
+                total_drawn += stratum["sample_size"]
+                total_found += found
+                if method == "stratified":
+                    estimate_rows.append(sampler.estimate_row(
+                        channel_name, stratum["label"], stratum["low"] + 1, stratum["high"],
+                        stratum["population"], stratum["sample_size"], found, stratum_estimate["estimate"], stratum_estimate["variance"]
+                    ))
+
+            estimate_rows.append(sampler.estimate_row(
+                channel_name, "Total", strata[0]["low"] + 1, strata[-1]["high"],
+                sum(s["population"] for s in strata), total_drawn, total_found, total_estimate, total_variance
+            ))
+            progress_text.write(
+                f"Sampled {total_found} messages from **{channel_name}** "
+                f"(estimated {round(total_estimate):,} messages in the window)"
+            )
+        except Exception as e:
+            progress_text.write(f"Error sampling messages for {channel_name}: {e}")
+
+    df = pd.DataFrame(all_messages_data)
+    estimates_df = pd.DataFrame(estimate_rows)
+    if df.empty:
+        empty = pd.DataFrame()
+        return df, estimates_df, empty, empty, empty, empty, empty, empty, empty
+
+    df = df.sort_values(by=["Channel", "Message DateTime (UTC)"]).reset_index(drop=True)
+    analytics = MessageAnalytics(df)
+    return (df, estimates_df, *analytics.get_all_analytics(start_date, end_date))
+
+
+# ==================== SHARED MESSAGE PASS ====================
+MESSAGE_PAGE_SIZE = 1000
+PAGE_DELAY_SECONDS = 1
+
+# Raw crawls are reused by later analyses for half an hour
+MESSAGE_PASS_TTL_SECONDS = 30 * 60
+
+
+class MessagePassCache:
+    """
+    Keeps the raw messages of recent channel crawls so later analyses of the same
+    channel and window (e.g. Forwards after Messages) are projections, not re-crawls.
+
+    Entries are kept per account and expire after `ttl`. A pass without an end
+    date only answers the same open-ended window, since new posts keep arriving.
+    Every analyst's event loop thread shares the cache, so access is locked.
+    """
+
+    def __init__(self, max_entries: int = 8, max_messages: int = 500_000, ttl: float = MESSAGE_PASS_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.max_messages = max_messages
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _in_window(message, start_date, end_date) -> bool:
+        message_date = message.date.replace(tzinfo=None).date() if message.date else None
+        return ((not start_date or (message_date and message_date >= start_date)) and
+                (not end_date or (message_date and message_date <= end_date)))
+
+    def get(self, account_id: int, channel, start_date=None, end_date=None) -> Optional[list]:
+        """Return cached messages for the window, reusing any fresh cached pass whose window covers it"""
+        now = time.time()
+        with self._lock:
+            for key, (created_at, messages) in reversed(list(self._entries.items())):
+                entry_account, channel_id, cached_start, cached_end = key
+                if entry_account != account_id or channel_id != channel.id or now - created_at >= self.ttl:
+                    continue
+                exact = (cached_start, cached_end) == (start_date, end_date)
+                covers_start = cached_start is None or (start_date is not None and cached_start <= start_date)
+                covers_end = cached_end is not None and end_date is not None and cached_end >= end_date
+                if exact or (covers_start and covers_end):
+                    self._entries.move_to_end(key)
+                    break
+            else:
+                return None
+        if exact:
+            return messages
+        return [m for m in messages if self._in_window(m, start_date, end_date)]
+
+    def put(self, account_id: int, channel, start_date, end_date, messages: list):
+        key = (account_id, channel.id, start_date, end_date)
+        now = time.time()
+        with self._lock:
+            self._entries[key] = (now, messages)
+            self._entries.move_to_end(key)
+            for old_key in [k for k, (created_at, _) in self._entries.items() if now - created_at >= self.ttl]:
+                del self._entries[old_key]
+            while len(self._entries) > self.max_entries or (
+                    len(self._entries) > 1 and sum(len(m) for _, m in self._entries.values()) > self.max_messages):
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+message_pass_cache = MessagePassCache()
+
+
+async def iter_message_pages(client, channel, channel_name, start_date=None, end_date=None, progress_text=None,
+                             limiter=None):
+    """
+    Page through a channel newest-first, yielding the messages of each page that fall in the date window
+
+    Pages are spaced by the page delay, or by a RateLimiter shared with other crawls if one is given.
+    """
+    offset_id = 0
+    while True:
+        if limiter:
+            await limiter.wait()
+        messages = await client.get_messages(channel, limit=MESSAGE_PAGE_SIZE, offset_id=offset_id)
+        if not messages:
+            if progress_text:
+                progress_text.write("No more messages in this batch.")
+            return
+
+        if progress_text:
+            first_date = messages[0].date.replace(tzinfo=None) if messages[0].date else "Unknown"
+            last_date = messages[-1].date.replace(tzinfo=None) if messages[-1].date else "Unknown"
+            progress_text.write(f"Processing messages for **{channel_name}** from {first_date.date()} to {last_date.date()}")
+
+        page = []
+        stop_fetching = False
+        for message in messages:
+            message_datetime = message.date.replace(tzinfo=None) if message.date else None
+
+            # Stop if we've gone past the start date
+            if start_date and message_datetime and message_datetime.date() < start_date:
+                if progress_text:
+                    progress_text.write("Reached messages older than the start date.")
+                stop_fetching = True
+                break
+
+            if MessagePassCache._in_window(message, start_date, end_date):
+                page.append(message)
+
+        yield page
+        if stop_fetching:
+            return
+
+        offset_id = messages[-1].id
+        if not limiter:
+            await asyncio.sleep(page_delay(client, PAGE_DELAY_SECONDS))
+
+        # Check for cancellation
+        if progress.cancelled():
+            if progress_text:
+                progress_text.write("Canceled by user.")
+            return
+
+
+async def collect_channel_messages(client, channel, channel_name, start_date=None, end_date=None,
+                                   progress_text=None, on_page=None) -> list:
+    """
+    Return all messages of a channel in the date window from one shared crawl.
+
+    A cached pass for the same channel and a covering window is reused without any
+    network requests; otherwise the channel is crawled once and the result cached.
+    on_page is called with the number of in-window messages of each page crawled.
+    """
+    account_id = await get_entity_cache().account_id(client)
+    cached = message_pass_cache.get(account_id, channel, start_date, end_date)
+    if cached is not None:
+        if progress_text:
+            progress_text.write(f"Reusing {len(cached)} already-fetched messages for **{channel_name}**")
+        if on_page:
+            on_page(len(cached))
+        return cached
+
+    total_messages = []
+    async for page in iter_message_pages(client, channel, channel_name, start_date, end_date, progress_text):
+        total_messages.extend(page)
+        if on_page:
+            on_page(len(page))
+
+    # Cancelled crawls are incomplete and must not be reused
+    if not progress.cancelled():
+        message_pass_cache.put(account_id, channel, start_date, end_date, total_messages)
+    return total_messages
+
+
 # ==================== MAIN FETCH FUNCTION ====================
 @retry(
     retry=retry_if_exception_type(FloodWaitError),
     wait=lambda retry_state: retry_state.outcome.exception().seconds + 1 if isinstance(retry_state.outcome.exception(), FloodWaitError) else 1,
     stop=stop_after_attempt(5)
 )
-async def fetch_messages(client, channel_list, start_date=None, end_date=None, include_comments=True):
+async def fetch_messages(client, channel_list, start_date=None, end_date=None, include_comments=True, plan=None,
+                         use_cache=True, raise_errors=False):
     """
     Fetch messages from Telegram channels with optional date filtering and comment inclusion
     
@@ -357,77 +735,73 @@ async def fetch_messages(client, channel_list, start_date=None, end_date=None, i
         start_date: Optional start date for filtering
         end_date: Optional end date for filtering
         include_comments: Whether to fetch comment/reply threads
+        plan: Optional CrawlPlan; channels are crawled largest-first and a live ETA is shown
+        use_cache: Reuse per-channel results of earlier identical (or wider) queries from the result cache
+        raise_errors: Raise a failing channel's error instead of reporting it and moving on (used by the client pool)
         
     Returns:
         Tuple of (dataframe, hashtags, urls, domains, forwards, daily_vol, weekly_vol, monthly_vol)
     """
-    all_messages_data = []
-    limit = 1000
+    channel_frames = []
+    result_cache = get_result_cache()
+    cache_params = {"include_comments": bool(include_comments)}
+
+    tracker = None
+    if plan is not None:
+        channel_list = plan.ordered_targets(channel_list)
+        tracker = plan.progress()
+        eta_text = progress.empty()
+        eta_text.write(tracker.describe())
     
     for channel_name in channel_list:
+        cached = result_cache.get("messages", channel_name, start_date, end_date, cache_params,
+                                  date_column="Message DateTime (UTC)") if use_cache else None
+        if cached is not None:
+            progress.write(f"Using cached messages for **{channel_name}** ({len(cached)} rows)")
+            channel_frames.append(cached)
+            progress.partial("messages", channel_frames)
+            if tracker:
+                tracker.finish(channel_name)
+                eta_text.write(tracker.describe())
+            continue
+
         try:
-            channel = await client.get_entity(channel_name)
+            channel = await get_cached_entity(client, channel_name)
             
             # Fetch follower count once per channel
             try:
                 result = await client(functions.channels.GetFullChannelRequest(channel=channel))
                 participant_count = result.full_chat.participants_count if hasattr(result.full_chat, "participants_count") else None
             except Exception as e:
-                st.warning(f"Could not fetch follower count for {channel_name}: {e}")
+                progress.warning(f"Could not fetch follower count for {channel_name}: {e}")
                 participant_count = None
             
-            processor = MessageProcessor(channel, participant_count)
+            origin_resolver = ForwardOriginResolver()
+            processor = MessageProcessor(channel, participant_count, origin_resolver)
             
-            progress_text = st.empty()
+            progress_text = progress.empty()
             progress_text.write(f"Processing channel: **{channel_name}** ({participant_count:,} followers)" if participant_count else f"Processing channel: **{channel_name}**")
-            offset_id = 0
-            total_messages = []
         except ValueError:
-            st.error(f"Channel '**{channel_name}**' does not exist. Skipping.")
+            progress.error(f"Channel '**{channel_name}**' does not exist. Skipping.")
             continue
 
+        def advance_eta(count, channel_name=channel_name):
+            tracker.advance(channel_name, count)
+            eta_text.write(tracker.describe())
+
         try:
-            # Fetch messages in batches
-            while True:
-                messages = await client.get_messages(channel, limit=limit, offset_id=offset_id)
-                if not messages:
-                    progress_text.write("No more messages in this batch.")
-                    break
-                
-                # Update progress
-                first_date = messages[0].date.replace(tzinfo=None) if messages[0].date else "Unknown"
-                last_date = messages[-1].date.replace(tzinfo=None) if messages[-1].date else "Unknown"
-                progress_text.write(f"Processing messages for **{channel_name}** from {first_date.date()} to {last_date.date()}")
-                
-                stop_fetching = False
-                
-                # Filter messages by date range
-                for message in messages:
-                    message_datetime = message.date.replace(tzinfo=None) if message.date else None
-                    
-                    # Stop if we've gone past the start date
-                    if start_date and message_datetime and message_datetime.date() < start_date:
-                        progress_text.write("Reached messages older than the start date.")
-                        stop_fetching = True
-                        break
-                    
-                    # Add messages within date range
-                    if ((not start_date or (message_datetime and message_datetime.date() >= start_date)) and 
-                        (not end_date or (message_datetime and message_datetime.date() <= end_date))):
-                        total_messages.append(message)
-                
-                if stop_fetching:
-                    break
-                
-                offset_id = messages[-1].id if messages else offset_id
-                time.sleep(1)
-                
-                # Check for cancellation
-                if st.session_state.get("cancel_fetch", False):
-                    progress_text.write("Canceled by user.")
-                    break
+            total_messages = await collect_channel_messages(
+                client, channel, channel_name, start_date, end_date, progress_text,
+                on_page=advance_eta if tracker else None,
+            )
 
             progress_text.write(f"Collected {len(total_messages)} messages for channel **{channel_name}**")
+
+            # Resolve forward origins Telethon did not receive entities for, in batches
+            try:
+                await origin_resolver.resolve(client, channel, total_messages)
+            except Exception as e:
+                progress_text.write(f"Could not resolve forward origins for {channel_name}: {e}")
             
             # Process all collected messages
             messages_data = []
@@ -449,13 +823,30 @@ async def fetch_messages(client, channel_list, start_date=None, end_date=None, i
                     except Exception as e:
                         progress_text.write(f"Error fetching replies for message {message.id}: {e}")
             
-            all_messages_data.extend(messages_data)
+            channel_frame = pd.DataFrame(messages_data)
+            # A cancelled crawl is incomplete and must not answer later queries
+            if not progress.cancelled():
+                result_cache.put("messages", channel_name, channel_frame, start_date, end_date, cache_params)
+            channel_frames.append(channel_frame)
+            progress.partial("messages", channel_frames)
 
+        except FloodWaitError:
+            # Long flood waits go to the retry above; completed channels are reused from the pass cache
+            raise
         except Exception as e:
+            if raise_errors:
+                raise
             progress_text.write(f"Error fetching messages for {channel_name}: {e}")
 
-    # Convert to DataFrame
-    df = pd.DataFrame(all_messages_data)
+        if tracker:
+            tracker.finish(channel_name)
+            eta_text.write(tracker.describe())
+
+    # Combine the per-channel frames
+    df = pd.concat(channel_frames, ignore_index=True) if channel_frames else pd.DataFrame()
+    if df.empty:
+        # No messages in the window, or no channel could be found
+        return (df, *([pd.DataFrame()] * 7))
     
     # Deduplicate based on Grouped ID
     dedup_df = df[df["Grouped ID"] != "Not Available"].drop_duplicates(subset=["Grouped ID"], keep="first")
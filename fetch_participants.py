@@ -1,59 +1,293 @@
 #fetch_participants.py
 
+import asyncio
 import pandas as pd
-import time
 from telethon import functions
 from telethon.errors import FloodWaitError, RpcCallFailError
 from telethon.tl.types import User
-import streamlit as st
+import progress
+from entity_cache import get_cached_entity, get_entity_cache
+from rate_limiter import RateLimiter
+from takeout_session import page_delay
+from fetch_messages import iter_message_pages, message_pass_cache
+from result_cache import get_result_cache
 
-async def fetch_default_participants(client, group_name):
-    """Fetch participants of a Telegram group using a direct API request."""
+# Rows are handed on in DataFrame chunks of this size while they stream in
+PARTICIPANT_CHUNK_SIZE = 1000
+
+# Characters appended to a search prefix when a query hits the server-side cap.
+# Telegram matches the prefix against first name, last name and username words.
+SEARCH_SHARD_ALPHABET = (
+    "abcdefghijklmnopqrstuvwxyz0123456789_"
+    "абвгдеёжзийклмнопрстуфхцчшщъыьэюяії"
+)
+
+# Longest prefix tried before a shard is accepted as truncated
+MAX_SEARCH_PREFIX_LENGTH = 3
+
+# Flood waits a single search prefix may hit before it is given up
+MAX_SEARCH_PREFIX_ATTEMPTS = 5
+
+# Users per GetParticipants request made by client.iter_participants
+PARTICIPANT_PAGE_SIZE = 200
+
+
+def build_participant_row(user, group_name):
+    """One participant row for a User returned by a participant query"""
+    return {
+        'User ID': user.id,
+        'Deleted': user.deleted,
+        'Is Bot': user.bot,
+        'Verified': user.verified,
+        'Restricted': user.restricted,
+        'Scam': user.scam,
+        'Fake': user.fake,
+        'Premium': getattr(user, 'premium', False),
+        'Access Hash': user.access_hash,
+        'First Name': user.first_name if user.first_name else 'No First Name',
+        'Last Name': user.last_name if user.last_name else 'No Last Name',
+        'Username': user.username if user.username else 'No Username',
+        'Phone': user.phone if user.phone else 'No Phone',
+        'Status': str(user.status),
+        'Timezone Info': user.status.was_online.tzinfo if hasattr(user.status, 'was_online') else 'Not Available',
+        'Restriction Reason': ', '.join(r.text for r in user.restriction_reason) if user.restriction_reason else 'None',
+        'Language Code': user.lang_code if user.lang_code else 'Unknown',
+        'Last Seen': user.status.was_online.isoformat() if hasattr(user.status, 'was_online') else 'Not Available',
+        'Profile Picture DC ID': user.photo.dc_id if user.photo else 'No DC ID',
+        'Profile Picture Photo ID': user.photo.photo_id if user.photo else 'No Photo ID',
+        'Group': group_name
+    }
+
+
+async def iter_participant_chunks(client, group, group_name, search="", chunk_size=PARTICIPANT_CHUNK_SIZE,
+                                  limiter=None):
+    """
+    Yield a group's participants as DataFrame chunks while they are fetched.
+
+    Only one chunk of User objects is held at a time instead of the whole member list.
+    With a limiter, every page request waits for its pacing.
+    """
+    rows = []
+    returned = 0
+    if limiter:
+        await limiter.wait()
+    async for user in client.iter_participants(group, search=search):
+        returned += 1
+        # The next page is only requested once this loop asks for more users
+        if limiter and returned % PARTICIPANT_PAGE_SIZE == 0:
+            await limiter.wait()
+        rows.append(build_participant_row(user, group_name))
+        if len(rows) >= chunk_size:
+            yield pd.DataFrame(rows)
+            rows = []
+    if rows:
+        yield pd.DataFrame(rows)
+
+
+async def iter_sharded_participant_chunks(client, group, group_name, concurrency=4, limiter=None,
+                                          chunk_size=PARTICIPANT_CHUNK_SIZE, failed_prefixes=None):
+    """
+    Yield participants of a large group by running many search-prefix queries.
+
+    A plain participant query stops at about 10k members. Here the empty query runs
+    first; any query whose reported total exceeds what it returned is split into
+    longer prefixes (a, b, ... then aa, ab, ...), with up to `concurrency` queries in
+    flight under a shared RateLimiter. Users are de-duplicated on ID, so each member
+    appears in exactly one chunk. Prefixes whose query failed, or hit
+    MAX_SEARCH_PREFIX_ATTEMPTS flood waits, are appended to failed_prefixes, if given.
+    """
+    limiter = limiter or RateLimiter(max_concurrency=concurrency, min_interval=1.0)
+    seen = set()
+    attempts = {}
+    prefixes = asyncio.Queue()
+    # Bounded so queries pause when the consumer falls behind
+    chunks = asyncio.Queue(maxsize=max(int(concurrency), 1) * 2)
+    prefixes.put_nowait("")
+
+    async def run_query(prefix):
+        rows = []
+        returned = 0
+        async with limiter:
+            participants = client.iter_participants(group, search=prefix)
+            async for user in participants:
+                returned += 1
+                if returned % PARTICIPANT_PAGE_SIZE == 0:
+                    await limiter.wait()
+                if user.id in seen:
+                    continue
+                seen.add(user.id)
+                rows.append(build_participant_row(user, group_name))
+                if len(rows) >= chunk_size:
+                    await chunks.put(pd.DataFrame(rows))
+                    rows = []
+        if rows:
+            await chunks.put(pd.DataFrame(rows))
+        total = participants.total or returned
+        if total > returned and len(prefix) < MAX_SEARCH_PREFIX_LENGTH:
+            for char in SEARCH_SHARD_ALPHABET:
+                prefixes.put_nowait(prefix + char)
+
+    async def worker():
+        while True:
+            prefix = await prefixes.get()
+            try:
+                if not progress.cancelled():
+                    await run_query(prefix)
+            except FloodWaitError as e:
+                # The limiter has already paused everyone; retry the shard afterwards
+                attempts[prefix] = attempts.get(prefix, 0) + 1
+                if attempts[prefix] < MAX_SEARCH_PREFIX_ATTEMPTS:
+                    progress.warning(f"Flood wait of {e.seconds}s on search '{prefix}' in {group_name}, retrying")
+                    prefixes.put_nowait(prefix)
+                else:
+                    progress.warning(f"Giving up on search '{prefix}' in {group_name} after "
+                                     f"{attempts[prefix]} flood waits")
+                    if failed_prefixes is not None:
+                        failed_prefixes.append(prefix)
+            except Exception as e:
+                progress.warning(f"Error on search '{prefix}' in {group_name}: {e}")
+                if failed_prefixes is not None:
+                    failed_prefixes.append(prefix)
+            finally:
+                prefixes.task_done()
+
+    async def close_when_done():
+        await prefixes.join()
+        await chunks.put(None)
+
+    tasks = [asyncio.ensure_future(worker()) for _ in range(max(int(concurrency), 1))]
+    closer = asyncio.ensure_future(close_when_done())
+    try:
+        while True:
+            chunk = await chunks.get()
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        for task in tasks + [closer]:
+            task.cancel()
+        await asyncio.gather(*tasks, closer, return_exceptions=True)
+
+
+async def fetch_default_participants(client, group_name, sharded=False, concurrency=4, limiter=None,
+                                     raise_errors=False):
+    """
+    Fetch participants of a Telegram group using participant queries.
+
+    With sharded=True, search-prefix queries are used to get past the ~10k
+    member cap of a single query (slower, but far more complete for large groups).
+    A RateLimiter shared with other groups can be passed in as limiter. With
+    raise_errors, failures (other than a group that does not exist) are raised.
+    If any search prefix of a sharded run failed, df.attrs["incomplete"] is set.
+    """
     try:
         print(f"Fetching participants for group: {group_name}...")
+        limiter = limiter or RateLimiter(max_concurrency=concurrency, min_interval=1.0)
+        group = await get_cached_entity(client, group_name)
         # Fetch full channel info to get reported members count
-        result = await client(functions.channels.GetFullChannelRequest(channel=group_name))
+        result = await limiter.call(client, functions.channels.GetFullChannelRequest(channel=group),
+                                    attempts=1 if raise_errors else 5)
         reported_participants_count = result.full_chat.participants_count if hasattr(result.full_chat, "participants_count") else "Not Available"
         print(f"Reported members for {group_name}: {reported_participants_count}")
 
-        # Fetch all participants (adjust limit if needed)
-        participants = await client.get_participants(group_name, limit=200000)
-        print(f"Fetched {len(participants)} participants for {group_name}")
-
-        members_data = []
-        for user in participants:
-            user_data = {
-                'User ID': user.id,
-                'Deleted': user.deleted,
-                'Is Bot': user.bot,
-                'Verified': user.verified,
-                'Restricted': user.restricted,
-                'Scam': user.scam,
-                'Fake': user.fake,
-                'Premium': getattr(user, 'premium', False),
-                'Access Hash': user.access_hash,
-                'First Name': user.first_name if user.first_name else 'No First Name',
-                'Last Name': user.last_name if user.last_name else 'No Last Name',
-                'Username': user.username if user.username else 'No Username',
-                'Phone': user.phone if user.phone else 'No Phone',
-                'Status': str(user.status),
-                'Timezone Info': user.status.was_online.tzinfo if hasattr(user.status, 'was_online') else 'Not Available',
-                'Restriction Reason': ', '.join(r.text for r in user.restriction_reason) if user.restriction_reason else 'None',
-                'Language Code': user.lang_code if user.lang_code else 'Unknown',
-                'Last Seen': user.status.was_online.isoformat() if hasattr(user.status, 'was_online') else 'Not Available',
-                'Profile Picture DC ID': user.photo.dc_id if user.photo else 'No DC ID',
-                'Profile Picture Photo ID': user.photo.photo_id if user.photo else 'No Photo ID',
-                group_name: 1  # Mark membership in this group
-            }
-            members_data.append(user_data)
-        df = pd.DataFrame(members_data)
+        failed_prefixes = []
+        if sharded:
+            stream = iter_sharded_participant_chunks(client, group, group_name, concurrency=concurrency, limiter=limiter,
+                                                     failed_prefixes=failed_prefixes)
+        else:
+            stream = iter_participant_chunks(client, group, group_name, limiter=limiter)
+
+        progress_text = progress.empty()
+        chunks = []
+        fetched = 0
+        async for chunk in stream:
+            chunks.append(chunk)
+            fetched += len(chunk)
+            progress_text.write(f"Fetched {fetched} of {reported_participants_count} participants for {group_name}")
+
+        df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+        if failed_prefixes:
+            df.attrs["incomplete"] = True
+            progress.warning(f"{len(failed_prefixes)} search queries failed for {group_name}; the member list is incomplete")
         print(f"Collected data for {len(df)} members in {group_name}")
         return df, reported_participants_count
     except Exception as e:
+        if raise_errors and not isinstance(e, ValueError):
+            raise
         print(f"Error fetching participants for {group_name}: {e}")
         return pd.DataFrame(), 0
 
-async def fetch_participants_via_messages(client, group_name, start_date=None, end_date=None):
+# ==================== VIA MESSAGES ====================
+SENDER_COLUMNS = [
+    "User ID", "Deleted", "Is Bot", "Verified", "Restricted", "Scam", "Fake", "Premium",
+    "Access Hash", "First Name", "Last Name", "Username", "Phone", "Status",
+]
+
+
+def sender_record(user) -> tuple:
+    """Compact participant record (in SENDER_COLUMNS order) for a message sender or the group itself"""
+    status = getattr(user, "status", None)
+    return (
+        user.id,
+        getattr(user, "deleted", False),
+        getattr(user, "bot", False),
+        getattr(user, "verified", False),
+        getattr(user, "restricted", False),
+        getattr(user, "scam", False),
+        getattr(user, "fake", False),
+        getattr(user, "premium", False),
+        getattr(user, "access_hash", None) or "Not Available",
+        getattr(user, "first_name", None) or "No First Name",
+        getattr(user, "last_name", None) or "No Last Name",
+        getattr(user, "username", None) or "Not Available",
+        getattr(user, "phone", None) or "Not Available",
+        str(status) if status else "Not Available",
+    )
+
+
+class ParticipantCollector:
+    """
+    Unique senders of one group, kept as a set of user IDs plus one record per user.
+
+    Senders are added page by page from the message stream, so messages never need
+    to be buffered. Channel posts without a user sender count as the group itself.
+    """
+
+    def __init__(self, group, group_name):
+        self.group = group
+        self.group_name = group_name
+        self.ids = set()
+        self.records = []
+
+    def add(self, sender):
+        user = sender if isinstance(sender, User) else self.group
+        if user.id not in self.ids:
+            self.ids.add(user.id)
+            self.records.append(sender_record(user))
+
+    def add_messages(self, messages):
+        for message in messages:
+            self.add(message.sender)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        df = pd.DataFrame.from_records(self.records, columns=SENDER_COLUMNS)
+        df["Group"] = self.group_name
+        return df
+
+
+def merge_participants(sender_df: pd.DataFrame, api_df: pd.DataFrame) -> pd.DataFrame:
+    """Union of message senders and API members; a sender's own record wins over the API row"""
+    if api_df.empty:
+        return sender_df
+    merged = pd.concat([sender_df, api_df], ignore_index=True)
+    return merged.drop_duplicates(subset="User ID", keep="first").reset_index(drop=True)
+
+
+async def fetch_participants_via_messages(client, group_name, start_date=None, end_date=None, limiter=None,
+                                          raise_errors=False):
     """
     Fetch participants from a group by collecting messages (filtered by date)
     and extracting unique senders, then supplement with API-retrieved members.
@@ -61,7 +295,10 @@ async def fetch_participants_via_messages(client, group_name, start_date=None, e
     Additionally, for each message that has replies, fetch those replies
     and extract the senders (i.e. commenters). This helps capture users who
     reply to channel posts.
-    
+
+    With raise_errors, flood waits and other failures are raised instead of
+    returning an empty result.
+
     Returns a tuple of:
       - DataFrame with detailed participant information
       - Reported participant count (from channel info via API)
@@ -70,139 +307,167 @@ async def fetch_participants_via_messages(client, group_name, start_date=None, e
     """
     try:
         # First, get reported count via the API method.
-        from fetch_participants import fetch_default_participants
-        api_df, api_reported_count = await fetch_default_participants(client, group_name)
+        api_df, api_reported_count = await fetch_default_participants(client, group_name, limiter=limiter,
+                                                                      raise_errors=raise_errors)
         reported_count = api_reported_count if api_reported_count not in [None, 0] else "Not Available"
 
-        st.write(f"Fetching messages for group '{group_name}' for participant extraction...")
-        all_messages = []
-        offset_id = 0
-        limit = 1000
-        stop_fetching = False
+        progress.write(f"Fetching messages for group '{group_name}' for participant extraction...")
+        # Resolved once; used for channel posts that have no user sender
+        group = await get_cached_entity(client, group_name)
+        collector = ParticipantCollector(group, group_name)
+        # Only the IDs of messages with comments are kept for the reply pass
+        replied_ids = []
+        message_count = 0
 
-        while not stop_fetching:
-            messages = await client.get_messages(group_name, limit=limit, offset_id=offset_id)
-            if not messages:
-                st.write("No more messages in batch.")
-                break
+        # Reuse a covering pass from Messages/Forwards if there is one, otherwise stream pages
+        cached = message_pass_cache.get(await get_entity_cache().account_id(client), group, start_date, end_date)
+        progress_text = progress.empty()
 
-            st.write(f"Fetched {len(messages)} messages in current batch.")
-            for message in messages:
-                if not message.date:
-                    continue
-                msg_date = message.date.replace(tzinfo=None).date()
-                if end_date and msg_date > end_date:
-                    continue
-                if start_date and msg_date < start_date:
-                    stop_fetching = True
-                    break
-                all_messages.append(message)
-            if stop_fetching:
-                st.write("Reached messages older than start_date. Stopping further fetch.")
-                break
-            offset_id = messages[-1].id
-            time.sleep(1)
-            if st.session_state.get("cancel_fetch", False):
-                st.write("Fetch participants via messages cancelled by user.")
-                break
+        async def message_pages():
+            if cached is not None:
+                progress_text.write(f"Reusing {len(cached)} already-fetched messages for '{group_name}'.")
+                yield cached
+                return
+            async for page in iter_message_pages(client, group, group_name, start_date, end_date, progress_text,
+                                                 limiter=limiter):
+                yield page
+
+        async for page in message_pages():
+            collector.add_messages(page)
+            replied_ids.extend(m.id for m in page if m.replies and m.replies.replies > 0)
+            message_count += len(page)
+
+        progress.write(f"Total messages scanned for group '{group_name}': {message_count}")
 
-        st.write(f"Total messages collected for group '{group_name}': {len(all_messages)}")
-
-        from telethon.tl.types import User
-        participants = {}
-        # Process main messages
-        for message in all_messages:
-            if message.sender and isinstance(message.sender, User):
-                user = message.sender
-            else:
-                # For channel posts without a sender, use the group/channel entity.
-                user = await client.get_entity(group_name)
-            if user.id not in participants:
-                participants[user.id] = {
-                    "User ID": user.id,
-                    "Deleted": getattr(user, "deleted", False),
-                    "Is Bot": getattr(user, "bot", False),
-                    "Verified": getattr(user, "verified", False),
-                    "Restricted": getattr(user, "restricted", False),
-                    "Scam": getattr(user, "scam", False),
-                    "Fake": getattr(user, "fake", False),
-                    "Premium": getattr(user, "premium", False),
-                    "Access Hash": user.access_hash if hasattr(user, "access_hash") else "Not Available",
-                    "First Name": user.first_name if hasattr(user, "first_name") and user.first_name else "No First Name",
-                    "Last Name": user.last_name if hasattr(user, "last_name") and user.last_name else "No Last Name",
-                    "Username": user.username if hasattr(user, "username") and user.username else "Not Available",
-                    "Phone": user.phone if hasattr(user, "phone") and user.phone else "Not Available",
-                    "Status": str(user.status) if hasattr(user, "status") and user.status else "Not Available",
-                }
         # Process replies (comments)
-        for message in all_messages:
-            if message.replies and message.replies.replies > 0:
-                try:
-                    replies = await client.get_messages(group_name, reply_to=message.id, limit=100)
-                    for reply in replies:
-                        if reply.sender and isinstance(reply.sender, User):
-                            r_user = reply.sender
-                        else:
-                            r_user = await client.get_entity(group_name)
-                        if r_user.id not in participants:
-                            participants[r_user.id] = {
-                                "User ID": r_user.id,
-                                "Deleted": getattr(r_user, "deleted", False),
-                                "Is Bot": getattr(r_user, "bot", False),
-                                "Verified": getattr(r_user, "verified", False),
-                                "Restricted": getattr(r_user, "restricted", False),
-                                "Scam": getattr(r_user, "scam", False),
-                                "Fake": getattr(r_user, "fake", False),
-                                "Premium": getattr(r_user, "premium", False),
-                                "Access Hash": r_user.access_hash if hasattr(r_user, "access_hash") else "Not Available",
-                                "First Name": r_user.first_name if hasattr(r_user, "first_name") and r_user.first_name else "No First Name",
-                                "Last Name": r_user.last_name if hasattr(r_user, "last_name") and r_user.last_name else "No Last Name",
-                                "Username": r_user.username if hasattr(r_user, "username") and r_user.username else "Not Available",
-                                "Phone": r_user.phone if hasattr(r_user, "phone") and r_user.phone else "Not Available",
-                                "Status": str(r_user.status) if hasattr(r_user, "status") and r_user.status else "Not Available",
-                            }
-                except Exception as e:
-                    st.write(f"Error fetching replies for message {message.id} in {group_name}: {e}")
-
-        st.write(f"Extracted {len(participants)} unique participants from messages for group '{group_name}'")
+        for message_id in replied_ids:
+            if progress.cancelled():
+                progress.write("Fetch participants via messages cancelled by user.")
+                break
+            try:
+                if limiter:
+                    await limiter.wait()
+                async for reply in client.iter_messages(group, reply_to=message_id, limit=100):
+                    collector.add(reply.sender)
+            except Exception as e:
+                if limiter and isinstance(e, FloodWaitError):
+                    limiter.cooldown(e.seconds + 1)
+                if raise_errors and isinstance(e, FloodWaitError):
+                    raise
+                progress.write(f"Error fetching replies for message {message_id} in {group_name}: {e}")
 
-        # Merge with API-based participants without overwriting existing entries.
-        if not api_df.empty:
-            for _, row in api_df.iterrows():
-                user_id = row.get("User ID")
-                if user_id not in participants:
-                    participants[user_id] = row.to_dict()
+        progress.write(f"Extracted {len(collector)} unique participants from messages for group '{group_name}'")
 
-        fetched_count = len(participants)
+        # Merge with API-based participants without overwriting existing entries.
+        df = merge_participants(collector.to_dataframe(), api_df)
+        fetched_count = len(df)
         group_counts = {group_name: (reported_count, fetched_count)}
-        st.write(f"Total unique participants after merging: {fetched_count}")
+        progress.write(f"Total unique participants after merging: {fetched_count}")
 
-        return pd.DataFrame(list(participants.values())), reported_count, fetched_count, group_counts
+        return df, reported_count, fetched_count, group_counts
 
     except Exception as e:
-        st.write(f"Error fetching participants via messages for {group_name}: {e}")
+        if raise_errors and not isinstance(e, ValueError):
+            raise
+        progress.write(f"Error fetching participants via messages for {group_name}: {e}")
         return pd.DataFrame(), "Not Available", 0, {group_name: ("Not Available", 0)}
 
-async def fetch_participants(client, group_list, method="default", start_date=None, end_date=None):
-    all_dfs = []
+async def fetch_participants(client, group_list, method="default", start_date=None, end_date=None, plan=None,
+                             sharded=False, concurrency=1, snapshot_store=None, use_cache=True, raise_errors=False):
+    """
+    Fetch participants of several groups, up to `concurrency` groups at a time.
+
+    All groups share one RateLimiter and every page request (participant pages,
+    message pages and reply threads) waits for its pacing, so running groups side
+    by side does not raise the overall request rate. A failing group is recorded with a fetched
+    count of 0 and does not stop the others. Results are returned in group order.
+    If a MembershipSnapshotStore is given and method is "default", every completed
+    group is snapshotted (and the result cache is bypassed, so snapshots are always
+    fresh). Via-messages results are date-windowed sender sets, not member lists,
+    so they are never snapshotted.
+    With raise_errors (used by the client pool), a failing group raises instead.
+    """
     total_reported = 0
     total_fetched = 0
     group_counts = {}
-    for group in group_list:
+
+    tracker = None
+    if plan is not None:
+        # Largest groups first, with a live ETA updated as each group completes
+        group_list = plan.ordered_targets(group_list)
+        tracker = plan.progress()
+        eta_text = progress.empty()
+        eta_text.write(tracker.describe())
+
+    limiter = RateLimiter(max_concurrency=max(int(concurrency), 1) * (4 if sharded else 1),
+                          min_interval=page_delay(client, 1.0))
+    group_slots = asyncio.Semaphore(max(int(concurrency), 1))
+    completed_frames = []
+    result_cache = get_result_cache()
+    cache_params = {"method": method}
+    if method == "default":
+        # A sharded run gets past the ~10k cap of a plain one, so the two never answer each other
+        cache_params["sharded"] = bool(sharded)
+    # Only participants collected via messages depend on the date window
+    cache_window = (start_date, end_date) if method != "default" else (None, None)
+
+    if method != "default":
+        snapshot_store = None
+
+    async def collect_group(group):
+        async with group_slots:
+            if progress.cancelled():
+                return pd.DataFrame(), "Not Available", 0
+            cached = (result_cache.get("participants", group, *cache_window, cache_params)
+                      if use_cache and snapshot_store is None else None)
+            if cached is not None:
+                progress.write(f"Using cached participants for {group} ({len(cached)} rows)")
+                completed_frames.append(cached)
+                progress.partial("participants", completed_frames)
+                if tracker:
+                    tracker.finish(group)
+                    eta_text.write(tracker.describe())
+                return cached, cached.attrs.get("reported_count", "Not Available"), len(cached)
+            try:
+                if method == "default":
+                    df, reported_count = await fetch_default_participants(client, group, sharded=sharded, limiter=limiter,
+                                                                          raise_errors=raise_errors)
+                    fetched_count = len(df)
+                else:
+                    df, reported_count, fetched_count, _ = await fetch_participants_via_messages(
+                        client, group, start_date, end_date, limiter=limiter, raise_errors=raise_errors
+                    )
+            except Exception as e:
+                if raise_errors:
+                    raise
+                progress.write(f"Error fetching participants for {group}: {e}")
+                df, reported_count, fetched_count = pd.DataFrame(), "Not Available", 0
+            if not df.empty:
+                # Cancelled runs and sharded runs with failed prefixes are incomplete
+                if not progress.cancelled() and not df.attrs.get("incomplete"):
+                    df.attrs["reported_count"] = reported_count
+                    result_cache.put("participants", group, df, *cache_window, cache_params)
+                completed_frames.append(df)
+                progress.partial("participants", completed_frames)
+            if tracker:
+                tracker.advance(group, fetched_count)
+                tracker.finish(group)
+                eta_text.write(tracker.describe())
+            return df, reported_count, fetched_count
+
+    results = await asyncio.gather(*(collect_group(group) for group in group_list))
+
+    all_dfs = []
+    for group, (df, reported_count, fetched_count) in zip(group_list, results):
         if method == "default":
-            df, reported_count = await fetch_default_participants(client, group)
-            fetched_count = len(df)
             total_reported += reported_count if isinstance(reported_count, int) else 0
-            total_fetched += fetched_count
-            group_counts[group] = (reported_count, fetched_count)
-            if not df.empty:
-                all_dfs.append(df)
-        elif method == "messages":
-            df, reported_count, fetched_count, counts = await fetch_participants_via_messages(client, group, start_date, end_date)
-            total_fetched += fetched_count
-            group_counts[group] = (reported_count, fetched_count)
-            if not df.empty:
-                all_dfs.append(df)
+        total_fetched += fetched_count
+        group_counts[group] = (reported_count, fetched_count)
+        if not df.empty:
+            all_dfs.append(df)
+            # An incomplete run would show up as members leaving
+            if snapshot_store is not None and not progress.cancelled() and not df.attrs.get("incomplete"):
+                snapshot_store.save(group, df)
     if all_dfs:
         unified_df = pd.concat(all_dfs, ignore_index=True)
     else:
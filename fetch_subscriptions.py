@@ -1,42 +1,108 @@
 # fetch_subscriptions.py
+import asyncio
+
+from telethon import functions
 from telethon.tl.types import Channel
-import streamlit as st
+import progress
+from entity_cache import get_entity_cache
+from rate_limiter import RateLimiter
+
+# Dialog folders: 0 is the main chat list, 1 is the archive
+DIALOG_FOLDERS = {0: "Main", 1: "Archived"}
+
+
+def build_subscription_row(entity, folder_name):
+    """Subscription row for a channel or supergroup dialog"""
+    return {
+        'ID': entity.id,
+        'Title': entity.title,
+        'Username': f"@{entity.username}" if entity.username else "No Username",
+        'URL': f"https://t.me/{entity.username}" if entity.username else "Private/No URL",
+        'Type': "Channel" if entity.broadcast else "Supergroup",
+        'Folder': folder_name,
+        'Participants': getattr(entity, 'participants_count', None) or 'N/A',
+        'Verified': "Yes" if entity.verified else "No",
+        'Scam': "Yes" if entity.scam else "No",
+        'Restricted': "Yes" if entity.restricted else "No",
+        'Access Hash': entity.access_hash,
+    }
+
+
+async def enrich_subscriptions(client, entities, rows, concurrency=5):
+    """Fill in member counts and descriptions with concurrent GetFullChannel requests"""
+    limiter = RateLimiter(max_concurrency=concurrency, min_interval=0.2)
+    progress_text = progress.empty()
+    done = 0
+
+    async def enrich(entity, row):
+        nonlocal done
+        if progress.cancelled():
+            return
+        try:
+            result = await limiter.call(client, functions.channels.GetFullChannelRequest(channel=entity))
+            full_chat = result.full_chat
+            row['Participants'] = getattr(full_chat, 'participants_count', None) or row['Participants']
+            row['Description'] = full_chat.about.strip() if full_chat.about else "No Description"
+            row['Linked Chat ID'] = getattr(full_chat, 'linked_chat_id', None) or "None"
+        except Exception as e:
+            row['Description'] = f"Could not fetch full info: {e}"
+        done += 1
+        if done % 25 == 0 or done == len(rows):
+            progress_text.write(f"Fetched full info for {done} of {len(rows)} subscriptions")
+
+    await asyncio.gather(*(enrich(entity, row) for entity, row in zip(entities, rows)))
+
 
-async def fetch_user_subscriptions(client):
-    """Fetches all channels and groups the authenticated user is subscribed to."""
+async def fetch_user_subscriptions(client, include_archived=True, enrich=False, concurrency=5):
+    """
+    Fetches all channels and groups the authenticated user is subscribed to.
+
+    Dialogs are streamed page by page from the main list and (optionally) the
+    archive, keeping only channel entities. Every entity is added to the entity
+    cache so later fetches of these channels need no username resolve. With
+    enrich=True, full channel info (member count, description, linked chat) is
+    fetched for all subscriptions concurrently.
+    """
     try:
-        dialogs = await client.get_dialogs()
-        
+        entity_cache = get_entity_cache()
+        account_id = await entity_cache.account_id(client)
+        progress_text = progress.empty()
+
         channels = []
         groups = []
-        
-        for dialog in dialogs:
-            # Check if cancelled
-            if st.session_state.get("cancel_fetch", False):
-                st.warning("Fetch cancelled by user.")
-                break
-                
-            if isinstance(dialog.entity, Channel):
-                channel_info = {
-                    'ID': dialog.entity.id,
-                    'Title': dialog.entity.title,
-                    'Username': f"@{dialog.entity.username}" if dialog.entity.username else "No Username",
-                    'URL': f"https://t.me/{dialog.entity.username}" if dialog.entity.username else "Private/No URL",
-                    'Type': "Channel" if dialog.entity.broadcast else "Supergroup",
-                    'Participants': getattr(dialog.entity, 'participants_count', 'N/A'),
-                    'Verified': "Yes" if dialog.entity.verified else "No",
-                    'Scam': "Yes" if dialog.entity.scam else "No",
-                    'Restricted': "Yes" if dialog.entity.restricted else "No",
-                    'Access Hash': dialog.entity.access_hash,
-                }
-                
-                if dialog.entity.broadcast:
-                    channels.append(channel_info)
-                else:
-                    groups.append(channel_info)
-        
+        entities = []
+        seen = set()
+
+        folders = DIALOG_FOLDERS if include_archived else {0: DIALOG_FOLDERS[0]}
+        for folder, folder_name in folders.items():
+            async for dialog in client.iter_dialogs(folder=folder, ignore_migrated=True):
+                # Check if cancelled
+                if progress.cancelled():
+                    progress.warning("Fetch cancelled by user.")
+                    entity_cache.put_many(account_id, entities)
+                    return channels, groups
+
+                entity = dialog.entity
+                if not isinstance(entity, Channel) or entity.id in seen:
+                    continue
+                seen.add(entity.id)
+
+                row = build_subscription_row(entity, folder_name)
+                entities.append(entity)
+                (channels if entity.broadcast else groups).append(row)
+                if len(seen) % 100 == 0:
+                    progress_text.write(f"Listed {len(seen)} subscriptions...")
+
+        # One transaction for all dialogs instead of one per dialog
+        entity_cache.put_many(account_id, entities)
+        progress_text.write(f"Listed {len(channels)} channels and {len(groups)} groups.")
+
+        if enrich:
+            rows = {row['ID']: row for row in channels + groups}
+            await enrich_subscriptions(client, entities, [rows[e.id] for e in entities], concurrency)
+
         return channels, groups
-        
+
     except Exception as e:
-        st.error(f"Error fetching subscriptions: {e}")
+        progress.error(f"Error fetching subscriptions: {e}")
         return [], []
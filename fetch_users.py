@@ -1,99 +1,170 @@
 # fetch_users.py
-import streamlit as st
+import asyncio
+from typing import Dict, Optional
 
-async def fetch_user_data(client, user_identifiers):
-    """Fetches detailed information for users by their IDs or usernames."""
-    results = []
-    
-    for identifier in user_identifiers:
+import progress
+from telethon import functions
+from telethon.tl.types import InputUser, User
+from entity_cache import get_cached_entity, get_entity_cache
+from rate_limiter import RateLimiter
+
+# Telegram accepts up to 100 users per GetUsers request
+USER_BATCH_SIZE = 100
+
+
+def build_user_row(user):
+    """User lookup row for a resolved User"""
+    # Extract photo information
+    photo_id = None
+    photo_dc_id = None
+    if user.photo:
+        photo_id = getattr(user.photo, 'photo_id', None)
+        photo_dc_id = getattr(user.photo, 'dc_id', None)
+
+    # Extract status information
+    status = "Unknown"
+    if user.status:
+        status_type = type(user.status).__name__
+        if "Online" in status_type:
+            status = "Online"
+        elif "Offline" in status_type:
+            status = "Offline"
+        elif "Recently" in status_type:
+            status = "Recently"
+        elif "LastWeek" in status_type:
+            status = "Last Week"
+        elif "LastMonth" in status_type:
+            status = "Last Month"
+
+    # Extract usernames (primary and alternates)
+    primary_username = user.username if user.username else None
+    alternate_usernames = []
+    if hasattr(user, 'usernames') and user.usernames:
+        alternate_usernames = [u.username for u in user.usernames if hasattr(u, 'username')]
+
+    # Build user info dictionary
+    return {
+        'User ID': user.id,
+        'First Name': user.first_name,
+        'Last Name': user.last_name,
+        'Username': f"@{primary_username}" if primary_username else "No Username",
+        'Alternate Usernames': ", ".join(alternate_usernames) if alternate_usernames else "None",
+        'Phone': user.phone if user.phone else "Not Available",
+        'Is Bot': "Yes" if user.bot else "No",
+        'Verified': "Yes" if user.verified else "No",
+        'Premium': "Yes" if user.premium else "No",
+        'Scam': "Yes" if user.scam else "No",
+        'Fake': "Yes" if user.fake else "No",
+        'Restricted': "Yes" if user.restricted else "No",
+        'Deleted': "Yes" if user.deleted else "No",
+        'Status': status,
+        'Access Hash': user.access_hash,
+        'Photo ID': photo_id,
+        'Photo DC ID': photo_dc_id,
+        'Support': "Yes" if user.support else "No",
+        'Contact': "Yes" if user.contact else "No",
+        'Mutual Contact': "Yes" if user.mutual_contact else "No",
+        'Close Friend': "Yes" if getattr(user, 'close_friend', False) else "No",
+        'Stories Hidden': "Yes" if getattr(user, 'stories_hidden', False) else "No",
+        'Language Code': user.lang_code if user.lang_code else "Not Available",
+    }
+
+
+def known_access_hashes(participants_df) -> Dict[int, int]:
+    """User ID → access hash from participant data fetched with the same account"""
+    if participants_df is None or "Access Hash" not in getattr(participants_df, "columns", []):
+        return {}
+    rows = participants_df[["User ID", "Access Hash"]].dropna().drop_duplicates(subset="User ID")
+    hashes = {}
+    for user_id, access_hash in zip(rows["User ID"], rows["Access Hash"]):
+        try:
+            hashes[int(user_id)] = int(access_hash)
+        except (TypeError, ValueError):
+            continue
+    return hashes
+
+
+async def fetch_user_data(client, user_identifiers, access_hashes: Optional[Dict[int, int]] = None, concurrency=3):
+    """
+    Fetches detailed information for users by their IDs or usernames.
+
+    Numeric IDs are looked up in batches of up to 100 per GetUsers request, using
+    access hashes from the session, the entity cache or access_hashes (e.g. from
+    participant data), so they need no username resolve. Usernames are resolved
+    concurrently under a RateLimiter, retrying after flood waits. Every identifier gets its own row (an error
+    row if it could not be looked up), in input order.
+    """
+    access_hashes = access_hashes or {}
+    limiter = RateLimiter(max_concurrency=concurrency, min_interval=1.0)
+    entity_cache = get_entity_cache()
+    account_id = await entity_cache.account_id(client)
+
+    identifiers = [identifier.strip() for identifier in user_identifiers if identifier.strip()]
+    rows: Dict[str, dict] = {}
+
+    # ---------- Numeric IDs: batched GetUsers ----------
+    input_users = {}
+    for identifier in identifiers:
+        if not identifier.isdigit() or identifier in input_users:
+            continue
+        user_id = int(identifier)
+        cached = entity_cache.get_cached(account_id, user_id)
+        if isinstance(cached, User) and cached.access_hash is not None:
+            input_users[identifier] = InputUser(user_id, cached.access_hash)
+        elif user_id in access_hashes:
+            input_users[identifier] = InputUser(user_id, access_hashes[user_id])
+        else:
+            try:
+                input_peer = await client.get_input_entity(user_id)
+                input_users[identifier] = InputUser(user_id, input_peer.access_hash)
+            except (ValueError, AttributeError):
+                rows[identifier] = {
+                    'Input': identifier,
+                    'Error': "No access hash known for this ID (look it up by username, "
+                             "or fetch participants of a group it belongs to first)"
+                }
+
+    pending = list(input_users)
+    for start in range(0, len(pending), USER_BATCH_SIZE):
+        if progress.cancelled():
+            progress.warning("Fetch cancelled by user.")
+            break
+        batch = pending[start:start + USER_BATCH_SIZE]
         try:
-            # Check if cancelled
-            if st.session_state.get("cancel_fetch", False):
-                st.warning("Fetch cancelled by user.")
-                break
-            
-            identifier = identifier.strip()
-            
-            # Try to determine if it's a numeric ID or a username
-            # If it's all digits, treat as user ID (convert to int)
-            # Otherwise, treat as username (keep as string)
-            if identifier.isdigit():
-                user_input = int(identifier)
+            users = await limiter.call(client, functions.users.GetUsersRequest(id=[input_users[i] for i in batch]))
+        except Exception as e:
+            for identifier in batch:
+                rows[identifier] = {'Input': identifier, 'Error': str(e)}
+            continue
+        found = {user.id: user for user in users if isinstance(user, User)}
+        # One cache transaction per batch instead of one per user
+        entity_cache.put_many(account_id, list(found.values()))
+        for identifier in batch:
+            user = found.get(int(identifier))
+            if user is None:
+                rows[identifier] = {'Input': identifier, 'Error': "User not found (deleted account or expired access hash)"}
             else:
-                # It's a username - keep as string, remove @ if present
-                user_input = identifier.lstrip('@')
-            
-            # Get the user entity by ID or username
-            user = await client.get_entity(user_input)
-            
-            # Extract photo information
-            photo_id = None
-            photo_dc_id = None
-            if user.photo:
-                photo_id = getattr(user.photo, 'photo_id', None)
-                photo_dc_id = getattr(user.photo, 'dc_id', None)
-            
-            # Extract status information
-            status = "Unknown"
-            if user.status:
-                status_type = type(user.status).__name__
-                if "Online" in status_type:
-                    status = "Online"
-                elif "Offline" in status_type:
-                    status = "Offline"
-                elif "Recently" in status_type:
-                    status = "Recently"
-                elif "LastWeek" in status_type:
-                    status = "Last Week"
-                elif "LastMonth" in status_type:
-                    status = "Last Month"
-            
-            # Extract usernames (primary and alternates)
-            primary_username = user.username if user.username else None
-            alternate_usernames = []
-            if hasattr(user, 'usernames') and user.usernames:
-                alternate_usernames = [u.username for u in user.usernames if hasattr(u, 'username')]
-            
-            # Build user info dictionary
-            user_info = {
-                'User ID': user.id,
-                'First Name': user.first_name,
-                'Last Name': user.last_name,
-                'Username': f"@{primary_username}" if primary_username else "No Username",
-                'Alternate Usernames': ", ".join(alternate_usernames) if alternate_usernames else "None",
-                'Phone': user.phone if user.phone else "Not Available",
-                'Is Bot': "Yes" if user.bot else "No",
-                'Verified': "Yes" if user.verified else "No",
-                'Premium': "Yes" if user.premium else "No",
-                'Scam': "Yes" if user.scam else "No",
-                'Fake': "Yes" if user.fake else "No",
-                'Restricted': "Yes" if user.restricted else "No",
-                'Deleted': "Yes" if user.deleted else "No",
-                'Status': status,
-                'Access Hash': user.access_hash,
-                'Photo ID': photo_id,
-                'Photo DC ID': photo_dc_id,
-                'Support': "Yes" if user.support else "No",
-                'Contact': "Yes" if user.contact else "No",
-                'Mutual Contact': "Yes" if user.mutual_contact else "No",
-                'Close Friend': "Yes" if getattr(user, 'close_friend', False) else "No",
-                'Stories Hidden': "Yes" if getattr(user, 'stories_hidden', False) else "No",
-                'Language Code': user.lang_code if user.lang_code else "Not Available",
-            }
-            
-            results.append(user_info)
-            
+                rows[identifier] = build_user_row(user)
+
+    # ---------- Usernames: concurrent resolves ----------
+    async def resolve_username(identifier):
+        if progress.cancelled():
+            return
+        try:
+            user = await limiter.call(get_cached_entity, client, identifier.lstrip('@'))
+            if not isinstance(user, User):
+                raise ValueError("not a user account")
+            rows[identifier] = build_user_row(user)
         except ValueError as e:
-            st.error(f"Invalid format: {identifier}")
-            results.append({
-                'Input': identifier,
-                'Error': f"Invalid format: {e}"
-            })
+            rows[identifier] = {'Input': identifier, 'Error': f"Invalid format: {e}"}
         except Exception as e:
-            st.error(f"Error fetching user '{identifier}': {e}")
-            results.append({
-                'Input': identifier,
-                'Error': str(e)
-            })
-    
+            rows[identifier] = {'Input': identifier, 'Error': str(e)}
+
+    usernames = list(dict.fromkeys(i for i in identifiers if not i.isdigit()))
+    await asyncio.gather(*(resolve_username(identifier) for identifier in usernames))
+
+    results = [rows[identifier] for identifier in identifiers if identifier in rows]
+    errors = sum(1 for row in results if 'Error' in row)
+    if errors:
+        progress.error(f"Could not fetch {errors} of {len(identifiers)} users; see the Error column.")
     return results
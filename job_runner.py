@@ -0,0 +1,210 @@
+# job_runner.py
+import asyncio
+import itertools
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+import progress
+
+# Jobs of one analyst that run at the same time; later jobs wait as "Queued"
+MAX_RUNNING_JOBS = 2
+
+# Progress lines kept per job (the UI shows the latest few)
+MAX_PROGRESS_LINES = 200
+
+# Finished jobs are dropped this long after they end, whether or not the UI picked them up
+FINISHED_JOB_RETENTION_SECONDS = 60 * 60
+
+
+class JobPlaceholder:
+    """A progress line of a background job, updated in place like st.empty()"""
+
+    def __init__(self, reporter: "JobReporter", slot):
+        self.reporter = reporter
+        self.slot = slot
+
+    def write(self, text: str):
+        self.reporter.set_line(self.slot, str(text))
+
+
+class JobReporter:
+    """Collects a background job's progress, partial results and cancel flag for the UI to poll"""
+
+    def __init__(self):
+        self.lines: Dict[Any, str] = {}
+        self.partials: Dict[str, list] = {}
+        self._slots = itertools.count()
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+
+    def set_line(self, slot, text: str):
+        with self._lock:
+            self.lines[slot] = text
+            while len(self.lines) > MAX_PROGRESS_LINES:
+                del self.lines[next(iter(self.lines))]
+
+    def latest_lines(self, count: int = 5) -> List[str]:
+        with self._lock:
+            return list(self.lines.values())[-count:]
+
+    def empty(self):
+        return JobPlaceholder(self, next(self._slots))
+
+    def write(self, text: str):
+        self.set_line(next(self._slots), str(text))
+
+    def warning(self, text: str):
+        self.set_line(next(self._slots), f"⚠️ {text}")
+
+    def error(self, text: str):
+        self.set_line(next(self._slots), f"❌ {text}")
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def partial(self, name: str, rows: list):
+        self.partials[name] = rows
+
+    def partial_frame(self, name: str) -> pd.DataFrame:
+        """Copy of the rows published under name so far"""
+        rows = list(self.partials.get(name, []))
+        if rows and isinstance(rows[0], pd.DataFrame):
+            return pd.concat(rows, ignore_index=True)
+        return pd.DataFrame(rows)
+
+    def partial_tail(self, name: str, count: int = 25) -> pd.DataFrame:
+        """The last count rows published under name, without rebuilding the whole partial result"""
+        rows = list(self.partials.get(name, []))
+        if not rows or not isinstance(rows[0], pd.DataFrame):
+            return pd.DataFrame(rows[-count:])
+        frames, total = [], 0
+        for frame in reversed(rows):
+            frames.append(frame)
+            total += len(frame)
+            if total >= count:
+                break
+        return pd.concat(frames[::-1], ignore_index=True).tail(count)
+
+    def partial_rows(self) -> int:
+        return sum(len(item) if isinstance(item, pd.DataFrame) else 1
+                   for rows in list(self.partials.values()) for item in list(rows))
+
+
+class Job:
+    """One background fetch: its status, progress, and result once finished"""
+
+    def __init__(self, job_id: str, label: str, keys, finalize_partial: Optional[Callable] = None):
+        self.id = job_id
+        self.label = label
+        self.keys = list(keys)
+        self.finalize_partial = finalize_partial
+        self.reporter = JobReporter()
+        self.result = None
+        self.error = ""
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+        self._status = "Queued"
+
+    @property
+    def status(self) -> str:
+        # A job cancelled before it started never reaches the code that records its status
+        if self._status in ("Queued", "Running") and self.future is not None and self.future.done():
+            return "Cancelled"
+        return self._status
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("Done", "Cancelled", "Failed")
+
+    def elapsed(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def output(self):
+        """The job's result; for an interrupted job, whatever finalize_partial makes of its partial rows"""
+        if self.result is not None:
+            return self.result
+        if self.finalize_partial is not None and self.reporter.partials:
+            return self.finalize_partial(self.reporter)
+        return None
+
+    def release(self):
+        """Drop the result and partial rows once the UI has stored them elsewhere"""
+        self.result = None
+        self.finalize_partial = None
+        self.reporter.partials.clear()
+
+
+class JobManager:
+    """
+    Background fetch jobs on one analyst's event loop.
+
+    submit() returns at once; the Streamlit script polls job status and partial
+    results on later reruns. cancel() cancels the job's task, which interrupts
+    in-flight requests, flood-wait sleeps and retries immediately.
+    """
+
+    def __init__(self, loop, max_running: int = MAX_RUNNING_JOBS):
+        self.loop = loop
+        self.max_running = max_running
+        self.jobs: Dict[str, Job] = {}
+        self._ids = itertools.count(1)
+        self._slots = None
+
+    def submit(self, label: str, make_coro: Callable, keys=(), finalize_partial: Optional[Callable] = None) -> Job:
+        """Run make_coro() in the background; the result is meant for the session state keys"""
+        self.expire()
+        job = Job(str(next(self._ids)), label, keys, finalize_partial)
+        self.jobs[job.id] = job
+        job.future = asyncio.run_coroutine_threadsafe(self._run(job, make_coro), self.loop)
+        return job
+
+    async def _run(self, job: Job, make_coro: Callable):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_running)
+        try:
+            async with self._slots:
+                job._status = "Running"
+                job.started_at = time.time()
+                with progress.use_reporter(job.reporter):
+                    job.result = await make_coro()
+                job._status = "Cancelled" if job.reporter.cancelled() else "Done"
+        except asyncio.CancelledError:
+            job._status = "Cancelled"
+        except Exception as e:
+            job._status = "Failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+
+    def cancel(self, job_id: str):
+        job = self.jobs.get(job_id)
+        if job is None or job.done:
+            return
+        job.reporter.cancel()
+        job.future.cancel()
+
+    def get(self, job_ids) -> List[Job]:
+        return [self.jobs[job_id] for job_id in job_ids if job_id in self.jobs]
+
+    def forget(self, job_id: str):
+        job = self.jobs.get(job_id)
+        if job is not None and job.done:
+            del self.jobs[job_id]
+
+    def expire(self, max_age: float = FINISHED_JOB_RETENTION_SECONDS):
+        """Forget finished jobs that ended more than max_age seconds ago"""
+        cutoff = time.time() - max_age
+        for job_id, job in list(self.jobs.items()):
+            # A job cancelled before it started has no finish time
+            if job.done and (job.finished_at or job.submitted_at) < cutoff:
+                del self.jobs[job_id]
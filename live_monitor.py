@@ -0,0 +1,173 @@
+# live_monitor.py
+import asyncio
+import time
+from typing import Optional, Dict
+
+import progress
+from telethon import events, functions, utils
+from telethon.tl.types import PeerChannel
+
+from fetch_messages import MessageProcessor
+from message_store import MessageStore
+from entity_cache import get_cached_entity
+
+
+class MonitoredChannel:
+    """A resolved channel being monitored, with its processor and store key"""
+
+    def __init__(self, name, entity, participant_count=None):
+        self.name = name
+        self.entity = entity
+        self.channel_id = entity.id
+        self.username = getattr(entity, "username", None) or name
+        self.processor = MessageProcessor(entity, participant_count)
+        # Telegram only pushes updates for channels the account has joined
+        self.joined = not getattr(entity, "left", True)
+
+
+class LiveMonitor:
+    """
+    Long-running monitor that captures new, edited and deleted messages.
+
+    Joined channels are followed through Telegram update events. Channels the
+    account has not joined receive no updates, so they are polled cheaply with
+    min_id. After a reconnect, every channel is backfilled from the last stored
+    message ID so no gap is left in the store.
+    """
+
+    def __init__(self, client, channel_list, store: Optional[MessageStore] = None, poll_interval: int = 30):
+        self.client = client
+        self.channel_list = [c.strip() for c in channel_list if c.strip()]
+        self.store = store or MessageStore()
+        self.poll_interval = poll_interval
+        self.channels: Dict[int, MonitoredChannel] = {}
+        self.stats = {"new": 0, "edited": 0, "deleted": 0, "backfilled": 0}
+        self._handlers = []
+
+    # ---------- Setup ----------
+    async def start(self):
+        """Resolve channels, register update handlers and backfill any gap"""
+        for name in self.channel_list:
+            try:
+                entity = await get_cached_entity(self.client, name)
+                try:
+                    result = await self.client(functions.channels.GetFullChannelRequest(channel=entity))
+                    participant_count = getattr(result.full_chat, "participants_count", None)
+                except Exception:
+                    participant_count = None
+                self.channels[entity.id] = MonitoredChannel(name, entity, participant_count)
+            except Exception as e:
+                progress.error(f"Could not monitor '**{name}**': {e}")
+
+        joined = [c.entity for c in self.channels.values() if c.joined]
+        if joined:
+            self._add_handler(self._on_new_message, events.NewMessage(chats=joined))
+            self._add_handler(self._on_edited_message, events.MessageEdited(chats=joined))
+            self._add_handler(self._on_deleted_message, events.MessageDeleted(chats=joined))
+
+        await self.backfill()
+
+    def _add_handler(self, callback, event):
+        self.client.add_event_handler(callback, event)
+        self._handlers.append((callback, event))
+
+    async def stop(self):
+        for callback, event in self._handlers:
+            self.client.remove_event_handler(callback, event)
+        self._handlers = []
+
+    # ---------- Event handlers ----------
+    def _channel_for(self, message) -> Optional[MonitoredChannel]:
+        if isinstance(message.peer_id, PeerChannel):
+            return self.channels.get(message.peer_id.channel_id)
+        return None
+
+    def _store(self, channel: MonitoredChannel, message, edited=False):
+        row = channel.processor.process_message(message)
+        self.store.upsert_message(channel.channel_id, channel.username, row, edited=edited)
+
+    async def _on_new_message(self, event):
+        channel = self._channel_for(event.message)
+        if channel:
+            self._store(channel, event.message)
+            self.stats["new"] += 1
+
+    async def _on_edited_message(self, event):
+        channel = self._channel_for(event.message)
+        if channel:
+            self._store(channel, event.message, edited=True)
+            self.stats["edited"] += 1
+
+    async def _on_deleted_message(self, event):
+        if event.chat_id is None:
+            return
+        channel_id, _ = utils.resolve_id(event.chat_id)
+        if channel_id in self.channels:
+            self.store.mark_deleted(channel_id, event.deleted_ids)
+            self.stats["deleted"] += len(event.deleted_ids)
+
+    # ---------- Gap filling ----------
+    async def fetch_since_last(self, channel: MonitoredChannel) -> int:
+        """Store every message newer than the last stored one; returns the number stored"""
+        last_id = self.store.last_message_id(channel.channel_id)
+        if not last_id:
+            # Nothing stored yet: start from the newest message instead of the full history
+            newest = await self.client.get_messages(channel.entity, limit=1)
+            if newest:
+                self._store(channel, newest[0])
+            return len(newest)
+        count = 0
+        async for message in self.client.iter_messages(channel.entity, min_id=last_id, reverse=True):
+            self._store(channel, message)
+            count += 1
+        return count
+
+    async def backfill(self, only_unjoined: bool = False):
+        for channel in self.channels.values():
+            if only_unjoined and channel.joined:
+                continue
+            try:
+                self.stats["backfilled"] += await self.fetch_since_last(channel)
+            except Exception as e:
+                progress.warning(f"Backfill failed for {channel.name}: {e}")
+
+    # ---------- Main loop ----------
+    async def run(self, duration_seconds: Optional[float] = None, check_interval: float = 2.0):
+        """
+        Keep the monitor running until the duration elapses or the user cancels.
+
+        Args:
+            duration_seconds: How long to monitor (None runs until cancelled)
+            check_interval: Seconds between connection checks and status updates
+        """
+        await self.start()
+        status_text = progress.empty()
+        started = time.monotonic()
+        last_poll = started
+        try:
+            while duration_seconds is None or time.monotonic() - started < duration_seconds:
+                await asyncio.sleep(check_interval)
+                if progress.cancelled():
+                    break
+
+                if not self.client.is_connected():
+                    status_text.write("Connection lost, reconnecting...")
+                    await self.client.connect()
+                    await self.backfill()
+                elif time.monotonic() - last_poll >= self.poll_interval:
+                    await self.backfill(only_unjoined=True)
+                    last_poll = time.monotonic()
+
+                status_text.write(self.describe(time.monotonic() - started))
+        finally:
+            await self.stop()
+        return self.stats
+
+    def describe(self, elapsed: float) -> str:
+        joined = sum(1 for c in self.channels.values() if c.joined)
+        return (
+            f"Monitoring {len(self.channels)} channels ({joined} via live updates, "
+            f"{len(self.channels) - joined} polled every {self.poll_interval}s) for {int(elapsed)}s — "
+            f"{self.stats['new']} new, {self.stats['edited']} edited, {self.stats['deleted']} deleted, "
+            f"{self.stats['backfilled']} backfilled"
+        )
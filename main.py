@@ -1,31 +1,44 @@
 import streamlit as st
-import asyncio
 import pandas as pd
-import io
-from telegram_client import create_client, delete_session_file
+import os
+from telegram_client import delete_session_file
+from analyst_sessions import current_analyst, session_key, get_session_manager
 from fetch_channel import fetch_channel_data
-from fetch_forwards import fetch_forwards
-from fetch_messages import fetch_messages
+from fetch_forwards import fetch_forwards, build_forward_counts
+from fetch_messages import fetch_messages, fetch_message_sample, MessageAnalytics
 from fetch_participants import fetch_participants
+from result_cache import get_result_cache
+from exporter import (EXPORT_FORMATS, ExportUnavailable, export_table, export_tables, export_url,
+                      remove_export, cleanup_exports)
+from participant_membership import aggregate_participants
+from membership_snapshots import MembershipSnapshotStore
+from audience_overlap import estimate_overlap
 from fetch_subscriptions import fetch_user_subscriptions
-from fetch_users import fetch_user_data
+from fetch_users import fetch_user_data, known_access_hashes
+from crawl_planner import build_crawl_plan
+from discovery_crawler import run_discovery_crawl
+from live_monitor import LiveMonitor
+from message_store import MessageStore
+from engagement_refresh import refresh_engagement, keys_from_dataframe, keys_from_store
+from takeout_session import run_in_takeout
+from client_pool import (ClientPool, find_pool_sessions, POOL_SESSIONS_DIR, pooled_fetch_messages,
+                         pooled_fetch_forwards, pooled_fetch_participants, pooled_fetch_channel_data)
 from telethon import functions, types
 from telethon.errors import PhoneNumberInvalidError, PhoneCodeInvalidError, SessionPasswordNeededError
-import nest_asyncio
 import re
 
 
-nest_asyncio.apply()
+# --- Per-analyst client and event loop ---
+# Each analyst's Telegram client runs on its own event loop thread, managed
+# outside st.session_state, so concurrent analysts never share a session file
+# and their fetches do not block each other.
+def get_analyst_session():
+    key = st.session_state.get("session_key")
+    return get_session_manager().get(key) if key else None
 
-# --- Ensure an Event Loop Exists ---
-import sys
-if "event_loop" not in st.session_state:
-    if sys.platform == "win32":
-        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())  # Windows fix
-    st.session_state.event_loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(st.session_state.event_loop)
-else:
-    asyncio.set_event_loop(st.session_state.event_loop)  # Keep the same event loop
+def run_async(coro):
+    """Run a coroutine on the current analyst's event loop and return its result"""
+    return get_analyst_session().run(coro)
 
 def clean_column_name(name):
     name = str(name)
@@ -35,6 +48,161 @@ def clean_column_name(name):
     name = re.sub(r'[^a-zA-Z0-9_\-]', '_', name)
     return name
 
+def get_frame(key):
+    """DataFrame of a fetch result, built once per fetch instead of on every rerun"""
+    data = st.session_state.get(key)
+    frames = st.session_state.setdefault("frame_cache", {})
+    cached = frames.get(key)
+    if cached is None or cached[0] is not data:
+        cached = (data, data if isinstance(data, pd.DataFrame) else pd.DataFrame(data))
+        frames[key] = cached
+    return cached[1]
+
+# --- Exports ---
+def export_button(label, name, keys, build):
+    """
+    Download link for an export that is only built when the user asks for it.
+
+    build() streams the export to a file on disk and returns its path. The link
+    points at Streamlit's static file serving, so the file is read only when it
+    is downloaded and never loaded into the app. It is kept until the results
+    stored under `keys` are replaced by a new fetch, so reruns (changing a chart,
+    switching tabs) cost nothing.
+    """
+    exports = st.session_state.setdefault("export_cache", {})
+    sources = [st.session_state.get(key) for key in keys]
+    cached = exports.get(name)
+    if cached is not None and (any(old is not new for old, new in zip(cached[0], sources))
+                               or not os.path.exists(cached[1])):
+        remove_export(cached[1])
+        del exports[name]
+        cached = None
+    if cached is None:
+        if not st.button(f"Prepare {label}", key=f"prepare_{name}"):
+            return
+        with st.spinner(f"Preparing {label}..."):
+            try:
+                cached = (sources, build())
+            except ExportUnavailable as e:
+                st.error(str(e))
+                return
+        exports[name] = cached
+    path = cached[1]
+    st.markdown(f'<a href="{export_url(path)}" download="{os.path.basename(path)}">📥 Download {label}</a>',
+                unsafe_allow_html=True)
+
+def export_section(name, keys, make_tables, main_table, prompt="Choose export format:"):
+    """Format picker with a lazy export of the main table, or of every table bundled together"""
+    fmt = st.selectbox(prompt, list(EXPORT_FORMATS), key=f"{name}_export_format")
+    bundle = st.checkbox("Include all tables (one zip, or one workbook for Excel)", key=f"{name}_export_bundle")
+    if bundle:
+        build = lambda: export_tables(make_tables(), f"{name}_export", fmt)
+    else:
+        build = lambda: export_table(make_tables()[main_table], name, fmt)
+    export_button(f"as {fmt}" + (" (all tables)" if bundle else ""), f"{name}_{fmt}_{bundle}", keys, build)
+
+def get_participant_aggregates():
+    """Aggregated participants and membership matrix, rebuilt only when participants_data changes"""
+    data = st.session_state.participants_data
+    cached = st.session_state.get("participants_aggregates")
+    if cached is None or cached[0] is not data:
+        aggregated, membership = aggregate_participants(get_frame("participants_data"))
+        cached = (data, aggregated, membership)
+        st.session_state.participants_aggregates = cached
+        st.session_state.audience_overlap = None
+    return cached[1], cached[2]
+
+# --- Background jobs ---
+# Fetches run as jobs on the analyst's event loop; results land in these session state keys
+MESSAGE_ANALYTICS_KEYS = ["top_hashtags", "top_urls", "top_domains", "forward_counts",
+                          "daily_volume", "weekly_volume", "monthly_volume"]
+FORWARD_KEYS = ["forwards_data", "forward_counts"]
+PARTICIPANT_KEYS = ["participants_data", "participants_reported", "participants_fetched", "participants_group_counts"]
+
+# How often the Jobs panel refreshes while jobs run
+JOB_POLL_SECONDS = 2
+
+def start_job(label, keys, make_coro, finalize_partial=None):
+    """Run make_coro() in the background; its result is stored under keys when it finishes"""
+    job = get_analyst_session().jobs.submit(label, make_coro, keys, finalize_partial)
+    st.session_state.setdefault("my_jobs", []).append(job.id)
+    st.toast(f"Started: {label}")
+
+def dedupe_albums(df):
+    albums = df["Grouped ID"] != "Not Available"
+    return pd.concat([df[~albums], df[albums].drop_duplicates(subset=["Grouped ID"], keep="first")])
+
+def partial_messages(start_date, end_date):
+    """Messages results built from the rows an interrupted job had collected"""
+    def finalize(reporter):
+        df = reporter.partial_frame("messages")
+        if df.empty:
+            return None
+        df = dedupe_albums(df).sort_values(by=["Channel", "Message DateTime (UTC)"]).reset_index(drop=True)
+        return (df, *MessageAnalytics(df).get_all_analytics(start_date, end_date))
+    return finalize
+
+def partial_forwards(reporter):
+    df = reporter.partial_frame("forwards")
+    if df.empty:
+        return None
+    df = dedupe_albums(df).sort_values(by=["Channel", "Message DateTime (UTC)"]).reset_index(drop=True)
+    return df, build_forward_counts(df)
+
+def partial_participants(reporter):
+    df = reporter.partial_frame("participants")
+    if df.empty:
+        return None
+    counts = df["Group"].value_counts()
+    return df, 0, len(df), {group: ("Not Available", int(n)) for group, n in counts.items()}
+
+def apply_finished_jobs():
+    """Store the results of this browser session's finished jobs in the session state"""
+    applied = st.session_state.setdefault("applied_jobs", set())
+    for job in get_analyst_session().jobs.get(st.session_state.get("my_jobs", [])):
+        if not job.done or job.id in applied:
+            continue
+        applied.add(job.id)
+        output = job.output()
+        # The results live in the session state from here on; the job only keeps its status
+        job.release()
+        if output is None or not job.keys:
+            continue
+        values = [output] if len(job.keys) == 1 else list(output)
+        for key, value in zip(job.keys, values):
+            st.session_state[key] = value
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def show_jobs_panel():
+    """Status, latest progress and partial rows of this browser session's jobs"""
+    manager = get_analyst_session().jobs
+    jobs = manager.get(st.session_state.get("my_jobs", []))
+    if not jobs:
+        return
+    st.write("### Jobs")
+    for job in reversed(jobs):
+        with st.container(border=True):
+            rows = job.reporter.partial_rows()
+            st.write(f"**{job.label}**: {job.status} ({int(job.elapsed())}s" + (f", {rows:,} rows so far)" if rows else ")"))
+            for line in job.reporter.latest_lines(3):
+                st.caption(line)
+            if job.error:
+                st.error(job.error)
+            col1, col2 = st.columns([1, 3])
+            with col1:
+                if not job.done and st.button("Cancel", key=f"cancel_job_{job.id}"):
+                    manager.cancel(job.id)
+                elif job.done and st.button("Dismiss", key=f"dismiss_job_{job.id}"):
+                    st.session_state.my_jobs.remove(job.id)
+                    manager.forget(job.id)
+            with col2:
+                if job.reporter.partials and not job.done and st.checkbox("Show rows so far", key=f"partial_job_{job.id}"):
+                    for name in job.reporter.partials:
+                        st.dataframe(job.reporter.partial_tail(name, 25))
+    # Finished jobs are applied by a full rerun, so their results show up below
+    if any(job.done and job.id not in st.session_state.get("applied_jobs", set()) for job in jobs):
+        st.rerun()
+
 # --- Streamlit UI ---
 st.title("TGForge")
 st.logo("logo.png", size='large')  # Official app logo
@@ -78,46 +246,48 @@ if st.session_state.auth_step == 1:
                     st.session_state.api_hash = api_hash  
                     st.session_state.phone_number = phone_number
                     
-                    # Create client if it doesn't exist
-                    if st.session_state.client is None:
-                        st.session_state.client = create_client(int(api_id), api_hash)
-                    
+                    # Each analyst (and Telegram account) gets its own session file and client
+                    st.session_state.session_key = session_key(current_analyst(), phone_number)
+                    client = get_analyst_session().get_client(api_id, api_hash)
+                    st.session_state.client = client
+
+                    # Runs on the analyst's loop thread, so it only talks to Telegram; the page is updated below
                     async def connect_and_send_code():
                         try:
                             # Ensure we're connected
-                            if not st.session_state.client.is_connected():
-                                await st.session_state.client.connect()
-                            
-                            # Check if already authorized
-                            if await st.session_state.client.is_user_authorized():
-                                st.success("Already authenticated! Proceeding...")
-                                st.session_state.auth_step = 3
-                                st.session_state.authenticated = True
-                                return
-                            
-                            # Send code request with error handling
-                            st.info("📤 Sending verification code...")
-                            result = await st.session_state.client.send_code_request(phone_number)
-                            
-                            # Store the phone_code_hash for later use
-                            st.session_state.phone_code_hash = result.phone_code_hash
-                            
-                            st.success("✅ Verification code sent! Check your Telegram app or SMS.")
-                            st.info(f"📱 Code sent via: {result.type}")
-                            
-                        except Exception as e:
-                            st.error(f"Failed to send code: {str(e)}")
+                            if not client.is_connected():
+                                await client.connect()
+
+                            # Already authorized: no code needed
+                            if await client.is_user_authorized():
+                                return None
+
+                            return await client.send_code_request(phone_number)
+                        except Exception:
                             # Try to disconnect and clean up
                             try:
-                                await st.session_state.client.disconnect()
-                                st.session_state.client = None
-                            except:
+                                await client.disconnect()
+                            except Exception:
                                 pass
-                            raise e
-                    
+                            raise
+
                     with st.spinner("Connecting to Telegram..."):
-                        st.session_state.event_loop.run_until_complete(connect_and_send_code())
-                        st.session_state.auth_step = 2
+                        try:
+                            result = run_async(connect_and_send_code())
+                        except Exception as e:
+                            st.error(f"Failed to send code: {str(e)}")
+                            st.session_state.client = None
+                            raise
+                        if result is None:
+                            st.success("Already authenticated! Proceeding...")
+                            st.session_state.auth_step = 3
+                            st.session_state.authenticated = True
+                        else:
+                            # Store the phone_code_hash for later use
+                            st.session_state.phone_code_hash = result.phone_code_hash
+                            st.success("✅ Verification code sent! Check your Telegram app or SMS.")
+                            st.info(f"📱 Code sent via: {result.type}")
+                            st.session_state.auth_step = 2
                         st.rerun()
                         
                 except PhoneNumberInvalidError:
@@ -131,16 +301,15 @@ if st.session_state.auth_step == 1:
     
     with col2:
         if st.button("Reset Session"):
-            # Clean up client connection
-            if st.session_state.client and st.session_state.client.is_connected():
-                try:
-                    st.session_state.event_loop.run_until_complete(
-                        st.session_state.client.disconnect()
-                    )
-                except:
-                    pass
-            st.session_state.client = None
-            delete_session_file()
+            # Disconnect this analyst's client and delete its session file
+            key = st.session_state.get("session_key") or (phone_number and session_key(current_analyst(), phone_number))
+            session_path = None
+            if key:
+                manager = get_session_manager()
+                manager.remove(key, delete_file=False)
+                session_path = manager.session_path(key)
+            st.session_state.session_key = None
+            delete_session_file(session_path)
             st.success("Session reset successfully")
             st.rerun()
 
@@ -160,27 +329,23 @@ elif st.session_state.auth_step == 2:
         if st.button("Verify Code"):
             if verification_code and len(verification_code) >= 5:
                 try:
+                    client = st.session_state.client
+                    phone = st.session_state.phone_number
+                    # Use the stored phone_code_hash if available
+                    phone_code_hash = st.session_state.get("phone_code_hash")
+
                     async def sign_in():
+                        if phone_code_hash:
+                            await client.sign_in(phone, verification_code, phone_code_hash=phone_code_hash)
+                        else:
+                            await client.sign_in(phone, verification_code)
+
+                    with st.spinner("Verifying code..."):
                         try:
-                            # Use the stored phone_code_hash if available
-                            if hasattr(st.session_state, 'phone_code_hash'):
-                                await st.session_state.client.sign_in(
-                                    st.session_state.phone_number, 
-                                    verification_code,
-                                    phone_code_hash=st.session_state.phone_code_hash
-                                )
-                            else:
-                                await st.session_state.client.sign_in(
-                                    st.session_state.phone_number, 
-                                    verification_code
-                                )
-                                
+                            run_async(sign_in())
                         except Exception as e:
                             st.error(f"Sign-in failed: {str(e)}")
-                            raise e
-                    
-                    with st.spinner("Verifying code..."):
-                        st.session_state.event_loop.run_until_complete(sign_in())
+                            raise
                         st.session_state.auth_step = 3
                         st.session_state.authenticated = True
                         st.success("🎉 Authentication successful!")
@@ -199,11 +364,8 @@ elif st.session_state.auth_step == 2:
     with col2:
         if st.button("Resend Code"):
             try:
-                async def resend_code():
-                    result = await st.session_state.client.send_code_request(st.session_state.phone_number)
-                    st.session_state.phone_code_hash = result.phone_code_hash
-                
-                st.session_state.event_loop.run_until_complete(resend_code())
+                result = run_async(st.session_state.client.send_code_request(st.session_state.phone_number))
+                st.session_state.phone_code_hash = result.phone_code_hash
                 st.success("🔄 New code sent!")
                 st.rerun()
             except Exception as e:
@@ -216,11 +378,22 @@ elif st.session_state.auth_step == 2:
 
 # --- Step 3: Fetch Channel Info UI ---
 elif st.session_state.auth_step == 3 and st.session_state.authenticated:
+    # The analyst's client is closed after a long idle period; reconnect from its session file
+    analyst_client = get_analyst_session().get_client(st.session_state.api_id, st.session_state.api_hash)
+    if analyst_client is not st.session_state.client:
+        # A new session also has a new job list, so old job IDs must not be looked up in it
+        st.session_state.client = analyst_client
+        st.session_state.my_jobs = []
+        st.session_state.applied_jobs = set()
+        st.session_state.pop("client_pool", None)
+    if not analyst_client.is_connected():
+        run_async(analyst_client.connect())
+
     st.subheader("Fetch Telegram Channel Data")
 
     # Choose what to fetch
     fetch_option = st.radio("Select Data to Fetch:", 
-                            ["Channel Info", "Messages", "Forwards", "Participants", "My Subscriptions", "User Lookup"])
+                            ["Channel Info", "Messages", "Forwards", "Participants", "Discovery Crawl", "Live Monitor", "Engagement Refresh", "My Subscriptions", "User Lookup"])
     
     # Channel usernames input (only show if not fetching subscriptions or user lookup)
     if fetch_option not in ["My Subscriptions", "User Lookup"]:
@@ -238,6 +411,9 @@ elif st.session_state.auth_step == 3 and st.session_state.authenticated:
 
     # For Messages, Forwards, and Participants, allow optional date range filtering
     participant_method = "Default"
+    participant_sharded = False
+    participant_concurrency = 1
+    participant_snapshot = False
     start_date = end_date = None
     include_comments = True  # Default to including comments
     if fetch_option in ["Messages", "Forwards", "Participants"]:
@@ -247,8 +423,29 @@ elif st.session_state.auth_step == 3 and st.session_state.authenticated:
                 "Original posts + comments (may take significantly longer to load)"
             ])
             include_comments = "comments" in msg_mode.lower()
+            collection_mode = st.radio("Collection Mode", ["Full crawl", "Random sample"],
+                                       help="A random sample fetches a few dozen batches of message IDs and estimates channel totals.")
+            if collection_mode == "Random sample":
+                sample_size = st.number_input("Messages sampled per channel", min_value=10, max_value=100000, value=1000, step=100)
+                sample_method = st.radio("Sampling Method", ["Uniform", "Stratified by month"])
+                sample_seed = st.number_input("Random seed (same seed gives the same sample)", min_value=0, value=42)
+                st.caption("Comments are not collected in sample mode.")
         if fetch_option == "Participants":
             participant_method = st.radio("Select Participant Fetch Method:", ["Default", "Via Messages"])
+            if participant_method == "Default":
+                participant_sharded = st.checkbox(
+                    "Extended enumeration for large groups (slower)", value=False,
+                    help="Runs many name-prefix searches to get past Telegram's ~10k member limit per query."
+                )
+            participant_concurrency = st.number_input(
+                "Groups fetched at the same time", min_value=1, max_value=10, value=3,
+                help="Groups share one request rate limit, so this mainly overlaps waiting time."
+            )
+            if participant_method == "Default":
+                participant_snapshot = st.checkbox(
+                    "Save membership snapshot (for join/leave tracking)", value=False,
+                    help="Stores each group's member IDs locally so later runs can be compared."
+                )
         use_date_range = st.checkbox("Optional: Filter by Date Range", value=False)
         if use_date_range:
             start_date = st.date_input("Start Date")
@@ -256,74 +453,325 @@ elif st.session_state.auth_step == 3 and st.session_state.authenticated:
     else:
         start_date = end_date = None
 
-    # Fetch buttons for each option
+    use_result_cache = True
+    if fetch_option in ["Messages", "Forwards", "Participants"]:
+        use_result_cache = st.checkbox(
+            "Reuse results cached in the last 24 hours", value=True,
+            help="Channels and groups already fetched with the same settings (and a date range covering this one) "
+                 "are loaded from disk instead of being crawled again."
+        )
+        with st.expander("Result cache"):
+            cache_stats = get_result_cache().stats()
+            st.write(f"{cache_stats['entries']} cached results, {cache_stats['bytes'] / 1024 ** 2:.1f} MB")
+            if st.button("Clear Result Cache"):
+                get_result_cache().clear()
+                st.rerun()
+
+    use_takeout = False
+    if fetch_option in ["Messages", "Forwards", "Participants"]:
+        use_takeout = st.checkbox(
+            "Bulk export mode (Telegram data export session)", value=False,
+            help="Runs the crawl in a takeout session, which Telegram rate-limits less strictly. "
+                 "The first time, Telegram asks you to allow the export in your Telegram app."
+        )
+
+    # Extra research accounts found in the sessions folder
+    pool_sessions = find_pool_sessions()
+    use_pool = False
+    if pool_sessions and fetch_option in ["Channel Info", "Messages", "Forwards", "Participants"]:
+        use_pool = st.checkbox(
+            f"Spread work across accounts ({len(pool_sessions)} extra in '{POOL_SESSIONS_DIR}/')", value=False,
+            help="Channels or groups are shared out between this account and the extra logged-in sessions. "
+                 "An account that hits a flood wait hands its work to the others. Not combined with bulk export mode."
+        )
+
+    def get_client_pool():
+        pool = st.session_state.get("client_pool")
+        if pool is None:
+            pool = run_async(
+                ClientPool.from_sessions(st.session_state.get("api_id"), st.session_state.get("api_hash"),
+                                         pool_sessions, primary=st.session_state.client)
+            )
+            st.session_state.client_pool = pool
+        return pool
+
+    def run_fetch(label, keys, job, finalize_partial=None):
+        """Start job(client) in the background, inside a takeout session in bulk export mode"""
+        client = st.session_state.client
+        if use_takeout:
+            return start_job(label, keys, lambda: run_in_takeout(client, job), finalize_partial)
+        return start_job(label, keys, lambda: job(client), finalize_partial)
+
+    # Snowball discovery settings
+    if fetch_option == "Discovery Crawl":
+        st.caption("Starts from the seed channels above and follows forwards and t.me mentions to connected channels.")
+        discovery_depth = st.number_input("Maximum depth from seeds", min_value=1, max_value=5, value=2)
+        discovery_budget = st.number_input("Maximum channels to crawl", min_value=1, max_value=10000, value=100)
+        discovery_messages = st.number_input("Recent messages scanned per channel", min_value=50, max_value=100000, value=500, step=50)
+        discovery_concurrency = st.number_input("Channels crawled at the same time", min_value=1, max_value=10, value=3)
+        discovery_resume = st.checkbox("Resume previous discovery crawl", value=False)
+        use_date_range = st.checkbox("Optional: Filter by Date Range", value=False)
+        if use_date_range:
+            start_date = st.date_input("Start Date")
+            end_date = st.date_input("End Date")
+
+    # Live monitoring settings
+    if fetch_option == "Live Monitor":
+        st.caption("Captures new, edited and deleted posts as they happen and saves them to the local message store. "
+                   "Channels your account has joined are followed live; others are checked every poll interval.")
+        monitor_minutes = st.number_input("Monitor for (minutes)", min_value=1, max_value=1440, value=30)
+        monitor_poll = st.number_input("Poll interval for channels you have not joined (seconds)", min_value=5, max_value=600, value=30)
+
+    # Engagement refresh settings
+    if fetch_option == "Engagement Refresh":
+        st.caption("Re-reads current views, forwards, replies and reactions for posts you have already collected "
+                   "(100 posts per request) and saves a time-stamped snapshot to the local message store.")
+        refresh_source = st.radio("Posts to refresh:", ["Local message store", "Uploaded Messages export (CSV)"])
+        refresh_upload = None
+        if refresh_source == "Uploaded Messages export (CSV)":
+            refresh_upload = st.file_uploader("Messages CSV (needs a 'Message URL' column)", type=["csv"])
+        else:
+            st.caption("Leave the channel list empty to refresh every stored channel.")
+        refresh_reactions = st.checkbox("Include reactions (one extra request per 100 posts)", value=True)
+
+    # Optional pre-flight crawl plan: size estimates, largest-first order and a live ETA
+    crawl_plan = None
+    if fetch_option in ["Messages", "Forwards", "Participants"]:
+        use_crawl_plan = st.checkbox("Plan crawl (estimate size and ETA before fetching)", value=False)
+        if use_crawl_plan:
+            plan_targets = [c.strip() for c in channel_input.split(",") if c.strip()]
+            # Only participant groups are fetched side by side; messages and forwards crawl one channel at a time
+            plan_concurrency = 1
+            if fetch_option == "Participants":
+                plan_kind = "participants" if participant_method == "Default" else "participants_messages"
+                plan_concurrency = int(participant_concurrency)
+            else:
+                plan_kind = fetch_option.lower()
+
+            def get_crawl_plan():
+                plan = st.session_state.get("crawl_plan")
+                if (plan is None or not plan.covers(plan_targets, plan_kind) or plan.concurrency != plan_concurrency
+                        or st.session_state.get("crawl_plan_window") != (start_date, end_date)):
+                    with st.spinner("Estimating crawl size..."):
+                        plan = run_async(
+                            build_crawl_plan(st.session_state.client, plan_targets, plan_kind, start_date, end_date,
+                                             concurrency=plan_concurrency)
+                        )
+                    st.session_state.crawl_plan = plan
+                    st.session_state.crawl_plan_window = (start_date, end_date)
+                return plan
+
+            if st.button("Estimate Crawl") and plan_targets:
+                get_crawl_plan()
+            if plan_targets and st.session_state.get("crawl_plan") is not None:
+                st.write("### Crawl Plan")
+                st.write(st.session_state.crawl_plan.summary())
+                st.dataframe(st.session_state.crawl_plan.to_dataframe(), hide_index=True)
+
+    # Fetch buttons for each option; every fetch runs as a background job (see the Jobs panel)
+    client = st.session_state.client
     if fetch_option == "Channel Info":
+        channel_info_cached = st.checkbox("Reuse channel info fetched in the last 6 hours", value=True)
         if st.button("Fetch Channel Info"):
-            st.session_state.channel_data = st.session_state.event_loop.run_until_complete(
-                fetch_channel_data(st.session_state.client, channel_input.split(","))
-            )
+            channels = channel_input.split(",")
+            if use_pool:
+                pool = get_client_pool()
+                start_job("Channel Info", ["channel_data"],
+                          lambda: pooled_fetch_channel_data(pool, channels, use_cache=channel_info_cached))
+            else:
+                start_job("Channel Info", ["channel_data"],
+                          lambda: fetch_channel_data(client, channels, use_cache=channel_info_cached))
     elif fetch_option == "Messages":
         if st.button("Fetch Messages"):
-            st.session_state.messages_data, st.session_state.top_hashtags, st.session_state.top_urls, \
-            st.session_state.top_domains, st.session_state.forward_counts, st.session_state.daily_volume, \
-            st.session_state.weekly_volume, st.session_state.monthly_volume = \
-                st.session_state.event_loop.run_until_complete(
-                    fetch_messages(st.session_state.client, channel_input.split(","), start_date, end_date, include_comments=include_comments)
-                )
+            channels = channel_input.split(",")
+            finalize = partial_messages(start_date, end_date)
+            if collection_mode == "Random sample":
+                sample_channels = [c.strip() for c in channels if c.strip()]
+                run_fetch("Messages (sample)", ["messages_data", "sample_estimates"] + MESSAGE_ANALYTICS_KEYS,
+                          lambda client: fetch_message_sample(
+                              client, sample_channels,
+                              sample_size=int(sample_size),
+                              method="stratified" if sample_method == "Stratified by month" else "uniform",
+                              seed=int(sample_seed), start_date=start_date, end_date=end_date,
+                          ))
+            elif use_pool:
+                st.session_state.pop("sample_estimates", None)
+                pool = get_client_pool()
+                start_job("Messages", ["messages_data"] + MESSAGE_ANALYTICS_KEYS,
+                          lambda: pooled_fetch_messages(pool, channels, start_date, end_date, include_comments=include_comments,
+                                                        use_cache=use_result_cache))
+            else:
+                st.session_state.pop("sample_estimates", None)
+                crawl_plan = get_crawl_plan() if use_crawl_plan else None
+                run_fetch("Messages", ["messages_data"] + MESSAGE_ANALYTICS_KEYS,
+                          lambda client: fetch_messages(
+                              client, channels, start_date, end_date, include_comments=include_comments, plan=crawl_plan,
+                              use_cache=use_result_cache
+                          ), finalize)
     elif fetch_option == "Forwards":
         if st.button("Fetch Forwards"):
-            st.session_state.forwards_data, st.session_state.forward_counts = \
-                st.session_state.event_loop.run_until_complete(
-                    fetch_forwards(st.session_state.client, channel_input.split(","), start_date, end_date)
-                )
+            channels = channel_input.split(",")
+            if use_pool:
+                pool = get_client_pool()
+                start_job("Forwards", FORWARD_KEYS,
+                          lambda: pooled_fetch_forwards(pool, channels, start_date, end_date, use_cache=use_result_cache))
+            else:
+                crawl_plan = get_crawl_plan() if use_crawl_plan else None
+                run_fetch("Forwards", FORWARD_KEYS,
+                          lambda client: fetch_forwards(client, channels, start_date, end_date, plan=crawl_plan,
+                                                        use_cache=use_result_cache),
+                          partial_forwards)
     elif fetch_option == "Participants":
         if st.button("Fetch Participants"):
             groups = [g.strip() for g in channel_input.split(",") if g.strip()]
             if not groups:
                 st.error("Please enter at least one valid group name.")
             else:
-                if participant_method == "Default":
-                    (st.session_state.participants_data,
-                     st.session_state.participants_reported,
-                     st.session_state.participants_fetched,
-                     st.session_state.participants_group_counts) = st.session_state.event_loop.run_until_complete(
-                        fetch_participants(st.session_state.client, groups, method="default")
-                    )
+                crawl_plan = get_crawl_plan() if use_crawl_plan else None
+                snapshot_store = MembershipSnapshotStore() if participant_snapshot else None
+                if use_pool:
+                    pool = get_client_pool()
+                    start_job("Participants", PARTICIPANT_KEYS,
+                              lambda: pooled_fetch_participants(pool, groups,
+                                                                method="default" if participant_method == "Default" else "messages",
+                                                                start_date=start_date, end_date=end_date, sharded=participant_sharded,
+                                                                snapshot_store=snapshot_store, use_cache=use_result_cache))
+                elif participant_method == "Default":
+                    run_fetch("Participants", PARTICIPANT_KEYS,
+                              lambda client: fetch_participants(client, groups, method="default", plan=crawl_plan,
+                                                                sharded=participant_sharded, concurrency=participant_concurrency,
+                                                                snapshot_store=snapshot_store, use_cache=use_result_cache),
+                              partial_participants)
                 else:
-                    (st.session_state.participants_data,
-                     st.session_state.participants_reported,
-                     st.session_state.participants_fetched,
-                     st.session_state.participants_group_counts) = st.session_state.event_loop.run_until_complete(
-                        fetch_participants(st.session_state.client, groups, method="messages", start_date=start_date, end_date=end_date)
-                    )
+                    run_fetch("Participants (via messages)", PARTICIPANT_KEYS,
+                              lambda client: fetch_participants(client, groups, method="messages", start_date=start_date, end_date=end_date,
+                                                                plan=crawl_plan, concurrency=participant_concurrency,
+                                                                snapshot_store=snapshot_store, use_cache=use_result_cache),
+                              partial_participants)
+        with st.expander("Membership History"):
+            history_store = MembershipSnapshotStore()
+            history_groups = history_store.groups()
+            if not history_groups:
+                st.write("No membership snapshots saved yet.")
+            else:
+                history_group = st.selectbox("Group", history_groups)
+                st.dataframe(history_store.churn_summary(history_group), hide_index=True)
+                snapshot_ids = history_store.snapshots(history_group)["Snapshot"].tolist()
+                if len(snapshot_ids) >= 2:
+                    old_snapshot = st.selectbox("Compare snapshot", snapshot_ids, index=len(snapshot_ids) - 2)
+                    new_snapshot = st.selectbox("with snapshot", snapshot_ids, index=len(snapshot_ids) - 1)
+                    if st.button("Compare Snapshots"):
+                        st.session_state.membership_diff = history_store.diff(history_group, old_snapshot, new_snapshot)
+    elif fetch_option == "Discovery Crawl":
+        if st.button("Start Discovery Crawl"):
+            seeds = [c.strip() for c in channel_input.split(",") if c.strip()]
+            if not seeds and not discovery_resume:
+                st.error("Please enter at least one seed channel.")
+            else:
+                frontier_path = get_analyst_session().frontier_path
+                start_job("Discovery Crawl", ["discovery_nodes", "discovery_edges"],
+                          lambda: run_discovery_crawl(
+                              client, seeds,
+                              max_depth=int(discovery_depth),
+                              max_channels=int(discovery_budget),
+                              messages_per_channel=int(discovery_messages),
+                              start_date=start_date, end_date=end_date,
+                              concurrency=int(discovery_concurrency),
+                              resume=discovery_resume,
+                              frontier_path=frontier_path,
+                          ))
+    elif fetch_option == "Live Monitor":
+        monitor_channels = [c.strip() for c in channel_input.split(",") if c.strip()]
+        col1, col2 = st.columns([1, 1])
+        with col1:
+            start_monitor = st.button("Start Monitoring")
+        with col2:
+            load_stored = st.button("Load Stored Messages")
+        if start_monitor:
+            if not monitor_channels:
+                st.error("Please enter at least one channel.")
+            else:
+                monitor = LiveMonitor(client, monitor_channels, poll_interval=int(monitor_poll))
+                start_job("Live Monitor", [], lambda: monitor.run(duration_seconds=int(monitor_minutes) * 60))
+                st.info("Monitoring in the background. Click **Load Stored Messages** to see what has been captured so far.")
+        if load_stored:
+            st.session_state.monitor_data = MessageStore().load_messages(monitor_channels or None)
+    elif fetch_option == "Engagement Refresh":
+        if st.button("Refresh Engagement"):
+            store = MessageStore()
+            refresh_channels = [c.strip() for c in channel_input.split(",") if c.strip()]
+            if refresh_source == "Local message store":
+                message_keys = keys_from_store(store, refresh_channels or None)
+            elif refresh_upload is not None:
+                message_keys = keys_from_dataframe(pd.read_csv(refresh_upload, usecols=["Message URL"]))
+            else:
+                message_keys = []
+            if not message_keys:
+                st.error("No posts to refresh.")
+            else:
+                snapshot_channels = sorted({username for username, _ in message_keys})
+
+                async def refresh_and_load_history():
+                    snapshots = await refresh_engagement(client, message_keys,
+                                                         include_reactions=refresh_reactions, store=store)
+                    return snapshots, store.load_engagement_snapshots(snapshot_channels)
+
+                start_job("Engagement Refresh", ["engagement_snapshots", "engagement_history"], refresh_and_load_history)
     elif fetch_option == "My Subscriptions":
+        subscriptions_archived = st.checkbox("Include archived chats", value=True)
+        subscriptions_enrich = st.checkbox("Fetch full details (member counts, descriptions)", value=False,
+                                           help="One extra request per subscription, several at a time.")
         if st.button("Fetch My Subscriptions"):
-            st.session_state.subscription_channels, st.session_state.subscription_groups = \
-                st.session_state.event_loop.run_until_complete(
-                    fetch_user_subscriptions(st.session_state.client)
-                )
+            start_job("My Subscriptions", ["subscription_channels", "subscription_groups"],
+                      lambda: fetch_user_subscriptions(client, include_archived=subscriptions_archived,
+                                                       enrich=subscriptions_enrich))
 
     elif fetch_option == "User Lookup":
         if st.button("Fetch User Data"):
             if user_ids_input:
                 # Parse user IDs from input
                 user_ids = [uid.strip() for uid in user_ids_input.split(",") if uid.strip()]
-                st.session_state.user_data = st.session_state.event_loop.run_until_complete(
-                    fetch_user_data(st.session_state.client, user_ids)
-                )
+                # Access hashes from fetched participants let numeric IDs skip the username resolve
+                access_hashes = known_access_hashes(st.session_state.get("participants_data"))
+                start_job("User Lookup", ["user_data"],
+                          lambda: fetch_user_data(client, user_ids, access_hashes=access_hashes))
             else:
                 st.warning("Please enter at least one user ID")
 
+    apply_finished_jobs()
+    show_jobs_panel()
+
+    # Exports are files on disk; old ones are removed once per browser session
+    if "exports_cleaned" not in st.session_state:
+        cleanup_exports()
+        st.session_state.exports_cleaned = True
+
+    if use_pool and st.session_state.get("client_pool") is not None:
+        with st.expander("Account pool status"):
+            st.dataframe(st.session_state.client_pool.status_dataframe(), hide_index=True)
+
     # --- Refresh Button (Clears Display But Keeps Data) ---
     if st.button("🔄 Refresh / Cancel"):
         # Signal cancellation to any running fetch tasks
         st.session_state.cancel_fetch = True
+        jobs = get_analyst_session().jobs
+        for job_id in st.session_state.get("my_jobs", []):
+            jobs.cancel(job_id)
+            jobs.forget(job_id)
+        st.session_state.my_jobs = []
+        st.session_state.applied_jobs = set()
+        for cached_export in st.session_state.get("export_cache", {}).values():
+            remove_export(cached_export[1])
         # Clear all keys—including those for participants—in session state
         for key in ["channel_data", "forwards_data", "messages_data", "top_hashtags",
                     "top_urls", "top_domains", "forward_counts", "daily_volume",
                     "weekly_volume", "monthly_volume", "participants_data",
                     "participants_reported", "participants_fetched", "participants_group_counts",
-                    "subscription_channels", "subscription_groups", "user_data"]:
+                    "participants_aggregates", "membership_diff", "audience_overlap",
+                    "subscription_channels", "subscription_groups", "user_data",
+                    "crawl_plan", "crawl_plan_window", "discovery_nodes", "discovery_edges", "monitor_data",
+                    "engagement_snapshots", "engagement_history", "sample_estimates",
+                    "frame_cache", "export_cache"]:
         
             if key in st.session_state:
                 del st.session_state[key]
@@ -344,27 +792,18 @@ elif st.session_state.auth_step == 3 and st.session_state.authenticated:
 
     # ✅ Show first 25 rows of forwards data in a table
     if "forwards_data" in st.session_state and st.session_state.forwards_data is not None:
-        df_fwd = pd.DataFrame(st.session_state.forwards_data)
+        df_fwd = get_frame("forwards_data")
         st.write("### Forwarded Messages Preview (First 25 Rows)")
         st.dataframe(df_fwd.head(25))
-
-        # ✅ Fix CSV Download (use BytesIO)
-        csv_output = io.BytesIO()
-        df_fwd.to_csv(csv_output, index=False)
-        csv_output.seek(0)
-        st.download_button(
-            "📥 Download Forwards (CSV)",
-            data=csv_output.getvalue(),
-            file_name="forwards.csv",
-            mime="text/csv",
-        )
+        export_button("Forwards (CSV)", "forwards_preview_csv", ["forwards_data"],
+                      lambda: export_table(df_fwd, "forwards"))
 
     # ✅ Show top 25 most viewed posts
     if "messages_data" in st.session_state:
-        df_messages = pd.DataFrame(st.session_state.messages_data)
+        df_messages = get_frame("messages_data")
 
         if "Views" in df_messages.columns:
-            df_top_views = df_messages.sort_values(by="Views", ascending=False).head(25)
+            df_top_views = df_messages.nlargest(25, "Views")
             st.write("### Top 25 Most Viewed Posts")
             st.data_editor(
                 df_top_views,
@@ -393,72 +832,63 @@ elif st.session_state.auth_step == 3 and st.session_state.authenticated:
                 }
             )
 
+    # ✅ Show sample-based estimates (Random sample mode)
+    if "sample_estimates" in st.session_state and st.session_state.sample_estimates is not None:
+        st.write("### Sample Estimates")
+        st.caption("Estimated number of messages in the selected window, with 95% confidence intervals.")
+        st.dataframe(st.session_state.sample_estimates, hide_index=True)
+
     # ✅ Show first 25 rows of forward counts in a table
     if "forward_counts" in st.session_state and st.session_state.forward_counts is not None:
-        df_counts = pd.DataFrame(st.session_state.forward_counts)
+        df_counts = get_frame("forward_counts")
         st.write("### Top Forwarded Channels")
         st.data_editor(df_counts.head(25))
 
     # ✅ Show top shared domains
     if "top_domains" in st.session_state:
         st.write("### Top Domains")
-        st.data_editor(pd.DataFrame(st.session_state.top_domains).head(25))
+        st.data_editor(get_frame("top_domains").head(25))
 
     # ✅ Show first 25 rows of top URLs
     if "top_urls" in st.session_state and st.session_state.top_urls is not None:
-        df_urls = pd.DataFrame(st.session_state.top_urls)
+        df_urls = get_frame("top_urls")
         st.write("### Top URLs")
         st.data_editor(df_urls.head(25))
 
     # ✅ Show first 25 rows of top hashtags
     if "top_hashtags" in st.session_state and st.session_state.top_hashtags is not None:
-        df_hashtags = pd.DataFrame(st.session_state.top_hashtags)
+        df_hashtags = get_frame("top_hashtags")
         st.write("### Top Hashtags")
         st.data_editor(df_hashtags.head(25))
 
-    if "participants_data" in st.session_state and not pd.DataFrame(st.session_state.participants_data).empty:
+    if "participants_data" in st.session_state and not get_frame("participants_data").empty:
         st.write("### Participants (Aggregated by User)")
-        df_participants = pd.DataFrame(st.session_state.participants_data)
-
-        # Explicitly define known user info columns.
-        user_cols = [
-            "User ID", "Deleted", "Is Bot", "Verified", "Restricted", "Scam", "Fake",
-            "Premium", "Access Hash", "First Name", "Last Name", "Username", "Phone",
-            "Status", "Timezone Info", "Restriction Reason", "Language Code", "Last Seen",
-            "Profile Picture DC ID", "Profile Picture Photo ID"
-        ]
-        # Assume that any column not in user_cols is a group membership flag.
-        group_cols = [col for col in df_participants.columns if col not in user_cols]
-
-        # Group by "User ID": for user info take the first value; for group flags, take max.
-        aggregated = df_participants.groupby("User ID").agg({
-            "Username": "first",
-            "First Name": "first",
-            "Last Name": "first",
-            "Status": "first",
-            **{col: "max" for col in group_cols}
-        }).reset_index()
-
-        # Convert group membership columns to numeric (if they aren't already)
-        if group_cols:
-            aggregated[group_cols] = aggregated[group_cols].fillna(0).apply(pd.to_numeric, errors='coerce').fillna(0).astype(int)
-            # Calculate the number of groups for each user.
-            aggregated["Group Count"] = aggregated[group_cols].sum(axis=1)
-            # Build a comma-separated list of groups for each user.
-            aggregated["Groups"] = aggregated[group_cols].apply(
-                lambda row: ", ".join([col for col in group_cols if row[col] == 1]), axis=1
-            )
-        else:
-            aggregated["Group Count"] = 0
-            aggregated["Groups"] = ""
+        aggregated, membership = get_participant_aggregates()
 
         # Create two tabs: one with all aggregated participants and one for those in 2 or more groups.
-        tabs = st.tabs(["All Participants", "Active in ≥ 2 Chats"])
+        tabs = st.tabs(["All Participants", "Active in ≥ 2 Chats", "Group Overlap", "Audience Overlap"])
         with tabs[0]:
             st.dataframe(aggregated)
         with tabs[1]:
             multi = aggregated[aggregated["Group Count"] >= 2]
             st.dataframe(multi[["User ID", "Username", "Group Count", "Groups"]])
+        with tabs[2]:
+            st.dataframe(membership.overlap_table())
+        with tabs[3]:
+            overlap_method = st.radio("Overlap method", ["Auto", "Exact", "Sketch (fast estimate)"], horizontal=True,
+                                      help="Sketches estimate overlap from MinHash and HyperLogLog summaries of each group.")
+            if st.button("Compute Audience Overlap"):
+                method = {"Auto": "auto", "Exact": "exact"}.get(overlap_method, "sketch")
+                st.session_state.audience_overlap = estimate_overlap(
+                    get_frame("participants_data"), method=method, membership=membership
+                )
+            overlap = st.session_state.get("audience_overlap")
+            if overlap is not None:
+                st.write(overlap.summary())
+                st.write("Jaccard similarity")
+                st.dataframe(overlap.jaccard())
+                st.write("Containment (share of the row group's audience also in the column group)")
+                st.dataframe(overlap.containment())
 
         if "participants_group_counts" in st.session_state:
             st.write("#### Participant Count Comparison:")
@@ -467,78 +897,81 @@ elif st.session_state.auth_step == 3 and st.session_state.authenticated:
         # Optionally, write a summary below the tabs
         st.write("Total unique participants collected:", len(aggregated))
 
+    if "membership_diff" in st.session_state and st.session_state.membership_diff is not None:
+        df_diff = st.session_state.membership_diff
+        st.write("### Membership Changes")
+        st.write(", ".join(f"{count} {change}" for change, count in df_diff["Change"].value_counts().items()) or "No changes.")
+        st.dataframe(df_diff, hide_index=True)
+        export_button("Changes as CSV", "membership_diff_csv", ["membership_diff"],
+                      lambda: export_table(df_diff, "membership_changes"))
+
+    # Display Discovery Crawl results
+    if "discovery_nodes" in st.session_state and st.session_state.discovery_nodes is not None:
+        df_nodes = st.session_state.discovery_nodes
+        df_edges = st.session_state.discovery_edges
+        st.write(f"### Discovered Channels ({len(df_nodes)})")
+        st.dataframe(df_nodes)
+        st.write(f"### Connections ({len(df_edges)})")
+        st.dataframe(df_edges.head(100))
+        export_button("Discovered Channels (CSV)", "discovery_nodes_csv", ["discovery_nodes"],
+                      lambda: export_table(df_nodes, "discovered_channels"))
+        export_button("Connections (CSV)", "discovery_edges_csv", ["discovery_edges"],
+                      lambda: export_table(df_edges, "discovery_connections"))
+
+    # Display Live Monitor results
+    if "monitor_data" in st.session_state and st.session_state.monitor_data is not None:
+        df_monitor = st.session_state.monitor_data
+        st.write(f"### Stored Messages ({len(df_monitor)})")
+        if df_monitor.empty:
+            st.info("No messages stored for these channels yet.")
+        else:
+            st.dataframe(df_monitor.sort_values(by="Message DateTime (UTC)", ascending=False).head(100))
+            export_button("Stored Messages (CSV)", "monitor_csv", ["monitor_data"],
+                          lambda: export_table(df_monitor, "monitored_messages"))
+
+    # Display Engagement Refresh results
+    if "engagement_snapshots" in st.session_state and st.session_state.engagement_snapshots is not None:
+        df_snapshots = st.session_state.engagement_snapshots
+        df_history = st.session_state.engagement_history
+        st.write(f"### Current Engagement ({len(df_snapshots)} posts)")
+        st.dataframe(df_snapshots)
+        st.write(f"### Engagement History ({len(df_history)} snapshots)")
+        st.dataframe(df_history.tail(100))
+        export_button("Engagement History (CSV)", "engagement_history_csv", ["engagement_history"],
+                      lambda: export_table(df_history, "engagement_history"))
+
     # Display Subscriptions
     if "subscription_channels" in st.session_state and st.session_state.subscription_channels:
         st.write(f"### Channels ({len(st.session_state.subscription_channels)})")
-        df_channels = pd.DataFrame(st.session_state.subscription_channels)
+        df_channels = get_frame("subscription_channels")
         st.dataframe(df_channels)
         
         # Download option
-        csv_output = io.BytesIO()
-        df_channels.to_csv(csv_output, index=False)
-        csv_output.seek(0)
-        st.download_button(
-            "📥 Download Channels (CSV)",
-            data=csv_output.getvalue(),
-            file_name="my_channels.csv",
-            mime="text/csv",
-        )
+        export_button("Channels (CSV)", "subscription_channels_csv", ["subscription_channels"],
+                      lambda: export_table(df_channels, "my_channels"))
     
     if "subscription_groups" in st.session_state and st.session_state.subscription_groups:
         st.write(f"### Groups/Supergroups ({len(st.session_state.subscription_groups)})")
-        df_groups = pd.DataFrame(st.session_state.subscription_groups)
+        df_groups = get_frame("subscription_groups")
         st.dataframe(df_groups)
         
         # Download option
-        csv_output = io.BytesIO()
-        df_groups.to_csv(csv_output, index=False)
-        csv_output.seek(0)
-        st.download_button(
-            "📥 Download Groups (CSV)",
-            data=csv_output.getvalue(),
-            file_name="my_groups.csv",
-            mime="text/csv",
-        )
+        export_button("Groups (CSV)", "subscription_groups_csv", ["subscription_groups"],
+                      lambda: export_table(df_groups, "my_groups"))
 
     # Display User Lookup Data
     if "user_data" in st.session_state and st.session_state.user_data:
         st.write(f"### User Information ({len(st.session_state.user_data)} users)")
-        df_users = pd.DataFrame(st.session_state.user_data)
+        df_users = get_frame("user_data")
         st.dataframe(df_users)
         
         # Download options
         st.subheader("📤 Export User Data")
-        format_option = st.selectbox("Choose export format:", ["CSV", "Excel"], key="user_export_format")
-        
-        if format_option == "CSV":
-            csv_output = io.BytesIO()
-            df_users.to_csv(csv_output, index=False)
-            csv_output.seek(0)
-            st.download_button(
-                "📥 Download as CSV",
-                data=csv_output.getvalue(),
-                file_name="user_data.csv",
-                mime="text/csv",
-            )
-        
-        elif format_option == "Excel":
-            output_xlsx = io.BytesIO()
-            with pd.ExcelWriter(output_xlsx, engine="openpyxl") as writer:
-                df_users.to_excel(writer, sheet_name="User Data", index=False)
-            output_xlsx.seek(0)
-            st.download_button(
-                "📥 Download as Excel",
-                data=output_xlsx.getvalue(),
-                file_name="user_data.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            )
+        export_section("user_data", ["user_data"], lambda: {"user_data": df_users}, "user_data")
     
     # ✅ Define color palette
     COLOR_PALETTE = ["#C7074D", "#B4B2B1", "#4C4193", "#0068B2", "#E76863", "#5C6771"]
 
-    def convert_df_to_markdown(df):
-        return df.to_markdown(index=False, tablefmt="github")
-
     def plot_vot_chart(df, index_col, title, freq="D"):
         st.subheader(title)
 
@@ -572,195 +1005,66 @@ elif st.session_state.auth_step == 3 and st.session_state.authenticated:
 
     # ✅ Show Volume Over Time Charts with Missing Dates Filled
     if "daily_volume" in st.session_state:
-        df_daily = pd.DataFrame(st.session_state.daily_volume)
-        df_daily = df_daily.fillna(0)
+        df_daily = get_frame("daily_volume").fillna(0)
         plot_vot_chart(df_daily, "Date", "Daily Message Volume", freq="D")
 
     if "weekly_volume" in st.session_state:
-        df_weekly = pd.DataFrame(st.session_state.weekly_volume)
-        df_weekly = df_weekly.fillna(0)
+        df_weekly = get_frame("weekly_volume").fillna(0)
         plot_vot_chart(df_weekly, "Week", "Weekly Message Volume", freq="W-TUE")
 
     if "monthly_volume" in st.session_state:
-        df_monthly = pd.DataFrame(st.session_state.monthly_volume)
-        df_monthly = df_monthly.fillna(0)
+        df_monthly = get_frame("monthly_volume").fillna(0)
         plot_vot_chart(df_monthly, "Year-Month", "Monthly Message Volume", freq="MS")
 
     # CSV Download
     if "messages_data" in st.session_state and st.session_state.messages_data is not None:
-        df_messages = pd.DataFrame(st.session_state.messages_data)
+        df_messages = get_frame("messages_data")
 
         st.subheader("Export Raw Data")
-        format_option = st.selectbox("Choose export format for raw Telegram data:", ["CSV", "Markdown", "Excel"], key="messages_export_format")
-
-        if format_option == "CSV":
-            csv_output = io.BytesIO()
-            df_messages.to_csv(csv_output, index=False)
-            csv_output.seek(0)
-            st.download_button(
-                "📥 Download as CSV",
-                data=csv_output.getvalue(),
-                file_name="messages.csv",
-                mime="text/csv",
-            )
-
-        elif format_option == "Markdown":
-            markdown_output = convert_df_to_markdown(df_messages.head(1000))  # Limit size if needed
-            st.download_button(
-                "📥 Download as Markdown",
-                data=markdown_output,
-                file_name="messages.md",
-                mime="text/markdown",
-            )
-
-        elif format_option == "Excel":
-            output_xlsx = io.BytesIO()
-            with pd.ExcelWriter(output_xlsx, engine="openpyxl") as writer:
-                df_messages.to_excel(writer, sheet_name="Messages", index=False)
-            output_xlsx.seek(0)
-            st.download_button(
-                "📥 Download as Excel",
-                data=output_xlsx.getvalue(),
-                file_name="messages.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            )
+        export_section(
+            "messages", ["messages_data"] + MESSAGE_ANALYTICS_KEYS,
+            lambda: {"messages": df_messages, **{key: get_frame(key) for key in MESSAGE_ANALYTICS_KEYS}},
+            "messages", prompt="Choose export format for raw Telegram data:",
+        )
 
     # XLSX Download
     if "messages_data" in st.session_state and st.session_state.messages_data is not None:
         st.subheader("Export Channel(s) Analytics")
-        # Build XLSX for message analytics
-        df_messages = pd.DataFrame(st.session_state.messages_data).nlargest(50, "Views")  # Top 50 most viewed messages
-        df_top_domains = pd.DataFrame(st.session_state.top_domains).head(25)               # Top 25 shared domains
-        df_top_urls = pd.DataFrame(st.session_state.top_urls).head(25)                     # Top 25 shared URLs
-        df_forward_counts = pd.DataFrame(st.session_state.forward_counts)                  # Forward counts
-        df_top_hashtags = pd.DataFrame(st.session_state.top_hashtags).head(25)             # Top 25 hashtags
-        df_daily_volume = pd.DataFrame(st.session_state.daily_volume)                      # Daily volume
-        df_weekly_volume = pd.DataFrame(st.session_state.weekly_volume)                    # Weekly volume
-        df_monthly_volume = pd.DataFrame(st.session_state.monthly_volume)                  # Monthly volume
-
-        output_xlsx = io.BytesIO()
-        with pd.ExcelWriter(output_xlsx, engine="openpyxl") as writer:
-            df_messages.to_excel(writer, sheet_name="Top 50 Viewed Posts", index=False)
-            df_top_domains.to_excel(writer, sheet_name="Top 25 Shared Domains", index=False)
-            df_top_urls.to_excel(writer, sheet_name="Top 25 Shared URLs", index=False)
-            df_forward_counts.to_excel(writer, sheet_name="Forward Counts", index=False)
-            df_top_hashtags.to_excel(writer, sheet_name="Top 25 Hashtags", index=False)
-            df_daily_volume.to_excel(writer, sheet_name="Daily Volume", index=False)
-            df_weekly_volume.to_excel(writer, sheet_name="Weekly Volume", index=False)
-            df_monthly_volume.to_excel(writer, sheet_name="Monthly Volume", index=False)
-        output_xlsx.seek(0)
-
-        st.download_button(
-            "📥 Download Analytics",
-            data=output_xlsx.getvalue(),
-            file_name="messages_analysis.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        )
+
+        def build_messages_analytics():
+            return export_tables({
+                "Top 50 Viewed Posts": get_frame("messages_data").nlargest(50, "Views"),
+                "Top 25 Shared Domains": get_frame("top_domains").head(25),
+                "Top 25 Shared URLs": get_frame("top_urls").head(25),
+                "Forward Counts": get_frame("forward_counts"),
+                "Top 25 Hashtags": get_frame("top_hashtags").head(25),
+                "Daily Volume": get_frame("daily_volume"),
+                "Weekly Volume": get_frame("weekly_volume"),
+                "Monthly Volume": get_frame("monthly_volume"),
+            }, "messages_analysis", "Excel")
+
+        export_button("Analytics", "messages_analytics_xlsx", ["messages_data"] + MESSAGE_ANALYTICS_KEYS,
+                      build_messages_analytics)
 
     elif "forwards_data" in st.session_state and st.session_state.forwards_data is not None:
         st.subheader("Export Channel(s) Analytics")
-        df_forwards = pd.DataFrame(st.session_state.forwards_data)
-        df_forward_counts = pd.DataFrame(st.session_state.forward_counts)
+        df_forwards = get_frame("forwards_data")
+        df_forward_counts = get_frame("forward_counts")
 
         st.subheader("📤 Export Forwards Data")
-        format_option = st.selectbox("Choose export format:", ["CSV", "Markdown", "Excel"], key="forwards_export_format")
-
-        if format_option == "CSV":
-            csv_output = io.BytesIO()
-            df_forwards.to_csv(csv_output, index=False)
-            csv_output.seek(0)
-            st.download_button(
-                "📥 Download as CSV",
-                data=csv_output.getvalue(),
-                file_name="forwards.csv",
-                mime="text/csv",
-            )
-
-        elif format_option == "Markdown":
-            markdown_output = convert_df_to_markdown(df_forwards.head(1000))
-            st.download_button(
-                "📥 Download as Markdown",
-                data=markdown_output,
-                file_name="forwards.md",
-                mime="text/markdown",
-            )
-
-        elif format_option == "Excel":
-            output_xlsx = io.BytesIO()
-            with pd.ExcelWriter(output_xlsx, engine="openpyxl") as writer:
-                df_forwards.to_excel(writer, sheet_name="Forwarded Messages", index=False)
-                df_forward_counts.to_excel(writer, sheet_name="Forward Counts", index=False)
-            output_xlsx.seek(0)
-            st.download_button(
-                "📥 Download as Excel",
-                data=output_xlsx.getvalue(),
-                file_name="forwards_analysis.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            )
+        export_section("forwards", FORWARD_KEYS,
+                       lambda: {"forwards": df_forwards, "forward_counts": df_forward_counts}, "forwards")
 
-    elif "participants_data" in st.session_state and not pd.DataFrame(st.session_state.participants_data).empty:
+    elif "participants_data" in st.session_state and not get_frame("participants_data").empty:
         st.subheader("Export Channel(s) Analytics")
-        df_participants = pd.DataFrame(st.session_state.participants_data)
-
-        user_cols = [
-            "User ID", "Deleted", "Is Bot", "Verified", "Restricted", "Scam", "Fake",
-            "Premium", "Access Hash", "First Name", "Last Name", "Username", "Phone",
-            "Status", "Timezone Info", "Restriction Reason", "Language Code", "Last Seen",
-            "Profile Picture DC ID", "Profile Picture Photo ID"
-        ]
-        group_cols = [col for col in df_participants.columns if col not in user_cols]
-        aggregated = df_participants.groupby("User ID").agg({
-            "Username": "first",
-            "First Name": "first",
-            "Last Name": "first",
-            "Status": "first",
-            **{col: "max" for col in group_cols}
-        }).reset_index()
-        if group_cols:
-            aggregated[group_cols] = aggregated[group_cols].fillna(0).apply(pd.to_numeric, errors='coerce').fillna(0).astype(int)
-            aggregated["Group Count"] = aggregated[group_cols].sum(axis=1)
-            aggregated["Groups"] = aggregated[group_cols].apply(
-                lambda row: ", ".join([col for col in group_cols if row[col] == 1]), axis=1
-            )
-        else:
-            aggregated["Group Count"] = 0
-            aggregated["Groups"] = ""
+        df_participants = get_frame("participants_data")
+        aggregated, membership = get_participant_aggregates()
 
         st.subheader("📤 Export Participants Data")
-        format_option = st.selectbox("Choose export format:", ["CSV", "Markdown", "Excel"], key="participants_export_format")
-
-        if format_option == "CSV":
-            csv_output = io.BytesIO()
-            aggregated.to_csv(csv_output, index=False)
-            csv_output.seek(0)
-            st.download_button(
-                "📥 Download as CSV",
-                data=csv_output.getvalue(),
-                file_name="participants.csv",
-                mime="text/csv",
-            )
-
-        elif format_option == "Markdown":
-            markdown_output = convert_df_to_markdown(aggregated.head(1000))
-            st.download_button(
-                "📥 Download as Markdown",
-                data=markdown_output,
-                file_name="participants.md",
-                mime="text/markdown",
-            )
-
-        elif format_option == "Excel":
-            output_xlsx_participants = io.BytesIO()
-            with pd.ExcelWriter(output_xlsx_participants, engine="openpyxl") as writer:
-                df_participants.to_excel(writer, sheet_name="Raw Participants", index=False)
-                aggregated.to_excel(writer, sheet_name="Aggregated Participants", index=False)
-            output_xlsx_participants.seek(0)
-            st.download_button(
-                "📥 Download as Excel",
-                data=output_xlsx_participants.getvalue(),
-                file_name="participants_analysis.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
+        export_section("participants", ["participants_data"],
+                       lambda: {"participants": aggregated, "raw_participants": df_participants,
+                                "group_overlap": membership.overlap_table()},
+                       "participants")
 
 st.markdown(
     """
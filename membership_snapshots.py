@@ -0,0 +1,217 @@
+# membership_snapshots.py
+import json
+import os
+import re
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+SNAPSHOT_DIR = "tgforge_membership_snapshots"
+
+# Profile fields tracked between snapshots
+PROFILE_FIELDS = ["Username", "First Name", "Last Name"]
+MISSING_VALUES = {"No Username", "Not Available", "No First Name", "No Last Name", "nan", "None"}
+
+
+def _safe_name(group: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_\-]", "_", group.strip().lstrip("@").lower()) or "group"
+
+
+class MembershipSnapshot:
+    """Members of one group at one point in time: sorted user IDs with aligned profile fields"""
+
+    def __init__(self, snapshot_id: str, taken_at: str, user_ids: np.ndarray, profiles: Dict[str, np.ndarray]):
+        self.snapshot_id = snapshot_id
+        self.taken_at = taken_at
+        self.user_ids = user_ids
+        self.profiles = profiles
+
+    def __len__(self):
+        return len(self.user_ids)
+
+
+class MembershipSnapshotStore:
+    """
+    On-disk history of group memberships for churn tracking.
+
+    Each snapshot is a compressed .npz file holding the sorted int64 user IDs of
+    a group plus the profile fields of only those users who are new or whose
+    profile changed since the previous snapshot. A JSON index lists the
+    snapshots of every group. Diffs between snapshots are sorted-array set
+    operations, so they stay fast for groups with hundreds of thousands of members.
+    """
+
+    def __init__(self, directory: str = SNAPSHOT_DIR):
+        self.directory = directory
+        self.index_path = os.path.join(directory, "index.json")
+        os.makedirs(directory, exist_ok=True)
+        self.index: Dict[str, List[Dict[str, Any]]] = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                self.index = json.load(f)
+        self._cache: Dict[Tuple[str, str], MembershipSnapshot] = {}
+
+    def _save_index(self):
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.index, f, indent=1)
+        os.replace(tmp_path, self.index_path)
+
+    @staticmethod
+    def _key(group: str) -> str:
+        return group.strip().lstrip("@").lower()
+
+    # ---------- Writing ----------
+    def save(self, group: str, df: pd.DataFrame, taken_at: Optional[datetime] = None) -> Optional[str]:
+        """Store the members of one group (participant rows as returned by fetch_participants)"""
+        if df.empty or "User ID" not in df.columns:
+            return None
+        if "Group" in df.columns:
+            df = df[df["Group"] == group]
+        rows = df.drop_duplicates(subset="User ID").sort_values(by="User ID")
+        user_ids = rows["User ID"].to_numpy(dtype=np.int64)
+        profiles = {}
+        for field in PROFILE_FIELDS:
+            values = rows[field].astype(str).to_numpy(dtype=str) if field in rows.columns else np.full(len(rows), "")
+            # Placeholders differ between fetch methods, so they are all stored as empty
+            profiles[field] = np.where(np.isin(values, list(MISSING_VALUES)), "", values)
+
+        # Only new users and changed profiles are written; the rest is carried over
+        changed = np.ones(len(user_ids), dtype=bool)
+        previous = self.latest(group)
+        if previous is not None:
+            _, current_idx, previous_idx = np.intersect1d(
+                user_ids, previous.user_ids, assume_unique=True, return_indices=True
+            )
+            same = np.ones(len(current_idx), dtype=bool)
+            for field in PROFILE_FIELDS:
+                same &= profiles[field][current_idx] == previous.profiles[field][previous_idx]
+            changed[current_idx[same]] = False
+
+        taken_at = (taken_at or datetime.utcnow()).isoformat(timespec="seconds")
+        snapshot_id = taken_at.replace(":", "").replace("-", "")
+        key = self._key(group)
+        # Two saves of a group within the same second get distinct IDs (and files)
+        existing = {entry["id"] for entry in self.index.get(key, [])}
+        base_id, suffix = snapshot_id, 2
+        while snapshot_id in existing:
+            snapshot_id = f"{base_id}_{suffix}"
+            suffix += 1
+        file_name = f"{_safe_name(group)}_{snapshot_id}.npz"
+        np.savez_compressed(
+            os.path.join(self.directory, file_name),
+            user_ids=user_ids,
+            changed_ids=user_ids[changed],
+            **{f"field_{i}": profiles[field][changed] for i, field in enumerate(PROFILE_FIELDS)},
+        )
+        self.index.setdefault(key, []).append({
+            "id": snapshot_id, "taken_at": taken_at, "members": int(len(user_ids)),
+            "changed": int(changed.sum()), "file": file_name,
+        })
+        self._save_index()
+        self._cache[(key, snapshot_id)] = MembershipSnapshot(snapshot_id, taken_at, user_ids, profiles)
+        return snapshot_id
+
+    # ---------- Reading ----------
+    def groups(self) -> List[str]:
+        return sorted(self.index)
+
+    def snapshots(self, group: str) -> pd.DataFrame:
+        entries = self.index.get(self._key(group), [])
+        return pd.DataFrame(
+            [{"Snapshot": e["id"], "Taken At (UTC)": e["taken_at"], "Members": e["members"],
+              "Changed Profiles": e["changed"]} for e in entries],
+            columns=["Snapshot", "Taken At (UTC)", "Members", "Changed Profiles"],
+        )
+
+    def latest(self, group: str) -> Optional[MembershipSnapshot]:
+        entries = self.index.get(self._key(group), [])
+        return self.load(group, entries[-1]["id"]) if entries else None
+
+    def load(self, group: str, snapshot_id: str) -> MembershipSnapshot:
+        """Rebuild a snapshot by carrying profiles forward from the group's earlier snapshots"""
+        key = self._key(group)
+        if (key, snapshot_id) in self._cache:
+            return self._cache[(key, snapshot_id)]
+        entries = self.index.get(key, [])
+        position = [e["id"] for e in entries].index(snapshot_id)
+
+        # Start from the closest snapshot already in memory, if any
+        start, snapshot = 0, None
+        for i in range(position - 1, -1, -1):
+            if (key, entries[i]["id"]) in self._cache:
+                start, snapshot = i + 1, self._cache[(key, entries[i]["id"])]
+                break
+        for entry in entries[start:position + 1]:
+            snapshot = self._apply(entry, snapshot)
+            self._cache[(key, entry["id"])] = snapshot
+        return snapshot
+
+    def _apply(self, entry: Dict[str, Any], previous: Optional[MembershipSnapshot]) -> MembershipSnapshot:
+        with np.load(os.path.join(self.directory, entry["file"]), allow_pickle=False) as data:
+            user_ids = data["user_ids"]
+            changed_ids = data["changed_ids"]
+            changed_fields = [data[f"field_{i}"] for i in range(len(PROFILE_FIELDS))]
+
+        profiles = {}
+        changed_pos = np.searchsorted(changed_ids, user_ids)
+        changed_pos = np.minimum(changed_pos, max(len(changed_ids) - 1, 0))
+        is_changed = changed_ids[changed_pos] == user_ids if len(changed_ids) else np.zeros(len(user_ids), dtype=bool)
+        if previous is not None and len(previous.user_ids):
+            previous_pos = np.minimum(np.searchsorted(previous.user_ids, user_ids), len(previous.user_ids) - 1)
+        for i, field in enumerate(PROFILE_FIELDS):
+            values = np.full(len(user_ids), "", dtype=object)
+            if previous is not None and len(previous.user_ids):
+                values[~is_changed] = previous.profiles[field][previous_pos[~is_changed]]
+            if len(changed_ids):
+                values[is_changed] = changed_fields[i][changed_pos[is_changed]]
+            profiles[field] = values.astype(str)
+        return MembershipSnapshot(entry["id"], entry["taken_at"], user_ids, profiles)
+
+    # ---------- Diffs ----------
+    def diff(self, group: str, old_id: str, new_id: str) -> pd.DataFrame:
+        """
+        Joins, leaves and username changes between two snapshots of a group.
+
+        Returns one row per change with the user ID, the change type and the
+        username before and after.
+        """
+        old = self.load(group, old_id)
+        new = self.load(group, new_id)
+
+        joined = np.setdiff1d(new.user_ids, old.user_ids, assume_unique=True)
+        left = np.setdiff1d(old.user_ids, new.user_ids, assume_unique=True)
+        _, new_idx, old_idx = np.intersect1d(new.user_ids, old.user_ids, assume_unique=True, return_indices=True)
+        renamed = new.profiles["Username"][new_idx] != old.profiles["Username"][old_idx]
+
+        joined_idx = np.searchsorted(new.user_ids, joined)
+        left_idx = np.searchsorted(old.user_ids, left)
+        frames = [
+            pd.DataFrame({"User ID": joined, "Change": "joined", "Old Username": "",
+                          "New Username": new.profiles["Username"][joined_idx]}),
+            pd.DataFrame({"User ID": left, "Change": "left", "Old Username": old.profiles["Username"][left_idx],
+                          "New Username": ""}),
+            pd.DataFrame({"User ID": new.user_ids[new_idx[renamed]], "Change": "username changed",
+                          "Old Username": old.profiles["Username"][old_idx[renamed]],
+                          "New Username": new.profiles["Username"][new_idx[renamed]]}),
+        ]
+        return pd.concat(frames, ignore_index=True)
+
+    def churn_summary(self, group: str) -> pd.DataFrame:
+        """Joins and leaves between each pair of consecutive snapshots of a group"""
+        entries = self.index.get(self._key(group), [])
+        rows = []
+        for old_entry, new_entry in zip(entries, entries[1:]):
+            old = self.load(group, old_entry["id"])
+            new = self.load(group, new_entry["id"])
+            rows.append({
+                "From": old.taken_at,
+                "To": new.taken_at,
+                "Members Before": len(old),
+                "Members After": len(new),
+                "Joined": len(np.setdiff1d(new.user_ids, old.user_ids, assume_unique=True)),
+                "Left": len(np.setdiff1d(old.user_ids, new.user_ids, assume_unique=True)),
+            })
+        return pd.DataFrame(rows, columns=["From", "To", "Members Before", "Members After", "Joined", "Left"])
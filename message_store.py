@@ -0,0 +1,170 @@
+# message_store.py
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple
+
+import pandas as pd
+
+STORE_PATH = "tgforge_messages.sqlite"
+
+
+class MessageStore:
+    """
+    Local SQLite store of processed message rows.
+
+    Rows are the dictionaries produced by MessageProcessor.process_message, keyed by
+    (channel ID, message ID). Edits overwrite the row and deletions are recorded
+    rather than removing it, so the store keeps the full observed history.
+    """
+
+    def __init__(self, path: str = STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS messages (
+                channel_id INTEGER NOT NULL,
+                message_id INTEGER NOT NULL,
+                channel_username TEXT,
+                message_date TEXT,
+                data TEXT NOT NULL,
+                captured_at TEXT NOT NULL,
+                edited_at TEXT,
+                deleted_at TEXT,
+                PRIMARY KEY (channel_id, message_id)
+            )
+            """
+        )
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS engagement_snapshots (
+                channel_username TEXT NOT NULL,
+                message_id INTEGER NOT NULL,
+                snapshot_at TEXT NOT NULL,
+                views INTEGER,
+                forwards INTEGER,
+                replies INTEGER,
+                reactions INTEGER,
+                PRIMARY KEY (channel_username, message_id, snapshot_at)
+            )
+            """
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.utcnow().isoformat(timespec="seconds")
+
+    def upsert_message(self, channel_id: int, channel_username: Optional[str], row: Dict[str, Any], edited: bool = False):
+        """Insert or replace a processed message row"""
+        message_date = row.get("Message DateTime (UTC)")
+        message_date = message_date.isoformat() if isinstance(message_date, datetime) else str(message_date)
+        now = self._now()
+        with self._lock:
+            self.conn.execute(
+                """
+                INSERT INTO messages (channel_id, message_id, channel_username, message_date, data, captured_at, edited_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(channel_id, message_id) DO UPDATE SET
+                    data = excluded.data,
+                    channel_username = excluded.channel_username,
+                    edited_at = COALESCE(excluded.edited_at, messages.edited_at)
+                """,
+                (channel_id, row["Message ID"], channel_username, message_date,
+                 json.dumps(row, default=str), now, now if edited else None),
+            )
+            self.conn.commit()
+
+    def mark_deleted(self, channel_id: int, message_ids: List[int]):
+        with self._lock:
+            self.conn.executemany(
+                "UPDATE messages SET deleted_at = ? WHERE channel_id = ? AND message_id = ? AND deleted_at IS NULL",
+                [(self._now(), channel_id, message_id) for message_id in message_ids],
+            )
+            self.conn.commit()
+
+    def last_message_id(self, channel_id: int) -> int:
+        """Highest stored message ID for a channel (0 if nothing is stored)"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT MAX(message_id) FROM messages WHERE channel_id = ?", (channel_id,)
+            ).fetchone()
+        return row[0] or 0
+
+    def message_keys(self, channel_usernames: Optional[List[str]] = None) -> List[Tuple[str, int, int]]:
+        """Return (channel username, channel ID, message ID) for stored, non-deleted messages"""
+        query = "SELECT channel_username, channel_id, message_id FROM messages WHERE deleted_at IS NULL"
+        params = []
+        if channel_usernames:
+            query += f" AND lower(channel_username) IN ({','.join('?' * len(channel_usernames))})"
+            params = [name.strip().lstrip("@").lower() for name in channel_usernames]
+        with self._lock:
+            return self.conn.execute(query + " ORDER BY channel_id, message_id", params).fetchall()
+
+    def load_messages(self, channel_usernames: Optional[List[str]] = None, start_date=None, end_date=None) -> pd.DataFrame:
+        """Load stored message rows as a DataFrame, optionally filtered by channel and date"""
+        query = "SELECT data, captured_at, edited_at, deleted_at FROM messages WHERE 1=1"
+        params = []
+        if channel_usernames:
+            query += f" AND lower(channel_username) IN ({','.join('?' * len(channel_usernames))})"
+            params.extend(name.strip().lstrip("@").lower() for name in channel_usernames)
+        if start_date:
+            query += " AND message_date >= ?"
+            params.append(start_date.isoformat())
+        if end_date:
+            query += " AND substr(message_date, 1, 10) <= ?"
+            params.append(end_date.isoformat())
+        with self._lock:
+            rows = self.conn.execute(query + " ORDER BY channel_id, message_id", params).fetchall()
+
+        records = []
+        for data, captured_at, edited_at, deleted_at in rows:
+            record = json.loads(data)
+            record["Captured At (UTC)"] = captured_at
+            record["Edited At (UTC)"] = edited_at or "Not Edited"
+            record["Deleted At (UTC)"] = deleted_at or "Not Deleted"
+            records.append(record)
+        df = pd.DataFrame(records)
+        if not df.empty:
+            df["Message DateTime (UTC)"] = pd.to_datetime(df["Message DateTime (UTC)"], errors="coerce")
+        return df
+
+    def add_engagement_snapshots(self, snapshots: List[Dict[str, Any]]):
+        """Append engagement snapshot rows (as produced by engagement_refresh)"""
+        with self._lock:
+            self.conn.executemany(
+                """
+                INSERT OR REPLACE INTO engagement_snapshots
+                    (channel_username, message_id, snapshot_at, views, forwards, replies, reactions)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (row["Channel"].lower(), row["Message ID"], row["Snapshot At (UTC)"],
+                     row["Views"], row["Forwards"], row["Replies"], row["Reactions"])
+                    for row in snapshots
+                ],
+            )
+            self.conn.commit()
+
+    def load_engagement_snapshots(self, channel_usernames: Optional[List[str]] = None) -> pd.DataFrame:
+        """Load all engagement snapshots, oldest first, for engagement-over-time analysis"""
+        query = (
+            "SELECT channel_username, message_id, snapshot_at, views, forwards, replies, reactions "
+            "FROM engagement_snapshots"
+        )
+        params = []
+        if channel_usernames:
+            query += f" WHERE channel_username IN ({','.join('?' * len(channel_usernames))})"
+            params = [name.strip().lstrip("@").lower() for name in channel_usernames]
+        with self._lock:
+            rows = self.conn.execute(query + " ORDER BY channel_username, message_id, snapshot_at", params).fetchall()
+        df = pd.DataFrame(rows, columns=["Channel", "Message ID", "Snapshot At (UTC)", "Views", "Forwards", "Replies", "Reactions"])
+        df["Total Engagement"] = df[["Forwards", "Replies", "Reactions"]].fillna(0).sum(axis=1)
+        return df
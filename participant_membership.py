@@ -0,0 +1,126 @@
+# participant_membership.py
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# Aggregated exports keep one 0/1 column per group only up to this many groups;
+# beyond that the Groups list and the overlap table carry the same information
+MAX_GROUP_FLAG_COLUMNS = 20
+
+PROFILE_COLUMNS = ["Username", "First Name", "Last Name", "Status"]
+
+# Columns of participant rows that are not group membership flags (older, wide-format data)
+USER_COLUMNS = [
+    "User ID", "Deleted", "Is Bot", "Verified", "Restricted", "Scam", "Fake",
+    "Premium", "Access Hash", "First Name", "Last Name", "Username", "Phone",
+    "Status", "Timezone Info", "Restriction Reason", "Language Code", "Last Seen",
+    "Profile Picture DC ID", "Profile Picture Photo ID", "Group",
+]
+
+
+class MembershipMatrix:
+    """
+    Sparse user × group membership matrix.
+
+    Rows are users (sorted by user ID) and columns are groups. Only actual
+    memberships are stored, so memory and every aggregate scale with the
+    number of memberships rather than users × groups.
+    """
+
+    def __init__(self, user_ids: np.ndarray, groups: List[str], matrix: sparse.csr_matrix):
+        self.user_ids = user_ids
+        self.groups = list(groups)
+        self.matrix = matrix
+
+    @classmethod
+    def from_participants(cls, df: pd.DataFrame) -> "MembershipMatrix":
+        """Build from participant rows with a "Group" column (or one 0/1 column per group)"""
+        if "Group" in df.columns:
+            user_column, group_column = df["User ID"], df["Group"]
+        else:
+            # Wide format: melt the flag columns into (user, group) pairs
+            flag_cols = [col for col in df.columns if col not in USER_COLUMNS]
+            flags = df[["User ID"] + flag_cols].melt(id_vars="User ID", var_name="Group", value_name="Member")
+            flags = flags[pd.to_numeric(flags["Member"], errors="coerce").fillna(0) > 0]
+            user_column, group_column = flags["User ID"], flags["Group"]
+
+        user_codes, user_ids = pd.factorize(user_column, sort=True)
+        group_codes, groups = pd.factorize(group_column)
+        matrix = sparse.coo_matrix(
+            (np.ones(len(user_codes), dtype=np.int32), (user_codes, group_codes)),
+            shape=(len(user_ids), len(groups)),
+        ).tocsr()
+        # Users listed twice for the same group are still one membership
+        matrix.sum_duplicates()
+        matrix.data[:] = 1
+        matrix.sort_indices()
+        return cls(np.asarray(user_ids), [str(g) for g in groups], matrix)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.matrix.shape
+
+    def group_counts(self) -> np.ndarray:
+        """Number of groups each user belongs to"""
+        return np.diff(self.matrix.indptr)
+
+    def group_lists(self, separator: str = ", ") -> List[str]:
+        """Comma-separated group names per user"""
+        if not len(self.user_ids):
+            return []
+        names = np.asarray(self.groups, dtype=object)[self.matrix.indices]
+        return [separator.join(row) for row in np.split(names, self.matrix.indptr[1:-1])]
+
+    def group_sizes(self) -> np.ndarray:
+        """Number of collected members per group"""
+        return np.diff(self.matrix.tocsc().indptr)
+
+    def members(self, group: str) -> np.ndarray:
+        """User IDs of one group"""
+        column = self.matrix.tocsc()[:, self.groups.index(group)]
+        return self.user_ids[column.indices]
+
+    def overlap_matrix(self) -> pd.DataFrame:
+        """Group × group table of shared members (the diagonal is each group's size)"""
+        shared = (self.matrix.T @ self.matrix).toarray()
+        return pd.DataFrame(shared, index=self.groups, columns=self.groups)
+
+    def overlap_table(self) -> pd.DataFrame:
+        """Pairwise overlap of groups that share at least one member, largest first"""
+        shared = sparse.triu(self.matrix.T @ self.matrix, k=1).tocoo()
+        sizes = self.group_sizes()
+        groups = np.asarray(self.groups, dtype=object)
+        union = sizes[shared.row] + sizes[shared.col] - shared.data
+        df = pd.DataFrame({
+            "Group A": groups[shared.row],
+            "Group B": groups[shared.col],
+            "Members A": sizes[shared.row],
+            "Members B": sizes[shared.col],
+            "Shared Members": shared.data,
+            "Jaccard": np.round(shared.data / np.maximum(union, 1), 4),
+        })
+        return df.sort_values(by="Shared Members", ascending=False).reset_index(drop=True)
+
+
+def aggregate_participants(df_participants: pd.DataFrame) -> Tuple[pd.DataFrame, MembershipMatrix]:
+    """
+    One row per user with profile fields, Group Count and the Groups list.
+
+    Returns the aggregated DataFrame and the MembershipMatrix it was built from.
+    """
+    membership = MembershipMatrix.from_participants(df_participants)
+    profile_cols = [col for col in PROFILE_COLUMNS if col in df_participants.columns]
+    # First row seen for each user, in the matrix's (sorted) user order
+    profiles = df_participants.drop_duplicates(subset="User ID").set_index("User ID")
+    aggregated = profiles.reindex(membership.user_ids)[profile_cols].reset_index()
+    aggregated = aggregated.rename(columns={aggregated.columns[0]: "User ID"})
+
+    if len(membership.groups) <= MAX_GROUP_FLAG_COLUMNS:
+        columns = membership.matrix.tocsc()
+        for index, group in enumerate(membership.groups):
+            aggregated[group] = columns[:, index].toarray().ravel().astype(np.int8)
+    aggregated["Group Count"] = membership.group_counts()
+    aggregated["Groups"] = membership.group_lists()
+    return aggregated, membership
@@ -0,0 +1,156 @@
+# progress.py
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Console placeholders print at most one update per this many seconds (errors always print)
+CONSOLE_UPDATE_INTERVAL_SECONDS = 5.0
+
+
+# ==================== REPORTERS ====================
+class StreamlitReporter:
+    """Progress in the Streamlit page; cancellation via st.session_state.cancel_fetch"""
+
+    def __init__(self):
+        import streamlit as st
+        self.st = st
+
+    def empty(self):
+        return self.st.empty()
+
+    def write(self, text: str):
+        self.st.write(text)
+
+    def warning(self, text: str):
+        self.st.warning(text)
+
+    def error(self, text: str):
+        self.st.error(text)
+
+    def cancelled(self) -> bool:
+        return bool(self.st.session_state.get("cancel_fetch", False))
+
+    def partial(self, name: str, rows: list):
+        pass
+
+
+class ConsolePlaceholder:
+    """Terminal stand-in for st.empty(): a status line that is updated in place"""
+
+    def __init__(self, reporter: "ConsoleReporter"):
+        self.reporter = reporter
+        self.last_text = None
+        self.last_printed = 0.0
+
+    def write(self, text: str):
+        now = time.monotonic()
+        if text == self.last_text or now - self.last_printed < self.reporter.update_interval:
+            self.last_text = text
+            return
+        self.last_text = text
+        self.last_printed = now
+        self.reporter.write(text)
+
+
+class ConsoleReporter:
+    """Progress as timestamped lines on a stream; cancel() stops fetches at their next check"""
+
+    def __init__(self, stream=None, update_interval: float = CONSOLE_UPDATE_INTERVAL_SECONDS):
+        self.stream = stream or sys.stderr
+        self.update_interval = update_interval
+        self._cancelled = threading.Event()
+
+    def _print(self, prefix: str, text: str):
+        line = str(text).replace("**", "")
+        print(f"{time.strftime('%H:%M:%S')} {prefix}{line}", file=self.stream, flush=True)
+
+    def empty(self):
+        return ConsolePlaceholder(self)
+
+    def write(self, text: str):
+        self._print("", text)
+
+    def warning(self, text: str):
+        self._print("WARNING: ", text)
+
+    def error(self, text: str):
+        self._print("ERROR: ", text)
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def partial(self, name: str, rows: list):
+        pass
+
+
+class NullReporter(ConsoleReporter):
+    """Discards progress; still supports cancellation"""
+
+    def _print(self, prefix: str, text: str):
+        pass
+
+
+# ==================== CURRENT REPORTER ====================
+# Context-local, so it follows a job into asyncio tasks and worker loops started from it
+_current_reporter: ContextVar = ContextVar("tgforge_reporter", default=None)
+_console_reporter = ConsoleReporter()
+
+
+def _in_streamlit() -> bool:
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except Exception:
+        return False
+    try:
+        return get_script_run_ctx(suppress_warning=True) is not None
+    except TypeError:
+        return get_script_run_ctx() is not None
+
+
+def get_reporter():
+    """The reporter set with use_reporter, else Streamlit inside the app and the console elsewhere"""
+    reporter = _current_reporter.get()
+    if reporter is None:
+        reporter = StreamlitReporter() if _in_streamlit() else _console_reporter
+    return reporter
+
+
+@contextmanager
+def use_reporter(reporter):
+    """Send progress of everything run inside the block to reporter"""
+    token = _current_reporter.set(reporter)
+    try:
+        yield reporter
+    finally:
+        _current_reporter.reset(token)
+
+
+# Shortcuts used by the fetchers in place of st.empty / st.write / ... and cancel_fetch
+def empty():
+    return get_reporter().empty()
+
+
+def write(text: str):
+    get_reporter().write(text)
+
+
+def warning(text: str):
+    get_reporter().warning(text)
+
+
+def error(text: str):
+    get_reporter().error(text)
+
+
+def cancelled() -> bool:
+    return get_reporter().cancelled()
+
+
+def partial(name: str, rows: list):
+    """Publish rows collected so far (dicts or DataFrames); the list may keep growing"""
+    get_reporter().partial(name, rows)
@@ -0,0 +1,76 @@
+# rate_limiter.py
+import asyncio
+import time
+from telethon.errors import FloodWaitError
+
+
+class RateLimiter:
+    """
+    Shared limit for concurrent Telegram work.
+
+    Caps the number of requests in flight, spaces request starts at least
+    min_interval seconds apart and pauses everyone after a FloodWaitError.
+    """
+
+    def __init__(self, max_concurrency: int = 3, min_interval: float = 1.0):
+        self.max_concurrency = max(int(max_concurrency), 1)
+        self.min_interval = min_interval
+        self._semaphore = None
+        self._lock = None
+        self._next_start = 0.0
+        self._cooldown_until = 0.0
+
+    def _ensure_primitives(self):
+        # Created lazily so the limiter binds to the loop that actually uses it
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._lock = asyncio.Lock()
+
+    @property
+    def cooling_down(self) -> bool:
+        return time.monotonic() < self._cooldown_until
+
+    @property
+    def cooldown_remaining(self) -> float:
+        return max(self._cooldown_until - time.monotonic(), 0.0)
+
+    def cooldown(self, seconds: float):
+        """Pause all new requests for the given number of seconds"""
+        self._cooldown_until = max(self._cooldown_until, time.monotonic() + seconds)
+
+    async def wait(self):
+        """Wait for the next request slot, respecting pacing and any active cooldown"""
+        self._ensure_primitives()
+        async with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start, self._cooldown_until)
+            self._next_start = start + self.min_interval
+        delay = start - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def __aenter__(self):
+        self._ensure_primitives()
+        await self._semaphore.acquire()
+        try:
+            await self.wait()
+        except BaseException:
+            self._semaphore.release()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._semaphore.release()
+        if isinstance(exc, FloodWaitError):
+            self.cooldown(exc.seconds + 1)
+        return False
+
+    async def call(self, func, *args, attempts: int = 5, **kwargs):
+        """Run func(*args, **kwargs) under the limiter, retrying after flood waits"""
+        for attempt in range(attempts):
+            try:
+                async with self:
+                    return await func(*args, **kwargs)
+            except FloodWaitError:
+                if attempt == attempts - 1:
+                    raise
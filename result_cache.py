@@ -0,0 +1,201 @@
+# result_cache.py
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Optional, Dict, Any
+
+import pandas as pd
+
+RESULT_CACHE_DIR = "tgforge_result_cache"
+
+# Cached results are reused for a day
+RESULT_CACHE_TTL_SECONDS = 24 * 60 * 60
+
+# Least recently used results are evicted once the cache grows past this size
+RESULT_CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+
+def normalize_target(name: str) -> str:
+    """Channel or group name as a cache key: no t.me prefix, no @, lower case"""
+    name = str(name).strip().lower()
+    for prefix in ("https://", "http://", "t.me/", "@"):
+        if name.startswith(prefix):
+            name = name[len(prefix):]
+    return name.rstrip("/")
+
+
+def filter_window(df: pd.DataFrame, start_date=None, end_date=None, date_column: str = "Message DateTime (UTC)",
+                  id_column: str = "Message ID", parent_column: str = "Parent Message ID") -> pd.DataFrame:
+    """
+    Rows of a wider cached window that fall in [start_date, end_date].
+
+    Replies (rows with a parent ID) are kept when their parent post is kept,
+    the same as a fresh crawl of the narrower window would collect them.
+    """
+    if df.empty:
+        # A window with no rows is cached without columns
+        return df
+    dates = pd.to_datetime(df[date_column], errors="coerce")
+    keep = pd.Series(True, index=df.index)
+    if start_date:
+        keep &= dates >= pd.Timestamp(start_date)
+    if end_date:
+        keep &= dates < pd.Timestamp(end_date) + pd.Timedelta(days=1)
+    if parent_column in df.columns:
+        replies = df[parent_column].notna()
+        kept_posts = df.loc[keep & ~replies, id_column]
+        keep = (keep & ~replies) | (replies & df[parent_column].isin(kept_posts))
+    return df[keep].reset_index(drop=True)
+
+
+class ResultCache:
+    """
+    Disk cache of fetch results, one entry per channel or group and query.
+
+    Entries are keyed by (kind, normalized target, parameters such as the comments
+    flag or method) plus their date window. A cached window that covers the
+    requested one is reused by filtering its rows, so overlapping queries only
+    fetch the targets that are missing. DataFrames are pickled next to a SQLite
+    index; entries expire after `ttl` and the least recently used are evicted
+    beyond `max_bytes`. The cache is shared by every session of the app.
+    """
+
+    def __init__(self, directory: str = RESULT_CACHE_DIR, ttl: float = RESULT_CACHE_TTL_SECONDS,
+                 max_bytes: int = RESULT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(directory, "index.sqlite"), check_same_thread=False)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS results (
+                file TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                target TEXT NOT NULL,
+                params TEXT NOT NULL,
+                start_date TEXT,
+                end_date TEXT,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS results_key ON results (kind, target, params)")
+        self.conn.commit()
+
+    @staticmethod
+    def _params(params: Optional[Dict[str, Any]]) -> str:
+        return json.dumps(params or {}, sort_keys=True, default=str)
+
+    @staticmethod
+    def _date(value) -> Optional[str]:
+        return value.isoformat() if value else None
+
+    def get(self, kind: str, target: str, start_date=None, end_date=None, params: Optional[Dict[str, Any]] = None,
+            date_column: Optional[str] = None) -> Optional[pd.DataFrame]:
+        """
+        Cached result for the query, or None.
+
+        Without a date_column only an entry for exactly this window is used;
+        with one, any entry whose window covers the requested one is filtered.
+        """
+        start, end = self._date(start_date), self._date(end_date)
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT file, start_date, end_date FROM results "
+                "WHERE kind = ? AND target = ? AND params = ? AND created_at >= ? ORDER BY created_at DESC",
+                (kind, normalize_target(target), self._params(params), time.time() - self.ttl),
+            ).fetchall()
+        for file, cached_start, cached_end in rows:
+            exact = (cached_start, cached_end) == (start, end)
+            covers = (cached_start is None or (start is not None and cached_start <= start)) and \
+                     (cached_end is None or (end is not None and cached_end >= end))
+            if not exact and not (covers and date_column):
+                continue
+            try:
+                df = pd.read_pickle(os.path.join(self.directory, file))
+            except Exception:
+                self._delete(file)
+                continue
+            with self._lock:
+                self.conn.execute("UPDATE results SET last_used = ? WHERE file = ?", (time.time(), file))
+                self.conn.commit()
+            return df if exact else filter_window(df, start_date, end_date, date_column)
+        return None
+
+    def put(self, kind: str, target: str, df: pd.DataFrame, start_date=None, end_date=None,
+            params: Optional[Dict[str, Any]] = None):
+        key = (kind, normalize_target(target), self._params(params), self._date(start_date), self._date(end_date))
+        file = f"{uuid.uuid4().hex}.pkl"
+        path = os.path.join(self.directory, file)
+        df.to_pickle(path)
+        now = time.time()
+        with self._lock:
+            replaced = self.conn.execute(
+                "SELECT file FROM results WHERE kind = ? AND target = ? AND params = ? "
+                "AND start_date IS ? AND end_date IS ?", key,
+            ).fetchall()
+            self.conn.execute(
+                "INSERT INTO results (file, kind, target, params, start_date, end_date, size, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (file, *key, os.path.getsize(path), now, now),
+            )
+            self.conn.commit()
+        for (old_file,) in replaced:
+            self._delete(old_file)
+        self.evict()
+
+    def _delete(self, file: str):
+        with self._lock:
+            self.conn.execute("DELETE FROM results WHERE file = ?", (file,))
+            self.conn.commit()
+        try:
+            os.remove(os.path.join(self.directory, file))
+        except OSError:
+            pass
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until the cache fits in max_bytes"""
+        with self._lock:
+            expired = self.conn.execute(
+                "SELECT file FROM results WHERE created_at < ?", (time.time() - self.ttl,)
+            ).fetchall()
+            by_use = self.conn.execute("SELECT file, size FROM results ORDER BY last_used DESC").fetchall()
+        doomed = {file for (file,) in expired}
+        total = 0
+        for file, size in by_use:
+            if file in doomed:
+                continue
+            total += size
+            if total > self.max_bytes:
+                doomed.add(file)
+        for file in doomed:
+            self._delete(file)
+
+    def clear(self):
+        with self._lock:
+            files = self.conn.execute("SELECT file FROM results").fetchall()
+        for (file,) in files:
+            self._delete(file)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        return {"entries": entries, "bytes": size}
+
+
+_result_cache = None
+
+
+def get_result_cache() -> ResultCache:
+    """Shared ResultCache, opened on first use"""
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = ResultCache()
+    return _result_cache
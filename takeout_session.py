@@ -0,0 +1,52 @@
+# takeout_session.py
+from contextlib import asynccontextmanager
+
+from telethon import errors
+from telethon.client.account import _TakeoutClient
+
+# Pause between history pages inside a takeout session (normal sessions wait 1s)
+TAKEOUT_PAGE_DELAY_SECONDS = 0.2
+
+
+class TakeoutUnavailable(Exception):
+    """Telegram did not allow a data export session to start"""
+
+
+def is_takeout(client) -> bool:
+    """
+    Whether requests made through this client run inside a takeout session.
+
+    Only the wrapper yielded by takeout_client counts: the takeout ID lives on the
+    session of the shared base client, where every other job would see it too.
+    """
+    return isinstance(client, _TakeoutClient)
+
+
+def page_delay(client, default: float) -> float:
+    """Delay between paged history requests: shorter inside a takeout session"""
+    return min(default, TAKEOUT_PAGE_DELAY_SECONDS) if is_takeout(client) else default
+
+
+@asynccontextmanager
+async def takeout_client(client, channels=True, megagroups=True, chats=True):
+    """
+    Open a data-export (takeout) session and yield the wrapped client.
+
+    Requests made through the yielded client are sent with InvokeWithTakeout,
+    which Telegram rate-limits far more leniently for bulk history export. The
+    session is finalized when the block exits.
+    """
+    try:
+        async with client.takeout(finalize=True, channels=channels, megagroups=megagroups, chats=chats) as takeout:
+            yield takeout
+    except errors.TakeoutInitDelayError as e:
+        raise TakeoutUnavailable(
+            f"Telegram requires a {e.seconds}s wait before this account can start a data export. "
+            "Allow the export request sent to your Telegram app (Service notifications), then try again."
+        ) from e
+
+
+async def run_in_takeout(client, job, **takeout_options):
+    """Run job(takeout_client) inside a takeout session and return its result"""
+    async with takeout_client(client, **takeout_options) as takeout:
+        return await job(takeout)